@@ -36,7 +36,7 @@ import re
 import logging
 from logging.handlers import RotatingFileHandler
 import configparser
-from flask import Flask, jsonify, request, g, make_response
+from flask import Flask, Response, jsonify, request, g, make_response, stream_with_context
 from flask_httpauth import HTTPBasicAuth
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
@@ -114,62 +114,55 @@ limiter = Limiter(
     global_limits=flask_limits
 )
 
-def get_bolt_db():
-    """Store nglib database handle under thread"""
-    bdb = getattr(g, '_boltdb', None)
-    if bdb is None:
-        bdb = g._boltdb = nglib.get_bolt_db()
-    return bdb
+# Initialize nglib once, sessions are borrowed per request thread
+nglib.verbose = debug
+nglib.init_nglib(config_file, initdb=False)
+nglib.bolt_ses = nglib.LocalSession()
+nglib.py2neo_ses = nglib.get_py2neo_db()
 
-def get_py2neo_db():
-    """Store nglib database handle under thread"""
-    pydb = getattr(g, '_py2neodb', None)
-    if pydb is None:
-        pydb = g._py2neodb = nglib.get_py2neo_db()
-    return pydb
+# Concurrent lookups inside path queries (workers borrow their own sessions)
+if 'query_workers' in config['apisrv']:
+    nglib.query_workers = int(config['apisrv']['query_workers'])
 
 @app.before_request
 def init_db():
-    """Initialize Library on each request"""
-    logging.debug('Getting Neo4j Database Connections')
-    nglib.verbose = debug
-    nglib.init_nglib(config_file, initdb=False)
-    nglib.bolt_ses = get_bolt_db()
+    """Attach shared database handles to the request"""
     g.neo4j_db_bolt = nglib.bolt_ses
-    nglib.py2neo_ses = get_py2neo_db()
     g.neo4j_db_py2neo = nglib.py2neo_ses
 
 @app.teardown_appcontext
 def close_db(error):
-    """Closes the database again at the end of the request."""
+    """Return the request thread's Bolt session to the pool"""
     if hasattr(g, 'sqlite_db'):
         g.sqlite_db.close()
 
     bolt_ses = getattr(g, 'neo4j_db_bolt', None)
     if bolt_ses is not None:
-        logger.debug('Closing Neo4j Database Connection')
-        g.neo4j_db = None
-        nglib.bolt_ses = None
-        bolt_ses.last_result = None
+        logger.debug('Returning Neo4j Session to Pool')
+        g.neo4j_db_bolt = None
         bolt_ses.close()
 
-    py2neo_ses = getattr(g, 'neo4j_db_py2neo', None)
-    if py2neo_ses is not None:
-        logger.debug('Closing Neo4j Database Connection')
-        g.neo4j_db = None
-        nglib.py2neo_ses = None
-        py2neo_ses.last_result = None
-        py2neo_ses = None
 
+def api_response(ngt, version, keyed=False):
+    'JSON response for NGT API data, keys are upgraded as they are serialized'
 
-def upgrade_api(ngt, version):
-    'Upgrade the output of NGT API data'
+    rename = None
+    if version == 'v2':
+        rename = nglib.ngtree.upgrade.upgrade_key_v2
+
+    return Response(nglib.ngtree.export.dump_JSON(ngt, rename=rename, keyed=keyed) + '\n',
+                    mimetype='application/json')
 
-    nt = ngt
+def stream_api(head, children, version, counts=('_ccount',)):
+    'Stream a large ngtree as a chunked JSON response, one child at a time'
 
+    rename = None
     if version == 'v2':
-        nt = nglib.ngtree.upgrade.upgrade_ngt_v2(ngt)
-    return nt
+        rename = nglib.ngtree.upgrade.upgrade_key_v2
+
+    return Response(stream_with_context(
+        nglib.ngtree.export.stream_JSON(head, children, counts=counts, rename=rename)),
+                    mimetype='application/json')
 
 def version_chk(version, versions=['v1.1', 'v2']):
     'Make sure version in versions'
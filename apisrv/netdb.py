@@ -35,7 +35,7 @@ import nglib.report
 import nglib.netdb.switch
 from nglib.exceptions import ResultError
 from flask import jsonify, request
-from apisrv import app, auth, config, errors, upgrade_api, version_chk
+from apisrv import app, auth, config, errors, api_response, version_chk
 
 # Setup
 logger = logging.getLogger(__name__)
@@ -67,7 +67,7 @@ def get_arptable(ver):
 
 
     try:
-        return jsonify(upgrade_api(nglib.netdb.ip.arp(router=router, hours=hours), ver))
+        return api_response(nglib.netdb.ip.arp(router=router, hours=hours), ver)
     except ResultError as e:
         return jsonify(errors.json_error(e.expression, e.message))
 
@@ -100,7 +100,7 @@ def get_mactable(ver):
         hours = int(request.args['hours'])
 
     try:
-        return jsonify(upgrade_api(nglib.netdb.switch.mac(switch=switch, port=port, hours=hours), ver))
+        return api_response(nglib.netdb.switch.mac(switch=switch, port=port, hours=hours), ver)
     except ResultError as e:
         return jsonify(errors.json_error(e.expression, e.message))
 
@@ -123,6 +123,6 @@ def get_mac_count(ver, switch):
         hours = int(request.args['hours'])
 
     try:
-        return jsonify(upgrade_api(nglib.netdb.switch.count(switch=switch, hours=hours), ver))
+        return api_response(nglib.netdb.switch.count(switch=switch, hours=hours), ver)
     except ResultError as e:
         return jsonify(errors.json_error(e.expression, e.message))
@@ -35,7 +35,7 @@ import nglib.report
 import nglib.netdb.switch
 from nglib.exceptions import ResultError
 from flask import jsonify, request
-from apisrv import app, auth, config, errors, upgrade_api, version_chk
+from apisrv import app, auth, config, errors, api_response, version_chk, stream_api
 
 # Setup
 logger = logging.getLogger(__name__)
@@ -66,8 +66,15 @@ def get_devs(ver):
     if 'full' in request.args:
         trunc = False
 
+    # Chunked response for large reports
+    if 'stream' in request.args:
+        head = nglib.ngtree.get_ngtree("Report", tree_type="DEVS")
+        head['Device Regex'] = search
+        return stream_api(head, nglib.report.iter_dev_report(search, group=group, trunc=trunc),
+                          ver, counts=('_ccount', 'Device Count'))
+
     try:
-        return jsonify(upgrade_api(nglib.report.get_dev_report(dev=search, group=group, trunc=trunc), ver))
+        return api_response(nglib.report.get_dev_report(dev=search, group=group, trunc=trunc), ver)
     except ResultError as e:
         return jsonify(errors.json_error(e.expression, e.message))
 
@@ -84,7 +91,7 @@ def get_device(device, ver):
     try:
         res = nglib.query.dev.get_device(device, rtype="NGTREE")
 
-        return jsonify(upgrade_api(nglib.query.dev.get_device(device, rtype="NGTREE"), ver))
+        return api_response(nglib.query.dev.get_device(device, rtype="NGTREE"), ver)
     except ResultError as e:
         return jsonify(errors.json_error(e.expression, e.message))
 
@@ -99,7 +106,7 @@ def get_device_neighbors(ver, device):
         return error
 
     try:
-        return jsonify(upgrade_api(nglib.query.dev.get_neighbors(device), ver))
+        return api_response(nglib.query.dev.get_neighbors(device), ver)
     except ResultError as e:
         return jsonify(errors.json_error(e.expression, e.message))
 
@@ -114,7 +121,7 @@ def get_device_vlans(ver, device):
         return error
 
     try:
-        return jsonify(upgrade_api(nglib.query.dev.get_vlans(device), ver))
+        return api_response(nglib.query.dev.get_vlans(device), ver)
     except ResultError as e:
         return jsonify(errors.json_error(e.expression, e.message))
 
@@ -129,7 +136,7 @@ def get_device_nets(ver, device):
         return error
 
     try:
-        return jsonify(upgrade_api(nglib.query.dev.get_networks(device), ver))
+        return api_response(nglib.query.dev.get_networks(device), ver)
     except ResultError as e:
         return jsonify(errors.json_error(e.expression, e.message))
 
@@ -148,7 +155,7 @@ def get_device_ints(ver, device):
             'NetDB Must be enabled to run this query'))
 
     try:
-        return jsonify(upgrade_api(nglib.netdb.switch.get_switch(device), ver))
+        return api_response(nglib.netdb.switch.get_switch(device), ver)
     except ResultError as e:
         return jsonify(errors.json_error(e.expression, e.message))
 
@@ -171,8 +178,8 @@ def get_full_path(ver):
     if 'depth' in request.args:
         depth = request.args['depth']
     try:
-        return jsonify(upgrade_api(nglib.query.path.get_full_path(request.args['src'], \
-            request.args['dst'], {"onepath": onepath, "depth": depth}), ver))
+        return api_response(nglib.query.path.get_full_path(request.args['src'], \
+            request.args['dst'], {"onepath": onepath, "depth": depth}), ver)
     except ResultError as e:
         return jsonify(errors.json_error(e.expression, e.message))
 
@@ -197,9 +204,9 @@ def get_routed_path(ver):
     if 'vrf' in request.args:
         vrf = request.args['vrf']
     try:
-        return jsonify(upgrade_api(nglib.query.path.get_routed_path(request.args['src'], \
+        return api_response(nglib.query.path.get_routed_path(request.args['src'], \
             request.args['dst'], {"onepath": onepath, "depth": depth, \
-            "VRF": vrf}), ver))
+            "VRF": vrf}), ver)
     except ResultError as e:
         return jsonify(errors.json_error(e.expression, e.message))
 
@@ -221,8 +228,8 @@ def get_switched_path(ver):
     if 'depth' in request.args:
         depth = request.args['depth']
     try:
-        return jsonify(upgrade_api(nglib.query.path.get_switched_path(request.args['src'], \
-            request.args['dst'], {"onepath": onepath, "depth": depth}), ver))
+        return api_response(nglib.query.path.get_switched_path(request.args['src'], \
+            request.args['dst'], {"onepath": onepath, "depth": depth}), ver)
     except ResultError as e:
         return jsonify(errors.json_error(e.expression, e.message))
 
@@ -250,14 +257,14 @@ def get_nets(ver):
 
     if 'ip' in request.args:
         try:
-            return jsonify(upgrade_api(nglib.query.net.get_net(request.args['ip'], rtype="NGTREE"), ver))
+            return api_response(nglib.query.net.get_net(request.args['ip'], rtype="NGTREE"), ver)
         except ResultError as e:
             return jsonify(errors.json_error(e.expression, e.message))
     elif 'cidr' in request.args:
         cidr = request.args['cidr']
         cidr = cidr.replace('-', '/')
         try:
-            return jsonify(upgrade_api(nglib.query.net.get_networks_on_cidr(cidr, rtype="NGTREE"), ver))
+            return api_response(nglib.query.net.get_networks_on_cidr(cidr, rtype="NGTREE"), ver)
         except ResultError as e:
             return jsonify(errors.json_error(e.expression, e.message))
         except ValueError as e:
@@ -267,10 +274,52 @@ def get_nets(ver):
         if 'filter' in request.args:
             nFilter = request.args['filter']
         try:
-            return jsonify(upgrade_api(nglib.query.net.get_networks_on_filter(nFilter=nFilter, rtype="NGTREE"), ver))
+            return api_response(nglib.query.net.get_networks_on_filter(nFilter=nFilter, rtype="NGTREE"), ver)
         except ResultError as e:
             return jsonify(errors.json_error(e.expression, e.message))
 
+@app.route('/netgrph/api/<ver>/nets/batch', methods=['GET', 'POST'])
+@app.route('/api/<ver>/nets/batch', methods=['GET', 'POST'])
+@auth.login_required
+def get_nets_batch(ver):
+    """
+    Batch IP lookups, returns {ip: ngtree}
+
+    Options:
+        ips  - list of IPs or hostnames (JSON body or comma separated arg)
+        days - NetDB history in days (default 7)
+    """
+
+    error = version_chk(ver)
+    if error:
+        return error
+
+    ips = None
+    days = 7
+
+    body = request.get_json(silent=True)
+    if body and 'ips' in body:
+        ips = body['ips']
+        days = body.get('days', days)
+    elif 'ips' in request.args:
+        ips = request.args['ips'].split(',')
+
+    if 'days' in request.args:
+        days = request.args['days']
+
+    if not ips or not isinstance(ips, list):
+        return jsonify(errors.json_error('InputError', 'ips= list is required'))
+
+    try:
+        ngtrees = nglib.query.net.get_nets([str(ip).strip() for ip in ips],
+                                           rtype="NGTREE", days=int(days))
+    except ResultError as e:
+        return jsonify(errors.json_error(e.expression, e.message))
+    except ValueError as e:
+        return jsonify(errors.json_error('ValueError', str(e), code=400))
+
+    return api_response(ngtrees, ver, keyed=True)
+
 # L2 VLAN Queries
 @app.route('/netgrph/api/<ver>/vlans', methods=['GET'])
 @app.route('/api/<ver>/vlans', methods=['GET'])
@@ -292,9 +341,14 @@ def get_vlans(ver):
     if 'group' in request.args:
         group = request.args['group']
 
+    # Chunked response for large reports
+    if 'stream' in request.args:
+        head = nglib.ngtree.get_ngtree("Report", tree_type="VIDs")
+        return stream_api(head, nglib.report.iter_vlan_data(vrange, "NGTREE", group=group), ver)
+
     try:
-        return jsonify(upgrade_api(nglib.report.get_vlan_report(vrange=vrange, group=group, \
-                    rtype="NGTREE"), ver))
+        return api_response(nglib.report.get_vlan_report(vrange=vrange, group=group, \
+                    rtype="NGTREE"), ver)
     except ResultError as e:
         return jsonify(errors.json_error(e.expression, e.message))
 
@@ -313,8 +367,8 @@ def get_vlan(vlan, ver):
     if 'allSwitches' in request.args and request.args['allSwitches'] == 'False':
         allSwitches = False
     try:
-        return jsonify(upgrade_api(nglib.query.vlan.get_vlan(vlan, allSwitches=allSwitches, \
-                    rtype="NGTREE"), ver))
+        return api_response(nglib.query.vlan.get_vlan(vlan, allSwitches=allSwitches, \
+                    rtype="NGTREE"), ver)
     except ResultError as e:
         return jsonify(errors.json_error(e.expression, e.message))
 
@@ -325,7 +379,8 @@ def get_vlan(vlan, ver):
 def get_net():
 
     try:
-        return jsonify(nglib.query.net.get_networks_on_cidr(request.args['cidr'], rtype="NGTREE"))
+        return api_response(nglib.query.net.get_networks_on_cidr(request.args['cidr'], \
+                    rtype="NGTREE"), 'v1.0')
     except ResultError as e:
         return jsonify(errors.json_error(e.expression, e.message))
 
@@ -334,7 +389,7 @@ def get_net():
 def get_ip():
 
     try:
-        return jsonify(nglib.query.net.get_net(request.args['ip'], rtype="NGTREE"))
+        return api_response(nglib.query.net.get_net(request.args['ip'], rtype="NGTREE"), 'v1.0')
     except ResultError as e:
         return jsonify(errors.json_error(e.expression, e.message))
 
@@ -343,7 +398,8 @@ def get_ip():
 def get_nlist():
 
     try:
-        return jsonify(nglib.query.net.get_networks_on_filter(request.args['group'], rtype="NGTREE"))
+        return api_response(nglib.query.net.get_networks_on_filter(request.args['group'], \
+                    rtype="NGTREE"), 'v1.0')
     except ResultError as e:
         return jsonify(errors.json_error(e.expression, e.message))
 
@@ -352,7 +408,8 @@ def get_nlist():
 def get_nfilter():
     """ Networks on a filter """
     try:
-        return jsonify(nglib.query.net.get_networks_on_filter(nFilter=request.args['filter'], rtype="NGTREE"))
+        return api_response(nglib.query.net.get_networks_on_filter(nFilter=request.args['filter'], \
+                    rtype="NGTREE"), 'v1.0')
     except ResultError as e:
         return jsonify(errors.json_error(e.expression, e.message))
 
@@ -363,8 +420,8 @@ def get_vid():
     if 'allSwitches' in request.args and request.args['allSwitches'] == 'False':
         allSwitches = False
     try:
-        return jsonify(nglib.query.vlan.search_vlan_id(request.args['id'], \
-                    rtype="NGTREE", allSwitches=allSwitches))
+        return api_response(nglib.query.vlan.search_vlan_id(request.args['id'], \
+                    rtype="NGTREE", allSwitches=allSwitches), 'v1.0')
     except ResultError as e:
         return jsonify(errors.json_error(e.expression, e.message))
 
@@ -373,7 +430,7 @@ def get_vid():
 @auth.login_required
 def get_vtree():
     try:
-        return jsonify(nglib.query.vlan.get_vtree(request.args['name'], rtype="NGTREE"))
+        return api_response(nglib.query.vlan.get_vtree(request.args['name'], rtype="NGTREE"), 'v1.0')
     except ResultError as e:
         return jsonify(errors.json_error(e.expression, e.message))
 
@@ -381,11 +438,29 @@ def get_vtree():
 @auth.login_required
 def get_dev():
     try:
-        return jsonify(nglib.query.dev.get_device(request.args['dev'], rtype="NGTREE"))
+        return api_response(nglib.query.dev.get_device(request.args['dev'], rtype="NGTREE"), 'v1.0')
     except ResultError as e:
         return jsonify(errors.json_error(e.expression, e.message))
 
 
+# Server Stats
+@app.route('/netgrph/api/<ver>/stats', methods=['GET'])
+@app.route('/api/<ver>/stats', methods=['GET'])
+@auth.login_required
+def get_stats(ver):
+    """ Returns Bolt session pool and query cache counters """
+
+    error = version_chk(ver)
+    if error:
+        return error
+
+    response = dict()
+    response['pool'] = nglib.get_pool_stats()
+    response['cache'] = nglib.query.cache.get_cache_stats()
+
+    return jsonify(response)
+
+
 # Info method, Return Request Data back to client as JSON
 @app.route('/' + app_name + '/api/<ver>/info', methods=['POST', 'GET'])
 @auth.login_required
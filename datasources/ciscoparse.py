@@ -37,6 +37,7 @@ import argparse
 import socket
 import csv
 import ipaddress
+import multiprocessing
 from ciscoconfparse import CiscoConfParse
 
 # Config Options
@@ -59,6 +60,8 @@ parser.add_argument("-vfile", metavar='outfile', help="VLAN CSV Output File", ty
 parser.add_argument("-ifile", metavar='outfile', help="Interface CSV Output File", type=str)
 parser.add_argument("-dfile", metavar='outfile', help="Device Output File (SNMP etc)", type=str)
 parser.add_argument("-lfile", metavar='outfile', help="Links File", type=str)
+parser.add_argument("-j", metavar='jobs',
+                    help="Parse each config once using a pool of N processes", type=int)
 parser.add_argument("-debug", help="Set debugging level", type=int)
 
 # Argument Reference
@@ -106,14 +109,24 @@ def loadDevicelist(dev_file):
     devdb = csv.DictReader(f)
     return devdb
 
-def get_device_info(device):
-    """Get Device Information from Config"""
+def load_config(device):
+    """Parse a device config once, returns None if it can not be loaded"""
 
     conf_file = conf_dir + device['Device'] + "-confg"
 
     try:
         parse = CiscoConfParse(conf_file)
     except:
+        return None
+    return parse
+
+def get_device_info(device, parse=None):
+    """Get Device Information from Config"""
+
+    if parse is None:
+        parse = load_config(device)
+
+    if parse is None:
         #print("Warning, could not load config for ", conf_file)
         return
     else:
@@ -163,14 +176,13 @@ def parse_snmp(parse, device):
     return dentry
 
 
-def get_links(device):
+def get_links(device, parse=None):
     """Get all trunks"""
 
-    conf_file = conf_dir + device['Device'] + "-confg"
+    if parse is None:
+        parse = load_config(device)
 
-    try:
-        parse = CiscoConfParse(conf_file)
-    except:
+    if parse is None:
         #print("Warning, could not load config for ", conf_file)
         return []
     else:
@@ -238,16 +250,15 @@ def parse_link(line, ientry):
     return ientry
 
 
-def get_interfaces(device):
+def get_interfaces(device, parse=None):
     """Get the Interfaces off a device"""
 
-    conf_file = conf_dir + device['Device'] + "-confg"
-
     if device['Type'] == 'Primary' or device['Type'] == 'Standby':
 
-        try:
-            parse = CiscoConfParse(conf_file)
-        except:
+        if parse is None:
+            parse = load_config(device)
+
+        if parse is None:
             return
         else:
             default_shut = False
@@ -477,7 +488,7 @@ def parse_int(line, ientry, default_shut):
     return ientry
 
 
-def get_vlans(device):
+def get_vlans(device, parse=None):
     """Get the VLANs off a device"""
 
     conf_file = conf_dir + device['Device'] + "-confg"
@@ -485,9 +496,10 @@ def get_vlans(device):
 
     if device['MgmtGroup'] != 'None':
 
-        try:
-            parse = CiscoConfParse(conf_file)
-        except:
+        if parse is None:
+            parse = load_config(device)
+
+        if parse is None:
             print("Warning, could not load config for ", conf_file)
             return
         else:
@@ -693,9 +705,94 @@ def save_device_file(out_file):
                 + d['Model'] + ',' + d['Version']
         print(entry, sep='\n', file=save)
 
+def process_device(device):
+    """
+    Parse one device config once and extract all requested data
+
+    Runs in a pool worker, returns (vlans, interfaces, devices, links)
+    """
+
+    global vlan_list
+    global interface_list
+    global device_list
+
+    vlan_list = []
+    interface_list = []
+    device_list = []
+    links = []
+
+    parse = load_config(device)
+
+    if parse is None:
+        if args.vfile and device['MgmtGroup'] != 'None':
+            print("Warning, could not load config for ",
+                  conf_dir + device['Device'] + "-confg")
+        return (vlan_list, interface_list, device_list, links)
+
+    # VLANs on the L2 VLAN Range
+    if args.vfile:
+        process_vlans(args.vr or "1-4096")
+        get_vlans(device, parse=parse)
+
+    # Interfaces on the L3 VLAN Range
+    if args.ifile:
+        process_vlans(args.ivr or "1-4096")
+        get_interfaces(device, parse=parse)
+
+    if args.dfile:
+        get_device_info(device, parse=parse)
+
+    if args.lfile:
+        links = get_links(device, parse=parse)
+
+    return (vlan_list, interface_list, device_list, links)
+
+
+def process_devices_parallel(devdb, jobs):
+    """
+    Fan devices out across a process pool
+
+    Results come back in devicelist order and are merged before the output
+    files are written once
+    """
+
+    all_vlans = []
+    all_ints = []
+    all_devs = []
+    links = []
+
+    pool = multiprocessing.get_context('fork').Pool(jobs)
+    for (vlans, ints, devs, dlinks) in pool.imap(process_device, list(devdb), chunksize=8):
+        all_vlans.extend(vlans)
+        all_ints.extend(ints)
+        all_devs.extend(devs)
+        links.extend(dlinks)
+    pool.close()
+    pool.join()
+
+    return (all_vlans, all_ints, all_devs, links)
+
+
 ## Process Arguments to generate output
+# Parallel one pass parse
+if args.df and args.j:
+
+    devdb = loadDevicelist(args.df)
+
+    (vlan_list, interface_list, device_list, links) = \
+        process_devices_parallel(devdb, args.j)
+
+    if args.vfile:
+        save_vlan_file(vlan_list, args.vfile)
+    if args.ifile:
+        save_int_file(args.ifile)
+    if args.dfile:
+        save_device_file(args.dfile)
+    if args.lfile:
+        save_links_file(links, args.lfile)
+
 # Got VLAN Range and Switch Name
-if args.df:
+elif args.df:
 
     devdb = loadDevicelist(args.df)
 
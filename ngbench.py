@@ -0,0 +1,534 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) 2016 "Jonathan Yantis"
+#
+# This file is a part of NetGrph.
+#
+#    This program is free software: you can redistribute it and/or  modify
+#    it under the terms of the GNU Affero General Public License, version 3,
+#    as published by the Free Software Foundation.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#    As a special exception, the copyright holders give permission to link the
+#    code of portions of this program with the OpenSSL library under certain
+#    conditions as described in each individual source file and distribute
+#    linked combinations including the program with the OpenSSL library. You
+#    must comply with the GNU Affero General Public License in all respects
+#    for all of the code used other than as permitted herein. If you modify
+#    file(s) with this exception, you may extend this exception to your
+#    version of the file(s), but you are not obligated to do so. If you do not
+#    wish to do so, delete this exception statement from your version. If you
+#    delete this exception statement from all source files in the program,
+#    then also delete it in the license file.
+#
+"""
+ NetGrph Benchmarks
+ - Generates a synthetic campus topology as ngupdate CSV files
+ - Times each ngupdate stage and a mix of path, VLAN, device and IP queries
+ - Measures report ngtree memory as dicts and as compact NGTrees
+ - Writes JSON results that can be compared between commits
+"""
+import re
+import os
+import sys
+import csv
+import json
+import time
+import random
+import argparse
+import platform
+import statistics
+import subprocess
+import ipaddress
+import tracemalloc
+from timeit import default_timer as timer
+
+# Default Config File Location
+config_file = '/etc/netgrph.ini'
+alt_config = './docs/netgrph.ini'
+
+# Test/Dev Config File
+dirname = os.path.dirname(os.path.realpath(__file__))
+if re.search(r'\/dev$', dirname):
+    config_file = 'netgrphdev.ini'
+elif re.search(r'\/test$', dirname):
+    config_file = "netgrphdev.ini"
+
+# CSV file names per ngfiles key, as in test/csv
+csv_files = {
+    'vrfs': 'vrfs.csv',
+    'devices': 'devices.csv',
+    'device_info': 'devinfo.csv',
+    'neighbors': 'nd.csv',
+    'networks': 'allnets.csv',
+    'vlans': 'allvlans.csv',
+    'supernets': 'supernets.csv',
+    'firewalls': 'firewalls.csv',
+    'links': 'links.csv',
+}
+
+# Generated VRFs, every tenth network is in the second
+bench_vrfs = ('default', 'guest')
+
+# Generator parameters are saved alongside the CSVs
+bench_meta = 'bench.json'
+
+depth = "20"
+
+
+def generate(csvdir, switches=1000, domains=10, networks=10000, vlans=4000,
+             access_vlans=8, seed=1):
+    """
+    Write a synthetic campus topology to csvdir
+
+    - Two cores (core1, core2) connect to one MDF router per domain over
+      routed /31 links in each VRF, every other switch hangs off its
+      domain MDF
+    - Each MDF carries all domain VLANs, access switches trunk a block of
+      access_vlans of them
+    - Networks are spread across the MDFs, every tenth in the guest VRF
+    """
+
+    rand = random.Random(seed)
+    os.makedirs(csvdir, exist_ok=True)
+
+    vids = list(range(2, min(vlans, 4093) + 2))
+    per_domain, extra = divmod(max(domains, switches - 2), domains)
+
+    devices = [('core1', 'Core', 'Primary'), ('core2', 'Core', 'Standby')]
+    nd = []
+    links = []
+    vlan_rows = []
+    net_rows = []
+    ports = dict()
+
+    def next_port(dev, prefix='Gi'):
+        ports[dev] = ports.get(dev, 0) + 1
+        num = ports[dev] - 1
+        return '{}{}/0/{}'.format(prefix, num // 48 + 1, num % 48 + 1)
+
+    def connect(dev1, dev2, native, vlist, prefix='Gi'):
+        port1 = next_port(dev1, prefix)
+        port2 = next_port(dev2, prefix)
+        nd.append((dev1, port1, dev2, port2))
+        nd.append((dev2, port2, dev1, port1))
+        links.append((port1, dev1, 0, dev2, native, vlist))
+        links.append((port2, dev2, 0, dev1, native, vlist))
+
+    p2p = ipaddress.ip_network('172.16.0.0/12').subnets(new_prefix=31)
+    core_mgmt = 'Core'
+
+    mdfs = []
+    for d in range(domains):
+        mgmt = 'BLD{:04d}'.format(d)
+        mdf = 'bld{:04d}mdf'.format(d)
+        mdfs.append((mdf, mgmt))
+        devices.append((mdf, mgmt, 'Primary'))
+
+        # Routed uplinks with a transit VLAN per VRF on each core, both ends
+        # of each /31 are routed so the MDF is L3 adjacent to the core
+        for c, (core, stp) in enumerate((('core1', 24576), ('core2', 28672))):
+            transits = [vids[(d * 4 + c * 2 + v) % len(vids)] for v in range(len(bench_vrfs))]
+            connect(core, mdf, transits[0], ','.join(str(t) for t in transits), prefix='Eth')
+            net = next(p2p)
+            for vrf, transit in zip(bench_vrfs, transits):
+                desc = mdf + '-' + core + ' vrf ' + vrf
+                net_rows.append((str(net), transit, vrf, core, str(net[0]),
+                                 core_mgmt, desc, True, False))
+                net_rows.append((str(net), transit, vrf, mdf, str(net[1]),
+                                 mgmt, desc, True, False))
+                vlan_rows.append((core_mgmt, transit, core + '-' + mdf + '-' + vrf, core, stp))
+
+        for vid in vids:
+            vlan_rows.append((mgmt, vid, 'vlan' + str(vid), mdf, 24576))
+
+        for n in range(1, per_domain + (d < extra)):
+            sw = 'bld{:04d}sw{}'.format(d, n)
+            devices.append((sw, mgmt, 'Switch'))
+
+            start = rand.randrange(0, max(1, len(vids) - access_vlans + 1))
+            block = vids[start:start + access_vlans]
+            connect(mdf, sw, 1, '{}-{}'.format(block[0], block[-1]))
+            for vid in block:
+                vlan_rows.append((mgmt, vid, 'vlan' + str(vid), sw, 0))
+
+    connect('core1', 'core2', 1, '1-4094', prefix='Eth')
+
+    # Size subnets so all networks fit in 10/8
+    prefix = min(30, max(24, 8 + (max(networks, 2) - 1).bit_length()))
+    subnets = ipaddress.ip_network('10.0.0.0/8').subnets(new_prefix=prefix)
+    for i in range(networks):
+        net = next(subnets)
+        mdf, mgmt = mdfs[i % len(mdfs)]
+        vid = vids[(i // len(mdfs)) % len(vids)]
+        vrf = bench_vrfs[1] if i % 10 == 9 else bench_vrfs[0]
+        net_rows.append((str(net), vid, vrf, mdf, str(net[1]), mgmt,
+                         mdf + ' vlan ' + str(vid), False, False))
+
+    write_csv(csvdir, 'devices', ['Device', 'FQDN', 'MgmtGroup', 'Type'],
+              [(d, d + '.bench.local', m, t) for d, m, t in devices])
+    write_csv(csvdir, 'device_info', ['Device', 'Location'], [])
+    write_csv(csvdir, 'neighbors', ['LocalName', 'LocalPort', 'RemoteName', 'RemotePort'], nd)
+    write_csv(csvdir, 'links', ['Port', 'Switch', 'channel', 'desc', 'native', 'vlans'], links)
+    write_csv(csvdir, 'vlans', ['MGMT', 'VID', 'VName', 'Switch', 'STP'], vlan_rows)
+    write_csv(csvdir, 'networks', ['Subnet', 'VLAN', 'VRF', 'Router', 'Gateway',
+                                   'MGMT Group', 'Description', 'P2P', 'Standby'], net_rows)
+    write_csv(csvdir, 'supernets', ['cidr', 'role', 'description', 'secure'],
+              [('10.0.0.0/8', 'campus', 'Benchmark Campus', 100)])
+    write_csv(csvdir, 'firewalls', ['Name', 'Interface', 'Description', 'Security-Level',
+                                    'IP', 'Hostname', 'Log-Index'], [])
+
+    # VRFs have no header
+    with open(os.path.join(csvdir, csv_files['vrfs']), 'w', newline='') as f:
+        csv.writer(f).writerows([('default', 100, 'Default Routing Table'),
+                                 ('guest', 10, 'Guest Network')])
+
+    meta = {'switches': len(devices), 'domains': domains, 'networks': len(net_rows),
+            'vlans': len(vids), 'access_vlans': access_vlans, 'seed': seed,
+            'rows': {'neighbors': len(nd), 'links': len(links), 'vlans': len(vlan_rows)}}
+    with open(os.path.join(csvdir, bench_meta), 'w') as f:
+        json.dump(meta, f, indent=2, sort_keys=True)
+
+    return meta
+
+
+def write_csv(csvdir, key, header, rows):
+    """Write rows with header to the CSV for ngfiles key"""
+
+    with open(os.path.join(csvdir, csv_files[key]), 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        writer.writerows(rows)
+
+
+def get_ngfiles(csvdir):
+    """ngfiles mapping for the CSVs in csvdir"""
+
+    ngfiles = dict()
+    for key in csv_files:
+        ngfiles[key] = os.path.join(csvdir, csv_files[key])
+    return ngfiles
+
+
+def run_stages(ngfiles, bulk=False):
+    """Run the ngupdate -full stages in order, returns {stage: seconds}"""
+
+    times = dict()
+    for name, func in nglib.delta.get_full_stages(ngfiles, bulk=bulk):
+        start = timer()
+        func()
+        times[name] = round(timer() - start, 3)
+        print("Stage {:<14} {:>10.3f}sec".format(name, times[name]), file=sys.stderr)
+
+    nglib.update_graph_marker()
+
+    return times
+
+
+def get_samples(ngfiles, count, seed=1):
+    """Pick query arguments for each query type from the CSVs"""
+
+    rand = random.Random(seed)
+
+    devices = list(nglib.importCSVasDict(ngfiles['devices']))
+    vlans = list(nglib.importCSVasDict(ngfiles['vlans']))
+    nets = [n for n in nglib.importCSVasDict(ngfiles['networks'])
+            if n['P2P'] != 'True' and n['VRF'] == 'default']
+    switches = [d['Device'] for d in devices if d['Type'] == 'Switch'] \
+        or [d['Device'] for d in devices]
+
+    def hosts():
+        return [str(ipaddress.ip_network(n['Subnet'])[2]) for n in rand.sample(nets, 2)]
+
+    samples = {'device': [], 'vlan': [], 'net': [], 'switched_path': [],
+               'routed_path': [], 'full_path': []}
+
+    for _ in range(count):
+        samples['device'].append((rand.choice(devices)['Device'],))
+        vlan = rand.choice(vlans)
+        samples['vlan'].append((vlan['MGMT'] + '-' + vlan['VID'],))
+        samples['net'].append((hosts()[0],))
+        samples['switched_path'].append(tuple(rand.sample(switches, 2)))
+        samples['routed_path'].append(tuple(hosts()))
+        samples['full_path'].append(tuple(hosts()))
+
+    return samples
+
+
+def run_queries(samples):
+    """Time each query sample, returns per query type statistics"""
+
+    queries = {
+        'device': lambda dev: nglib.query.dev.get_device(dev, rtype="NGTREE"),
+        'vlan': lambda vname: nglib.query.vlan.get_vtree(vname, rtype="NGTREE"),
+        'net': lambda ip: nglib.query.net.get_net(ip, rtype="NGTREE", verbose=False),
+        'switched_path': lambda sw1, sw2: nglib.query.path.get_switched_path(
+            sw1, sw2, {"onepath": False, "depth": depth}, rtype="NGTREE"),
+        'routed_path': lambda ip1, ip2: nglib.query.path.get_routed_path(
+            ip1, ip2, {"onepath": False, "VRF": "default", "depth": depth}, rtype="NGTREE"),
+        'full_path': lambda ip1, ip2: nglib.query.path.get_full_path(
+            ip1, ip2, {"onepath": True, "depth": depth}, rtype="NGTREE"),
+    }
+
+    results = dict()
+    for name in sorted(queries):
+
+        # Time uncached lookups
+        nglib.query.cache.clear_cache()
+
+        times = []
+        errors = 0
+        for qargs in samples[name]:
+            start = timer()
+            try:
+                queries[name](*qargs)
+            except Exception as e:
+                errors += 1
+                logger.warning("Benchmark %s%s failed: %s", name, qargs, e)
+            times.append(timer() - start)
+
+        results[name] = get_stats(times)
+        results[name]['errors'] = errors
+        print("Query {:<15} {:>10.3f}sec median {:>6} errors".format(
+            name, results[name]['median'], errors), file=sys.stderr)
+
+    return results
+
+
+def get_memory(ngfiles):
+    """Memory used by device and VLAN report ngtrees, as dicts and compact"""
+
+    devices = list(nglib.importCSVasDict(ngfiles['devices']))
+    vlans = list(nglib.importCSVasDict(ngfiles['vlans']))
+
+    def dev_report():
+        ngtree = nglib.ngtree.get_ngtree("Report", tree_type="DEVS")
+        for d in devices:
+            ct = nglib.ngtree.get_ngtree(d['Device'], tree_type="DEV")
+            ct['Distance'] = 0
+            ct['FQDN'] = d['FQDN']
+            ct['Location'] = None
+            ct['MGMT Group'] = d['MgmtGroup']
+            ct['Model'] = None
+            ct['Platform'] = None
+            ct['Version'] = None
+            nglib.ngtree.add_child_ngtree(ngtree, ct)
+        return ngtree
+
+    def vlan_report():
+        ngtree = nglib.ngtree.get_ngtree("Report", tree_type="VIDs")
+        vtrees = dict()
+        for v in vlans:
+            vname = v['MGMT'] + '-' + v['VID']
+            if vname not in vtrees:
+                vtrees[vname] = nglib.ngtree.get_ngtree(vname, tree_type="VLAN")
+                vtrees[vname]['VID'] = v['VID']
+                vtrees[vname]['MGMT'] = v['MGMT']
+                vtrees[vname]['Desc'] = v['VName']
+                nglib.ngtree.add_child_ngtree(ngtree, vtrees[vname])
+            st = nglib.ngtree.get_ngtree(v['Switch'], tree_type="Switch")
+            st['STP'] = v['STP']
+            nglib.ngtree.add_child_ngtree(vtrees[vname], st)
+        return ngtree
+
+    results = dict()
+    compact = nglib.compact_trees
+    try:
+        for name, build in (('dev_report', dev_report), ('vlan_report', vlan_report)):
+            sizes = dict()
+            output = dict()
+            for mode in ('dict', 'compact'):
+                nglib.compact_trees = mode == 'compact'
+                tracemalloc.start()
+                ngtree = build()
+                sizes[mode] = tracemalloc.get_traced_memory()[0]
+                tracemalloc.stop()
+                output[mode] = nglib.ngtree.export.get_JSON(ngtree)
+                del ngtree
+
+            results[name] = sizes
+            results[name]['saved'] = round((1 - sizes['compact'] / sizes['dict']) * 100, 1)
+            results[name]['identical'] = output['dict'] == output['compact']
+            print("Memory {:<14} {:>10.1f}MB dict {:>8.1f}MB compact".format(
+                name, sizes['dict'] / 1e6, sizes['compact'] / 1e6), file=sys.stderr)
+    finally:
+        nglib.compact_trees = compact
+
+    return results
+
+
+def get_stats(times):
+    """Summarize a list of timings"""
+
+    times = sorted(times)
+    if not times:
+        return {'count': 0}
+
+    return {
+        'count': len(times),
+        'total': round(sum(times), 4),
+        'min': round(times[0], 4),
+        'median': round(statistics.median(times), 4),
+        'p95': round(times[min(len(times) - 1, int(len(times) * 0.95))], 4),
+        'max': round(times[-1], 4),
+    }
+
+
+def get_commit():
+    """Current git commit, if available"""
+
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       cwd=dirname, stderr=subprocess.DEVNULL,
+                                       universal_newlines=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(old_file, new_file):
+    """Print stage and query timings of two result files side by side"""
+
+    with open(old_file) as f:
+        old = json.load(f)
+    with open(new_file) as f:
+        new = json.load(f)
+
+    print("{:<28} {:>10} {:>10} {:>8}".format(
+        '', str(old['meta'].get('commit')), str(new['meta'].get('commit')), 'change'))
+
+    rows = []
+    for stage in new.get('stages', {}):
+        rows.append(('stage ' + stage, old.get('stages', {}).get(stage),
+                     new['stages'][stage]))
+    for query in new.get('queries', {}):
+        rows.append(('query ' + query,
+                     old.get('queries', {}).get(query, {}).get('median'),
+                     new['queries'][query].get('median')))
+    for report in new.get('memory', {}):
+        for mode in ('dict', 'compact'):
+            rows.append(('memory {} {}'.format(report, mode),
+                         old.get('memory', {}).get(report, {}).get(mode),
+                         new['memory'][report].get(mode)))
+
+    for name, before, after in rows:
+        change = ''
+        if before and after is not None:
+            change = "{:+.1f}%".format((after - before) / before * 100)
+        print("{:<28} {:>10} {:>10} {:>8}".format(name, str(before), str(after), change))
+
+
+parser = argparse.ArgumentParser(description='Benchmark NetGrph imports and queries')
+parser.add_argument("-gen", metavar='dir', help="Generate synthetic CSVs in dir", type=str)
+parser.add_argument("-run", help="Import and query the benchmark CSVs", action="store_true")
+parser.add_argument("-compare", metavar='file', nargs=2,
+                    help="Compare two result files (old new)", type=str)
+parser.add_argument("--csvdir", metavar='dir',
+                    help="CSV directory for -run (default: [ngfiles] in config)", type=str)
+parser.add_argument("--switches", help="Total switches (default 1000)", type=int, default=1000)
+parser.add_argument("--domains", help="Management domains (default 10)", type=int, default=10)
+parser.add_argument("--networks", help="Networks (default 10000)", type=int, default=10000)
+parser.add_argument("--vlans", help="VLANs per domain (default 4000)", type=int, default=4000)
+parser.add_argument("--accessVlans", help="VLANs per access switch (default 8)",
+                    type=int, default=8)
+parser.add_argument("--seed", help="Random seed (default 1)", type=int, default=1)
+parser.add_argument("--samples", help="Queries per type (default 20)", type=int, default=20)
+parser.add_argument("--skipImport", help="Only time queries on -run", action="store_true")
+parser.add_argument("--dropDatabase", help="Drop all data before -run (Warning: drops all data)",
+                    action="store_true")
+parser.add_argument("--bulk", help="Use batched bulk imports", action="store_true")
+parser.add_argument("--output", metavar='file', help="Write JSON results to file", type=str)
+parser.add_argument("--conf", metavar='file', help="Alternate Config File", type=str)
+parser.add_argument("--debug", help="Set debugging level", type=int)
+
+args = parser.parse_args()
+
+if args.gen:
+    meta = generate(args.gen, switches=args.switches, domains=args.domains,
+                    networks=args.networks, vlans=args.vlans,
+                    access_vlans=args.accessVlans, seed=args.seed)
+    print(json.dumps(meta, indent=2, sort_keys=True))
+
+elif args.compare:
+    compare(args.compare[0], args.compare[1])
+
+elif args.run:
+    import logging
+    import configparser
+    import nglib
+    import nglib.delta
+    import nglib.query
+    import nglib.query.cache
+    import nglib.ngtree
+
+    # Alternate Config File
+    if args.conf:
+        config_file = args.conf
+
+    # Test configuration exists
+    if not os.path.exists(config_file):
+        if not os.path.exists(alt_config):
+            raise Exception("Configuration File not found", config_file)
+        else:
+            config_file = alt_config
+
+    nglib.verbose = 0
+    if args.debug:
+        nglib.verbose = args.debug
+
+    nglib.init_nglib(config_file)
+    logger = logging.getLogger("ngbench")
+
+    if args.csvdir:
+        ngfiles = get_ngfiles(args.csvdir)
+        meta_file = os.path.join(args.csvdir, bench_meta)
+    else:
+        config = configparser.ConfigParser()
+        config.read(config_file)
+        ngfiles = config['ngfiles']
+        meta_file = None
+
+    results = {'meta': {
+        'commit': get_commit(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'bulk': args.bulk,
+        'samples': args.samples,
+    }}
+    if meta_file and os.path.exists(meta_file):
+        with open(meta_file) as f:
+            results['meta']['scale'] = json.load(f)
+
+    if args.dropDatabase:
+        nglib.drop_database()
+
+    if not args.skipImport:
+        start = timer()
+        results['stages'] = run_stages(ngfiles, bulk=args.bulk)
+        results['meta']['import_total'] = round(timer() - start, 3)
+
+    results['queries'] = run_queries(get_samples(ngfiles, args.samples, seed=args.seed))
+    results['memory'] = get_memory(ngfiles)
+
+    output = json.dumps(results, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+    # Timings of queries that never succeeded are meaningless
+    failed = [q for q in sorted(results['queries'])
+              if results['queries'][q]['count'] and
+              results['queries'][q]['errors'] == results['queries'][q]['count']]
+    if failed:
+        sys.exit("Error: Every sample failed for queries: " + ', '.join(failed))
+
+else:
+    parser.print_help()
@@ -44,6 +44,8 @@ import pwd
 import datetime
 import configparser
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 try:
     from neo4j.v1 import TRUST_ON_FIRST_USE, TRUST_SIGNED_CERTIFICATES, SSL_AVAILABLE
@@ -53,6 +55,8 @@ try:
 except ImportError:
     pass
 
+import nglib.graph
+
 logger = logging.getLogger(__name__)
 
 # Global variables (all library global variables go here)
@@ -66,13 +70,42 @@ user = pwd.getpwuid(os.getuid())[0]
 bolt_ses = None
 py2neo_ses = None
 
+# Shared Bolt driver and connection pool size
+bolt_driver = None
+pool_size = 5
+pool_lock = threading.Lock()
+pool_stats = {'borrowed': 0, 'returned': 0, 'in_use': 0, 'peak': 0}
+
+# Worker threads for concurrent query lookups (0 runs them in order)
+query_workers = 0
+query_pool = None
+
 # Topology Variables
 max_distance = 100
 dev_seeds = None
 
+# Switched path engine (neo4j or memory)
+path_engine = 'neo4j'
+
+# Rows deleted per transaction when aging out nodes and edges
+delete_chunk = 10000
+
+# Query result cache entries and their lifetime in seconds (0 disables)
+cache_size = 0
+cache_ttl = 300
+
 # NetDB Enabled
 use_netdb = False
 
+# Rows per transaction for bulk UNWIND writes
+batch_size = 5000
+
+# Graph storage backend for nglib.graph
+graph_backend = 'neo4j'
+
+# Build ngtrees as compact NGTree nodes instead of dicts
+compact_trees = False
+
 def get_bolt_db():
     """Return Bolt Session"""
 
@@ -83,6 +116,96 @@ def get_bolt_db():
 
     return get_db_client(dbhost, dbuser, dbpass, bolt=True)
 
+def get_bolt_driver():
+    """Return the process-wide Bolt driver, created on first use"""
+
+    global bolt_driver
+
+    with pool_lock:
+        if bolt_driver is None:
+            dbuser = config['nglib']['dbuser']
+            dbpass = config['nglib']['dbpass']
+            dbhost = config['nglib']['dbhost']
+            bolt_driver = get_db_driver(dbhost, dbuser, dbpass)
+
+    return bolt_driver
+
+
+class LocalSession(object):
+    """
+    Thread-local Bolt session borrowed from the shared driver
+
+    - Drop-in for bolt_ses (run and begin_transaction)
+    - Each thread borrows its own pooled session on first use
+    - close() returns the thread's session to the driver pool
+    """
+
+    def __init__(self):
+        self.local = threading.local()
+
+    def session(self):
+        """Return this thread's session, borrowing one if needed"""
+
+        ses = getattr(self.local, 'session', None)
+        if ses is None:
+            ses = self.local.session = get_bolt_driver().session()
+            with pool_lock:
+                pool_stats['borrowed'] += 1
+                pool_stats['in_use'] += 1
+                if pool_stats['in_use'] > pool_stats['peak']:
+                    pool_stats['peak'] = pool_stats['in_use']
+        return ses
+
+    def run(self, statement, parameters=None):
+        """Run a statement on this thread's session"""
+        return self.session().run(statement, parameters)
+
+    def begin_transaction(self):
+        """Begin a transaction on this thread's session"""
+        return self.session().begin_transaction()
+
+    def close(self):
+        """Return this thread's session to the pool"""
+
+        ses = getattr(self.local, 'session', None)
+        if ses is not None:
+            self.local.session = None
+            ses.last_result = None
+            ses.close()
+            with pool_lock:
+                pool_stats['returned'] += 1
+                pool_stats['in_use'] -= 1
+
+
+def get_pool_stats():
+    """Return Bolt session pool counters"""
+
+    with pool_lock:
+        stats = pool_stats.copy()
+    stats['pool_size'] = pool_size
+
+    return stats
+
+
+def get_query_pool():
+    """
+    Return the shared query thread pool, or None when query_workers is 0
+
+    Notes: Only enable with thread-safe sessions (LocalSession)
+    """
+
+    global query_pool
+
+    if not query_workers:
+        return None
+
+    with pool_lock:
+        if query_pool is None:
+            query_pool = ThreadPoolExecutor(max_workers=query_workers)
+
+    return query_pool
+
+
 def get_py2neo_db():
     """Return Bolt Session"""
 
@@ -100,11 +223,8 @@ def get_db_client(dbhost, dbuser, dbpass, bolt=False):
         print("DB Creds", dbhost, dbuser, dbpass)
 
     if bolt:
-        bolt_url = "bolt://" + dbhost
-        auth_token = basic_auth(dbuser, dbpass)
         try:
-            driver = GraphDatabase.driver(bolt_url, auth=auth_token, max_pool_size=5)
-            bolt_session = driver.session()
+            bolt_session = get_db_driver(dbhost, dbuser, dbpass).session()
             return bolt_session
         except Exception as e:
             print("Database connection/authentication error:", e)
@@ -114,6 +234,14 @@ def get_db_client(dbhost, dbuser, dbpass, bolt=False):
         py2neo_session = Graph(login)
         return py2neo_session
 
+def get_db_driver(dbhost, dbuser, dbpass):
+    """Return a Bolt driver with a pool of pool_size sessions"""
+
+    bolt_url = "bolt://" + dbhost
+    auth_token = basic_auth(dbuser, dbpass)
+
+    return GraphDatabase.driver(bolt_url, auth=auth_token, max_pool_size=pool_size)
+
 def drop_database():
     """Drop all database data (requires a full import to restore)"""
 
@@ -137,6 +265,74 @@ def import_cypher(fileName):
             if test:
                 logger.info('Executed ' + test.statement)
 
+def chunk_list(rows, size=None):
+    """Yield successive lists of size (default batch_size) from rows"""
+
+    if not size:
+        size = batch_size
+
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def run_batched(query, rows, size=None, **params):
+    """
+    Run an UNWIND {rows} AS row query over rows in batched transactions
+
+    - Each chunk of rows is committed in its own Bolt transaction
+    - Extra keyword params are passed to every chunk
+    - Returns the number of rows sent to the database
+    """
+
+    count = 0
+
+    for chunk in chunk_list(rows, size):
+        params['rows'] = chunk
+        tx = bolt_ses.begin_transaction()
+        tx.run(query, params)
+        tx.commit()
+        count = count + len(chunk)
+
+    return count
+
+
+def get_graph_marker():
+    """Return the last graph update time stamped by ngupdate (or None)"""
+
+    meta = get_graph_meta()
+    return meta.get('updated')
+
+
+def get_graph_version():
+    """Return the graph version counter bumped by ngupdate (or None)"""
+
+    meta = get_graph_meta()
+    return meta.get('version')
+
+
+def get_graph_meta():
+    """Return the NGMeta graph node properties (empty if never stamped)"""
+
+    return nglib.graph.get_graph().get_node('NGMeta', 'graph') or dict()
+
+
+def update_graph_marker():
+    """
+    Stamp the graph as updated and bump its version
+
+    Notes: Uses updated instead of time so the marker never ages out
+    """
+
+    nglib.graph.get_graph().increment(
+        'NGMeta', 'graph', 'version', props={'updated': get_time()})
+
+
 def get_time(hours=None):
     """Get current time, optionally time shifted by hours"""
 
@@ -188,6 +384,14 @@ def init_nglib(configFile, initdb=True):
     global bolt_ses
     global py2neo_ses
     global use_netdb
+    global batch_size
+    global path_engine
+    global pool_size
+    global cache_size
+    global cache_ttl
+    global delete_chunk
+    global graph_backend
+    global compact_trees
 
     if verbose > 1:
         print("Config File", configFile)
@@ -206,6 +410,16 @@ def init_nglib(configFile, initdb=True):
     if use_netdb:
         use_netdb = True
 
+    # Bolt Session Pool
+    if 'pool_size' in config['nglib']:
+        pool_size = int(config['nglib']['pool_size'])
+
+    # Query Result Cache
+    if 'cache_size' in config['nglib']:
+        cache_size = int(config['nglib']['cache_size'])
+    if 'cache_ttl' in config['nglib']:
+        cache_ttl = float(config['nglib']['cache_ttl'])
+
     if initdb:
         # DB Credentials
         dbuser = config['nglib']['dbuser']
@@ -221,6 +435,25 @@ def init_nglib(configFile, initdb=True):
     # Topology
     max_distance = int(config['topology']['max_distance'])
     dev_seeds = config['topology']['seeds']
+    if 'path_engine' in config['topology']:
+        path_engine = config['topology']['path_engine']
+
+    # Bulk Import Transaction Size
+    if 'batch_size' in config['nglib']:
+        batch_size = int(config['nglib']['batch_size'])
+    if 'delete_chunk' in config['nglib']:
+        delete_chunk = int(config['nglib']['delete_chunk'])
+
+    # Graph Storage Backend
+    if 'graph_backend' in config['nglib']:
+        graph_backend = config['nglib']['graph_backend']
+
+    if graph_backend not in nglib.graph.backends:
+        raise Exception("Unsupported graph_backend: " + graph_backend + " (use neo4j)")
+
+    # Compact ngtrees
+    if 'compact_trees' in config['nglib']:
+        compact_trees = config.getboolean('nglib', 'compact_trees')
 
     logger.debug("Initialized Configuration Successfully")
 
@@ -28,10 +28,16 @@
 #    delete this exception statement from all source files in the program,
 #    then also delete it in the license file.
 
-"""NetGrph Cache Management"""
+"""
+NetGrph Cache Management
+
+ - Ages out nodes and edges whose time is older than a number of hours
+ - Works one label or relationship type at a time so indexes can be used
+ - Deletes in chunks of delete_chunk rows, each in its own transaction
+"""
 
 import logging
-from nglib.query.nNode import getRelationship, getLabel, getJSONProperties
+from timeit import default_timer as timer
 import nglib
 
 logger = logging.getLogger(__name__)
@@ -42,6 +48,7 @@ def clear_edges(hours):
     Clear Expired Edges
 
     Notes: nglib.verbose returns edges to delete but does not delete
+    Returns expired edge counts by relationship type
     """
 
     logger.info("Clearing Edges older than " + str(hours) + " hours")
@@ -49,33 +56,34 @@ def clear_edges(hours):
     # Time shifted datetime
     age = nglib.get_time(hours=hours)
 
-    edges = nglib.py2neo_ses.cypher.execute(
-        'MATCH ()-[e]->() WHERE e.time < {age} RETURN e',
-        age=age)
-
-    if len(edges) > 0:
-        for e in edges:
-            neighbors = getRelationship(e.e)
-            logger.info("Expired Edge: " + neighbors)
+    results = nglib.bolt_ses.run('CALL db.relationshipTypes() YIELD relationshipType')
+    rtypes = sorted(r['relationshipType'] for r in results)
 
-        count = nglib.py2neo_ses.cypher.execute(
-            'MATCH ()-[e]->() WHERE e.time < {age} RETURN count(e) as count',
-            age=age)
+    counts = dict()
+    for rtype in rtypes:
+        match = 'MATCH ()-[e:`' + rtype + '`]->() WHERE e.time < {age} '
 
         if nglib.verbose:
-            logger.info("Expired Edges: " + str(count[0].count))
+            counts[rtype] = count_expired(match + 'RETURN count(e) AS count', age)
+            if counts[rtype]:
+                logger.info("Expired %s Edges: %s", rtype, counts[rtype])
         else:
-            logger.info("Deleting Edges: " + str(count[0].count))
-            nglib.py2neo_ses.cypher.execute(
-                'MATCH ()-[e]->() WHERE e.time < {age} DELETE e',
-                age=age)
+            counts[rtype] = delete_chunked(
+                match + 'WITH e LIMIT {chunk} DELETE e RETURN count(e) AS count',
+                age, rtype + ' Edges')
+
+    logger.info("%s Edges: %s", "Expired" if nglib.verbose else "Deleted",
+                sum(counts.values()))
+
+    return counts
 
 
 def clear_nodes(hours):
     """
-    Clear Expired Nodes
+    Clear Expired Nodes (and their edges)
 
     Notes: verbose returns nodes to delete but does not delete
+    Returns expired node counts by label
     """
 
     logger.info("Finding Nodes to Clear older than " + str(hours) + " hours")
@@ -83,33 +91,72 @@ def clear_nodes(hours):
     # Time shifted datetime
     age = nglib.get_time(hours=hours)
 
-    nodes = nglib.py2neo_ses.cypher.execute(
-        'MATCH (n) WHERE n.time < {age} RETURN n',
-        age=age)
+    results = nglib.bolt_ses.run('CALL db.labels() YIELD label')
+    labels = sorted(r['label'] for r in results)
+
+    counts = dict()
+    for label in labels:
+        match = 'MATCH (n:`' + label + '`) WHERE n.time < {age} '
+
+        if nglib.verbose:
+            counts[label] = count_expired(match + 'RETURN count(n) AS count', age)
+            if counts[label]:
+                logger.info("Expired %s Nodes: %s", label, counts[label])
+        else:
+            counts[label] = delete_chunked(
+                match + 'WITH n LIMIT {chunk} DETACH DELETE n RETURN count(n) AS count',
+                age, label + ' Nodes')
+
+    logger.info("%s Nodes: %s", "Expired" if nglib.verbose else "Deleted",
+                sum(counts.values()))
+
+    return counts
+
+
+def count_expired(query, age):
+    """Return the count from an expired count query"""
+
+    for r in nglib.bolt_ses.run(query, {'age': age}):
+        return r['count']
+
+    return 0
+
+
+def delete_chunked(query, age, name):
+    """
+    Run a LIMIT {chunk} delete query until it deletes less than a chunk
+
+    Returns the total deleted and logs throughput
+    """
+
+    start = timer()
+    total = 0
 
-    if len(nodes) > 0:
+    while True:
+        count = run_chunk(query, age)
+        total = total + count
+        if count < nglib.delete_chunk:
+            break
+        logger.debug("Deleted %s %s so far", total, name)
 
-        for r in nodes:
-            label = getLabel(r.n)
-            pj = getJSONProperties(r.n)
-            logger.info("Expired Node: " + label + pj['name'])
+    if total:
+        runtime = timer() - start
+        logger.info("Deleted %s %s in %.3fsec (%d/sec)",
+                    total, name, runtime, total / runtime if runtime else total)
 
-        count = nglib.py2neo_ses.cypher.execute(
-            'MATCH (n) WHERE n.time < {age} RETURN count(n) as count',
-            age=age)
+    return total
 
-        logger.info("Expired Nodes: " + str(count[0].count))
 
-        if not nglib.verbose:
-            logger.info("Deleting Nodes: " + str(count[0].count))
+def run_chunk(query, age):
+    """Delete one chunk in its own transaction, returns the count deleted"""
 
-            nglib.py2neo_ses.cypher.execute(
-                'MATCH (n)-[e]-() WHERE n.time < {age} DELETE e',
-                age=age)
+    tx = nglib.bolt_ses.begin_transaction()
+    count = 0
+    for r in tx.run(query, {'age': age, 'chunk': nglib.delete_chunk}):
+        count = r['count']
+    tx.commit()
 
-            nglib.py2neo_ses.cypher.execute(
-                'MATCH (n) WHERE n.time < {age} DELETE n',
-                age=age)
+    return count
 
 
 def swap_quotes(myString):
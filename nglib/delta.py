@@ -0,0 +1,472 @@
+#!/usr/bin/env python
+#
+# Copyright (c) 2016 "Jonathan Yantis"
+#
+# This file is a part of NetGrph.
+#
+#    This program is free software: you can redistribute it and/or  modify
+#    it under the terms of the GNU Affero General Public License, version 3,
+#    as published by the Free Software Foundation.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#    As a special exception, the copyright holders give permission to link the
+#    code of portions of this program with the OpenSSL library under certain
+#    conditions as described in each individual source file and distribute
+#    linked combinations including the program with the OpenSSL library. You
+#    must comply with the GNU Affero General Public License in all respects
+#    for all of the code used other than as permitted herein. If you modify
+#    file(s) with this exception, you may extend this exception to your
+#    version of the file(s), but you are not obligated to do so. If you do not
+#    wish to do so, delete this exception statement from your version. If you
+#    delete this exception statement from all source files in the program,
+#    then also delete it in the license file.
+#
+#
+"""
+Incremental (delta) imports for ngupdate -full
+
+ - Keeps a JSON manifest with a content hash per input file and per row key
+ - Only added and changed rows are pushed through the regular importers
+ - Unchanged rows get one bulk time touch so edge/node aging still works
+ - Removed rows are not touched and age out like they do on a full import
+ - A stage re-imports its whole file when a stage it depends on changed,
+   or when a stage imported after it changed on the last run (settle)
+ - Switch distances are recomputed before neighbors when either changes
+"""
+import csv
+import os
+import json
+import hashlib
+import logging
+import tempfile
+from functools import partial
+from collections import namedtuple, OrderedDict
+import nglib
+import nglib.dev_update
+import nglib.net_update
+import nglib.fw_update
+import nglib.vlan_update
+import nglib.secpath
+
+logger = logging.getLogger(__name__)
+
+manifest_version = 1
+
+# Import stage definition
+#  - files: ngfiles keys (first is the imported file)
+#  - header: CSV has a header row (VRFs are raw comma lines)
+#  - whole: any change re-imports the full file (links match both sides)
+#  - deps: earlier stages whose changes force a full import
+#  - settle: later stages whose changes force a full import on the next run
+Stage = namedtuple('Stage', ['name', 'files', 'header', 'whole', 'deps', 'settle',
+                             'touch'])
+
+touch_vrfs = [
+    'UNWIND {rows} AS row MATCH (v:VRF {name:row.name}) SET v.time = {time}'
+]
+
+touch_devices = [
+    'UNWIND {rows} AS row MATCH (s:Switch {name:row.Device}) SET s.time = {time}',
+    "UNWIND {rows} AS row MATCH (s:Switch:Router {name:row.Device})"
+    + "<-[e:VRF_ON]-(:VRF {name:'default'}) SET e.time = {time}",
+]
+
+touch_neighbors = [
+    'UNWIND {rows} AS row '
+    + 'MATCH (:Switch {name:row.LocalName})-[e:NEI|NEI_EQ]-(:Switch {name:row.RemoteName}) '
+    + 'WHERE (e.pPort = row.LocalPort AND e.cPort = row.RemotePort) '
+    + 'OR (e.cPort = row.LocalPort AND e.pPort = row.RemotePort) '
+    + 'SET e.time = {time}'
+]
+
+touch_networks = [
+    'UNWIND {rows} AS row MATCH (n:Network {vrfcidr:row.vrfcidr}) SET n.time = {time}',
+    'UNWIND {rows} AS row MATCH (n:Network {vrfcidr:row.vrfcidr})'
+    + '-[e:VRF_IN|ROUTED|ROUTED_BY|ROUTED_STANDBY|L3toL2]->() SET e.time = {time}',
+    'UNWIND {rows} AS row MATCH (:Switch:Router {name:row.router})'
+    + '<-[e:VRF_ON]-(:VRF {name:row.vrf}) SET e.time = {time}',
+]
+
+touch_supernets = [
+    'UNWIND {rows} AS row MATCH (s:Supernet {cidr:row.cidr}) SET s.time = {time}',
+    'UNWIND {rows} AS row MATCH (:Supernet {cidr:row.cidr})<-[e:SUPER]-() '
+    + 'SET e.time = {time}',
+]
+
+touch_firewalls = [
+    'UNWIND {rows} AS row MATCH (fw:Switch:Router:FW {name:row.name}) SET fw.time = {time}',
+    'UNWIND {rows} AS row MATCH (:Network {vid:row.vlan})-[e:ROUTED_FW]->'
+    + '(:Switch:Router:FW {name:row.name}) SET e.time = {time}',
+]
+
+touch_vlans = [
+    'UNWIND {rows} AS row MATCH (v:VLAN {name:row.vname}) SET v.time = {time}',
+    'UNWIND {rows} AS row MATCH (:VLAN {name:row.vname})-[e:Switched]->'
+    + '(:Switch {name:row.Switch}) SET e.time = {time}',
+]
+
+# Stages in -full import order
+stages = [
+    Stage('vrfs', ('vrfs',), False, False, (), (), touch_vrfs),
+    Stage('devices', ('devices', 'device_info'), True, False,
+          ('vrfs',), (), touch_devices),
+    Stage('neighbors', ('neighbors',), True, False, ('devices',), (), touch_neighbors),
+    Stage('networks', ('networks',), True, False,
+          ('vrfs', 'devices'), ('vlans',), touch_networks),
+    Stage('supernets', ('supernets',), True, False, ('networks',), (), touch_supernets),
+    Stage('firewalls', ('firewalls',), True, False, ('networks',), (), touch_firewalls),
+    Stage('vlans', ('vlans',), True, False, ('devices',), (), touch_vlans),
+    Stage('links', ('links',), True, True, ('neighbors', 'vlans'), (), None),
+]
+
+
+def get_full_stages(ngfiles, bulk=False):
+    """
+    Return the ngupdate -full import as (name, func) in run order
+
+    Notes: Shared with ngbench so benchmarks time the real full import
+    """
+
+    return [
+        ('vrfs', partial(nglib.dev_update.import_vrfs, ngfiles['vrfs'])),
+        ('devices', partial(nglib.dev_update.import_devicelist,
+                            ngfiles['devices'], ngfiles['device_info'])),
+        ('distances', partial(nglib.dev_update.update_distances, ngfiles['neighbors'])),
+        ('neighbors', partial(nglib.dev_update.import_neighbors,
+                              ngfiles['neighbors'], bulk=bulk)),
+        ('networks', partial(nglib.net_update.import_networks,
+                             ngfiles['networks'], bulk=bulk)),
+        ('supernets', partial(nglib.net_update.import_supernets, ngfiles['supernets'])),
+        ('firewalls', partial(nglib.fw_update.import_fw, ngfiles['firewalls'])),
+        ('secpaths', nglib.secpath.update_security_paths),
+        ('vlans', partial(nglib.vlan_update.import_vlans, ngfiles['vlans'])),
+        ('links', partial(nglib.vlan_update.import_links, ngfiles['links'])),
+        ('update_vlans', nglib.vlan_update.update_vlans),
+    ]
+
+
+def import_delta(ngfiles, bulk=False):
+    """
+    Incremental -full import driven by the ngfiles manifest
+
+    Notes: Without a manifest every row is pushed and a new manifest saved
+    """
+
+    manifest_file = ngfiles.get('manifest', 'ngmanifest.json')
+    manifest = load_manifest(manifest_file)
+    last_dirty = set(manifest['dirty'])
+
+    logger.info("Delta Import Requested (manifest %s)", manifest_file)
+
+    # Diff every stage up front so dependencies can force re-imports
+    diffs = OrderedDict()
+    for stage in stages:
+        diffs[stage.name] = diff_stage(stage, ngfiles, manifest['stages'].get(stage.name))
+
+    # Stages with changed rows, then stages settling from the last run
+    changed = get_dirty([n for n in diffs if has_changes(diffs[n])])
+    dirty = get_dirty(changed.union(
+        [s.name for s in stages if any(d in last_dirty for d in s.settle)]))
+    time = nglib.get_time()
+    reimport = set()
+
+    for stage in stages:
+        diff = diffs[stage.name]
+        full = stage.name in reimport
+        full = full or (stage.name in dirty and not has_changes(diff))
+        full = full or any(d in dirty for d in stage.deps) \
+            or (stage.whole and stage.name in dirty)
+
+        if full:
+            logger.info("Delta %s: full import of %d rows", stage.name, diff['rows'])
+            import_stage(stage, ngfiles, ngfiles[stage.files[0]], bulk)
+        else:
+            push_stage(stage, ngfiles, diff, time, bulk)
+
+        # New distances change NEI direction, so neighbors re-import in full
+        if stage.name == 'devices' and dirty.intersection(('devices', 'neighbors')):
+            if nglib.dev_update.update_distances(ngfiles['neighbors']):
+                reimport.add('neighbors')
+                dirty = get_dirty(dirty.union(reimport))
+
+    nglib.vlan_update.update_vlans()
+    nglib.secpath.update_security_paths()
+
+    # Only save after every stage completed
+    manifest['dirty'] = sorted(changed)
+    for name in diffs:
+        manifest['stages'][name] = diffs[name]['manifest']
+    save_manifest(manifest_file, manifest)
+
+
+def has_changes(diff):
+    """True if a stage diff has added, changed or removed rows"""
+
+    return bool(diff['added'] or diff['changed'] or diff['removed'])
+
+
+def get_dirty(names):
+    """Return a set of stage names plus every stage depending on them"""
+
+    dirty = set(names)
+
+    # Propagate to dependent stages until stable
+    found = True
+    while found:
+        found = False
+        for stage in stages:
+            if stage.name not in dirty and any(d in dirty for d in stage.deps):
+                dirty.add(stage.name)
+                found = True
+
+    return dirty
+
+
+def push_stage(stage, ngfiles, diff, time, bulk):
+    """Import added/changed rows from a temp CSV and touch unchanged rows"""
+
+    logger.info("Delta %s: %d added, %d changed, %d removed (aging), %d unchanged",
+                stage.name, len(diff['added']), len(diff['changed']),
+                len(diff['removed']), len(diff['unchanged']))
+
+    push = diff['added'] + diff['changed']
+    if push:
+        rows = []
+        for key in push:
+            rows.extend(diff['groups'][key])
+
+        tmpName = write_rows(diff['fields'], rows)
+        try:
+            import_stage(stage, ngfiles, tmpName, bulk)
+        finally:
+            os.unlink(tmpName)
+
+    if stage.touch and diff['unchanged']:
+        vrfmap = nglib.net_update.get_vrfmap()
+        rows = []
+        for key in diff['unchanged']:
+            for row in diff['groups'][key]:
+                rows.append(touch_row(stage, diff['fields'], row, vrfmap))
+
+        for query in stage.touch:
+            nglib.run_batched(query, rows, time=time)
+
+
+def import_stage(stage, ngfiles, fileName, bulk):
+    """Run the regular importer for a stage on fileName"""
+
+    if stage.name == 'vrfs':
+        nglib.dev_update.import_vrfs(fileName)
+    elif stage.name == 'devices':
+        nglib.dev_update.import_devicelist(fileName, ngfiles['device_info'])
+    elif stage.name == 'neighbors':
+        nglib.dev_update.import_neighbors(fileName, bulk=bulk)
+    elif stage.name == 'networks':
+        nglib.net_update.import_networks(fileName, bulk=bulk)
+    elif stage.name == 'supernets':
+        nglib.net_update.import_supernets(fileName)
+    elif stage.name == 'firewalls':
+        nglib.fw_update.import_fw(fileName)
+    elif stage.name == 'vlans':
+        nglib.vlan_update.import_vlans(fileName)
+    elif stage.name == 'links':
+        nglib.vlan_update.import_links(fileName)
+
+
+def diff_stage(stage, ngfiles, old):
+    """
+    Diff a stage's input files against its manifest entry
+
+    Returns row groups by key plus added, changed, removed and unchanged keys
+    """
+
+    fields, rows = read_rows(ngfiles[stage.files[0]], stage.header)
+
+    # Device info rows are hashed with their device
+    extra = dict()
+    if stage.name == 'devices':
+        ifields, irows = read_rows(ngfiles['device_info'], True)
+        for row in irows:
+            extra[dict(zip(ifields, row)).get('Device')] = row
+
+    vrfmap = nglib.net_update.get_vrfmap()
+    groups = OrderedDict()
+    for row in rows:
+        key = row_key(stage, fields, row, vrfmap)
+        if key is not None:
+            groups.setdefault(key, []).append(row)
+
+    fileHash = hashlib.sha1()
+    for name in stage.files:
+        fileHash.update(file_digest(ngfiles[name]).encode())
+    fileHash = fileHash.hexdigest()
+
+    digests = dict()
+    for key in groups:
+        digests[key] = hashlib.sha1(json.dumps(
+            [groups[key], extra.get(key)]).encode()).hexdigest()
+
+    diff = {'fields': fields, 'groups': groups, 'rows': len(rows),
+            'added': [], 'changed': [], 'removed': [], 'unchanged': [],
+            'manifest': {'file': fileHash, 'rows': digests}}
+
+    # Unchanged file, skip the row diff
+    if old and old['file'] == fileHash:
+        diff['unchanged'] = list(groups)
+        return diff
+
+    oldRows = dict()
+    if old:
+        oldRows = old['rows']
+
+    for key in groups:
+        if key not in oldRows:
+            diff['added'].append(key)
+        elif oldRows[key] != digests[key]:
+            diff['changed'].append(key)
+        else:
+            diff['unchanged'].append(key)
+
+    for key in oldRows:
+        if key not in groups:
+            diff['removed'].append(key)
+
+    return diff
+
+
+def row_key(stage, fields, row, vrfmap):
+    """Return the manifest key for a row (None skips the row)"""
+
+    if not stage.header:
+        if len(row) > 2:
+            return row[0]
+        return None
+
+    en = dict(zip(fields, row))
+
+    if stage.name == 'devices':
+        return en['Device']
+    elif stage.name == 'neighbors':
+        return en['LocalName'] + '|' + en['LocalPort']
+    elif stage.name == 'networks':
+        return get_net_vrf(en, vrfmap) + '-' + en['Subnet']
+    elif stage.name == 'supernets':
+        return en['cidr']
+    elif stage.name == 'firewalls':
+        return en['Name'] + '|' + en['Interface']
+    elif stage.name == 'vlans':
+        return en['MGMT'] + '-' + en['VID'] + '|' + en['Switch']
+    elif stage.name == 'links':
+        return en['Switch'] + '|' + en['Port']
+
+
+def touch_row(stage, fields, row, vrfmap):
+    """Return the UNWIND parameters to touch an unchanged row"""
+
+    if not stage.header:
+        return {'name': row[0]}
+
+    en = dict(zip(fields, row))
+
+    if stage.name == 'networks':
+        vrf = get_net_vrf(en, vrfmap)
+        return {'vrfcidr': vrf + '-' + en['Subnet'], 'router': en['Router'], 'vrf': vrf}
+    elif stage.name == 'firewalls':
+        return {'name': en['Name'], 'vlan': en['Interface'].replace('Vlan', '')}
+    elif stage.name == 'vlans':
+        return {'vname': en['MGMT'] + '-' + en['VID'], 'Switch': en['Switch']}
+
+    return en
+
+
+def get_net_vrf(en, vrfmap):
+    """Return a network row's VRF after default VRF remapping (see parse_net)"""
+
+    if en['VRF'] == 'default' and en['Router'] in vrfmap:
+        return vrfmap[en['Router']]
+
+    return en['VRF']
+
+
+def read_rows(fileName, header=True):
+    """Return (fields, rows) from a CSV file (raw comma split without header)"""
+
+    fields = None
+    rows = []
+
+    with open(fileName) as f:
+        if header:
+            reader = csv.reader(f)
+            fields = next(reader, [])
+            rows = [row for row in reader if row]
+        else:
+            for line in f:
+                line = line.strip()
+                if line:
+                    rows.append(line.split(','))
+
+    return fields, rows
+
+
+def write_rows(fields, rows):
+    """Write rows to a temporary CSV for the importers, returns the file name"""
+
+    tmp = tempfile.NamedTemporaryFile(mode='w', suffix='.csv', prefix='ngdelta',
+                                      delete=False)
+    with tmp:
+        if fields is None:
+            for row in rows:
+                tmp.write(','.join(row) + '\n')
+        else:
+            writer = csv.writer(tmp)
+            writer.writerow(fields)
+            writer.writerows(rows)
+
+    return tmp.name
+
+
+def file_digest(fileName):
+    """SHA1 of a file's contents"""
+
+    digest = hashlib.sha1()
+    with open(fileName, 'rb') as f:
+        for block in iter(lambda: f.read(65536), b''):
+            digest.update(block)
+
+    return digest.hexdigest()
+
+
+def load_manifest(fileName):
+    """Load the import manifest, an empty one if missing or outdated"""
+
+    manifest = {'version': manifest_version, 'dirty': [], 'stages': dict()}
+
+    try:
+        with open(fileName) as f:
+            saved = json.load(f)
+        if saved.get('version') == manifest_version:
+            manifest = saved
+        else:
+            logger.warning("Ignoring manifest %s from another version", fileName)
+    except FileNotFoundError:
+        logger.info("No manifest at %s, importing all rows", fileName)
+    except ValueError:
+        logger.warning("Unreadable manifest %s, importing all rows", fileName)
+
+    return manifest
+
+
+def save_manifest(fileName, manifest):
+    """Atomically replace the import manifest"""
+
+    tmpName = fileName + '.tmp'
+    with open(tmpName, 'w') as f:
+        json.dump(manifest, f)
+    os.replace(tmpName, fileName)
@@ -35,7 +35,9 @@ Also contains NEI import routines
 import csv
 import re
 import logging
+from collections import defaultdict, deque
 import nglib
+import nglib.graph
 
 logger = logging.getLogger(__name__)
 
@@ -260,8 +262,16 @@ def reseed_neighbors():
         'MATCH(s:Switch)-[e:NEI|NEI_EQ]-() DELETE e')
 
 
-def import_neighbors(fileName):
-    """Find if neighbors are adjacent, if so, links them"""
+def import_neighbors(fileName, bulk=False):
+    """
+    Find if neighbors are adjacent, if so, links them
+
+    Notes: bulk=True diffs the file against the graph and writes in batches
+    """
+
+    if bulk:
+        bulk_import_neighbors(fileName)
+        return
 
     logger.info("Importing Neighbors from " + fileName)
 
@@ -391,25 +401,8 @@ def import_adjacent_neighbors(en, localD, remoteD, time):
         # New Bidirectional Relationship
         elif len(existingNei1) == 0 and len(existingNei2) == 0:
 
-            # Check for NEI_EQ Prioritization (lower is better)
-            if 'nei_priority' in nglib.config['topology']:
-                nei_eq = nglib.config['topology']['nei_priority'].split(',')
-                localP = 1000
-                remoteP = 1000
-                if localName in nei_eq:
-                    localP = nei_eq.index(localName)
-                if remoteName in nei_eq:
-                    remoteP = nei_eq.index(remoteName)
-
-                # Observe priorities
-                if int(remoteP) < int(localP):
-                    localName, remoteName = remoteName, localName
-                    localPort, remotePort = remotePort, localPort
-
-                # If equal priorities, prefer lower name
-                elif localP == remoteP and remoteName < localName:
-                    localName, remoteName = remoteName, localName
-                    localPort, remotePort = remotePort, localPort
+            localName, localPort, remoteName, remotePort = order_nei_eq(
+                localName, localPort, remoteName, remotePort)
 
             logger.info("New: Creating NEI_EQ Relationship %s --> %s",
                         localName, remoteName)
@@ -424,6 +417,195 @@ def import_adjacent_neighbors(en, localD, remoteD, time):
 
 
 
+def order_nei_eq(localName, localPort, remoteName, remotePort):
+    """
+    Order a new NEI_EQ link by [topology] nei_priority (lower is better)
+
+    Returns (parent, parent port, child, child port)
+    """
+
+    # Check for NEI_EQ Prioritization (lower is better)
+    if 'nei_priority' in nglib.config['topology']:
+        nei_eq = nglib.config['topology']['nei_priority'].split(',')
+        localP = 1000
+        remoteP = 1000
+        if localName in nei_eq:
+            localP = nei_eq.index(localName)
+        if remoteName in nei_eq:
+            remoteP = nei_eq.index(remoteName)
+
+        # Observe priorities
+        if int(remoteP) < int(localP):
+            localName, remoteName = remoteName, localName
+            localPort, remotePort = remotePort, localPort
+
+        # If equal priorities, prefer lower name
+        elif localP == remoteP and remoteName < localName:
+            localName, remoteName = remoteName, localName
+            localPort, remotePort = remotePort, localPort
+
+    return localName, localPort, remoteName, remotePort
+
+
+def bulk_import_neighbors(fileName):
+    """
+    Bulk Import Neighbors
+
+    - Loads all switch distances and NEI/NEI_EQ edges in two scans
+    - Replays import_adjacent_neighbors() decisions in memory, including
+      the NEI_EQ single direction rule and nei_priority
+    - Merges new and updated edges in batches through the graph backend
+    """
+
+    logger.info("Bulk Importing Neighbors from " + fileName)
+
+    time = nglib.get_time()
+
+    graph = nglib.graph.get_graph()
+
+    distances = dict()
+    for r in graph.scan_nodes('Switch', ['name', 'distance']):
+        distances[r['name']] = r['distance']
+
+    # Existing edges as (type, pSwitch, pPort, cSwitch, cPort)
+    edges = set()
+    for r in graph.scan_edges(('NEI', 'NEI_EQ'), 'Switch', 'Switch', ['pPort', 'cPort']):
+        edges.add((r['type'], r['src'], r['pPort'], r['dst'], r['cPort']))
+
+    new = []
+    touch = dict()
+    rows = 0
+    exPorts = '(mgmt|FastEthernet)'
+
+    for en in nglib.importCSVasDict(fileName):
+
+        localName = en['LocalName']
+        localPort = en['LocalPort']
+        remoteName = en['RemoteName']
+        remotePort = en['RemotePort']
+        rows = rows + 1
+
+        # Exclude Management Ports and neighbors not in the DB
+        if re.search(exPorts, localPort) or re.search(exPorts, remotePort):
+            logger.debug("Skipping NEI: " + remoteName)
+            continue
+        if localName not in distances or remoteName not in distances:
+            continue
+
+        localD = distances[localName]
+        remoteD = distances[remoteName]
+
+        # Parent Child Neighbor, Never link distance free nodes
+        if remoteD > localD and localD < nglib.max_distance:
+            key = ('NEI', localName, localPort, remoteName, remotePort)
+
+            if key in edges:
+                touch[key] = edge_row(key, time)
+            elif ('NEI', remoteName, localPort, localName, remotePort) not in edges:
+                logger.info("New: Creating NEI Relationship %s --> %s",
+                            localName, remoteName)
+                edges.add(key)
+                new.append(edge_row(key, time))
+
+        # Equal Neighbors, only a single relationship between them
+        elif remoteD == localD and localD < nglib.max_distance:
+            key = ('NEI_EQ', localName, localPort, remoteName, remotePort)
+            rkey = ('NEI_EQ', remoteName, remotePort, localName, localPort)
+
+            if key in edges and rkey not in edges:
+                touch[key] = edge_row(key, time)
+
+            elif key not in edges and rkey not in edges:
+                key = ('NEI_EQ',) + order_nei_eq(localName, localPort, remoteName, remotePort)
+                logger.info("New: Creating NEI_EQ Relationship %s --> %s", key[1], key[3])
+                edges.add(key)
+                new.append(edge_row(key, time))
+
+    # New edges never match an existing port pair, so one merge covers both
+    for etype in ('NEI', 'NEI_EQ'):
+        graph.merge_edges(
+            etype, [r for r in new + list(touch.values()) if r['type'] == etype],
+            'Switch', 'Switch', keys=('pPort', 'cPort'))
+
+    logger.info("Bulk Neighbor Import: %s rows, %s new edges, %s updated edges",
+                rows, len(new), len(touch))
+
+
+def edge_row(key, time):
+    """Graph edge row for a neighbor edge key"""
+
+    return {'type': key[0], 'src': key[1], 'dst': key[3],
+            'props': {'time': time, 'pSwitch': key[1], 'pPort': key[2],
+                      'cSwitch': key[3], 'cPort': key[4]}}
+
+
+def update_distances(fileName=None):
+    """
+    Recompute all Switch distances with one multi-source BFS from the seeds
+
+    - Adjacency is every NEI/NEI_EQ edge plus the neighbors file (if given)
+    - dist_exclude switches keep their distance and are never crossed
+    - Distances at max_distance or unreachable switches are left alone
+    - Writes all changed distances in batches, returns the count
+    """
+
+    logger.info("Updating Switch Distances from Seeds")
+
+    dist_exclude = "NOEXCLUDEDEFINED"
+    if 'dist_exclude' in nglib.config['topology']:
+        dist_exclude = nglib.config['topology']['dist_exclude']
+
+    switches = dict()
+    seeds = []
+    adj = defaultdict(set)
+
+    graph = nglib.graph.get_graph()
+
+    for r in graph.scan_nodes('Switch', ['name', 'seed', 'distance']):
+        switches[r['name']] = r['distance']
+        if r['seed'] == 1:
+            seeds.append(r['name'])
+
+    for r in graph.scan_edges(('NEI', 'NEI_EQ'), 'Switch', 'Switch'):
+        adj[r['src']].add(r['dst'])
+        adj[r['dst']].add(r['src'])
+
+    # Physical adjacency not linked yet (same port filter as import_neighbors)
+    if fileName:
+        exPorts = '(mgmt|FastEthernet)'
+        for en in nglib.importCSVasDict(fileName):
+            if re.search(exPorts, en['LocalPort']) or re.search(exPorts, en['RemotePort']):
+                continue
+            if en['LocalName'] in switches and en['RemoteName'] in switches:
+                adj[en['LocalName']].add(en['RemoteName'])
+                adj[en['RemoteName']].add(en['LocalName'])
+
+    # Multi-source BFS, seeds stay at distance 0
+    dist = dict.fromkeys(seeds, 0)
+    queue = deque(seeds)
+
+    while queue:
+        switch = queue.popleft()
+        for nei in adj[switch]:
+            if nei not in dist and not re.search(dist_exclude, nei) \
+                and dist[switch] + 1 < nglib.max_distance:
+                dist[nei] = dist[switch] + 1
+                queue.append(nei)
+
+    rows = []
+    for switch in sorted(dist):
+        if switch not in seeds and switches[switch] != dist[switch]:
+            logger.info("New: Switch Distance: %s (%s-->%s)",
+                        switch, switches[switch], dist[switch])
+            rows.append({'name': switch, 'distance': dist[switch]})
+
+    graph.update_nodes('Switch', rows)
+
+    logger.info("Updated %s Switch Distances", len(rows))
+
+    return len(rows)
+
+
 def update_distance(switch):
     """ Update the distance Value of a Switch node from seed node"""
 
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+#
+# Copyright (c) 2016 "Jonathan Yantis"
+#
+# This file is a part of NetGrph.
+#
+#    This program is free software: you can redistribute it and/or  modify
+#    it under the terms of the GNU Affero General Public License, version 3,
+#    as published by the Free Software Foundation.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#    As a special exception, the copyright holders give permission to link the
+#    code of portions of this program with the OpenSSL library under certain
+#    conditions as described in each individual source file and distribute
+#    linked combinations including the program with the OpenSSL library. You
+#    must comply with the GNU Affero General Public License in all respects
+#    for all of the code used other than as permitted herein. If you modify
+#    file(s) with this exception, you may extend this exception to your
+#    version of the file(s), but you are not obligated to do so. If you do not
+#    wish to do so, delete this exception statement from your version. If you
+#    delete this exception statement from all source files in the program,
+#    then also delete it in the license file.
+#
+#
+"""
+Graph Storage Backends
+
+ - Graph (base.py) defines the node, edge and scan operations nglib
+   performs on the graph
+ - Neo4jGraph runs them as Cypher over the Bolt session
+ - The [nglib] graph_backend config picks a backend from backends
+"""
+import logging
+import threading
+import nglib
+from .base import Graph
+from .bolt import Neo4jGraph
+
+logger = logging.getLogger(__name__)
+
+backends = {
+    'neo4j': Neo4jGraph,
+}
+
+# Active backend, created on first use
+graph = None
+graph_lock = threading.Lock()
+
+
+def get_graph():
+    """Return the active graph backend"""
+
+    global graph
+
+    with graph_lock:
+        if graph is None:
+            graph = new_graph(nglib.graph_backend)
+
+    return graph
+
+
+def new_graph(name):
+    """Create a graph backend by name"""
+
+    if name not in backends:
+        raise ValueError("Unknown graph backend: " + str(name))
+
+    logger.debug("Using %s graph backend", name)
+
+    return backends[name]()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+#
+# Copyright (c) 2016 "Jonathan Yantis"
+#
+# This file is a part of NetGrph.
+#
+#    This program is free software: you can redistribute it and/or  modify
+#    it under the terms of the GNU Affero General Public License, version 3,
+#    as published by the Free Software Foundation.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#    As a special exception, the copyright holders give permission to link the
+#    code of portions of this program with the OpenSSL library under certain
+#    conditions as described in each individual source file and distribute
+#    linked combinations including the program with the OpenSSL library. You
+#    must comply with the GNU Affero General Public License in all respects
+#    for all of the code used other than as permitted herein. If you modify
+#    file(s) with this exception, you may extend this exception to your
+#    version of the file(s), but you are not obligated to do so. If you do not
+#    wish to do so, delete this exception statement from your version. If you
+#    delete this exception statement from all source files in the program,
+#    then also delete it in the license file.
+#
+#
+"""
+Graph Backend Interface
+
+ - Nodes are addressed by label and a key property (usually name)
+ - Labels may be combined as in Cypher (Switch:Router)
+ - Edges are addressed by type, endpoints and optional key properties, so
+   parallel edges (one NEI per port pair) can be told apart
+"""
+import re
+
+name_re = re.compile(r'^\w+(:\w+)*$')
+
+
+class Graph(object):
+    """Operations every graph backend implements"""
+
+    def merge_nodes(self, label, rows, key='name'):
+        """Create or update nodes from rows (dicts holding key), returns the count"""
+        raise NotImplementedError
+
+    def update_nodes(self, label, rows, key='name'):
+        """Update properties of existing nodes only, returns the count"""
+        raise NotImplementedError
+
+    def get_node(self, label, value, key='name'):
+        """Return a copy of a node's properties, or None"""
+        raise NotImplementedError
+
+    def increment(self, label, value, field, props=None, key='name'):
+        """Atomically merge a node, set props and add 1 to field, returns the new count"""
+        raise NotImplementedError
+
+    def scan_nodes(self, label, fields, where=None):
+        """Yield {field: value} for nodes with label matching where (equality)"""
+        raise NotImplementedError
+
+    def merge_edges(self, rtype, rows, src_label, dst_label, keys=(), key='name'):
+        """
+        Create or update edges from rows {'src', 'dst', 'props'}
+
+        Edges match on type, endpoints and the props named in keys.
+        Rows with missing endpoints are skipped. Returns the count.
+        """
+        raise NotImplementedError
+
+    def scan_edges(self, rtypes, src_label, dst_label, fields=(), key='name'):
+        """Yield {'type', 'src', 'dst', field: value} for matching edges"""
+        raise NotImplementedError
+
+
+def check_name(name):
+    """Labels and types are concatenated into queries, allow \\w only"""
+
+    if not name_re.search(name):
+        raise ValueError("Invalid label or type: " + str(name))
+
+    return name
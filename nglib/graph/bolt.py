@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+#
+# Copyright (c) 2016 "Jonathan Yantis"
+#
+# This file is a part of NetGrph.
+#
+#    This program is free software: you can redistribute it and/or  modify
+#    it under the terms of the GNU Affero General Public License, version 3,
+#    as published by the Free Software Foundation.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#    As a special exception, the copyright holders give permission to link the
+#    code of portions of this program with the OpenSSL library under certain
+#    conditions as described in each individual source file and distribute
+#    linked combinations including the program with the OpenSSL library. You
+#    must comply with the GNU Affero General Public License in all respects
+#    for all of the code used other than as permitted herein. If you modify
+#    file(s) with this exception, you may extend this exception to your
+#    version of the file(s), but you are not obligated to do so. If you do not
+#    wish to do so, delete this exception statement from your version. If you
+#    delete this exception statement from all source files in the program,
+#    then also delete it in the license file.
+#
+#
+"""
+Neo4j Graph Backend
+
+ - Runs the Graph operations as Cypher over nglib.bolt_ses
+ - Writes go through nglib.run_batched (UNWIND per batch_size rows)
+"""
+import logging
+import nglib
+from .base import Graph, check_name
+
+logger = logging.getLogger(__name__)
+
+
+class Neo4jGraph(Graph):
+    """Graph operations on the Neo4j database"""
+
+    def merge_nodes(self, label, rows, key='name'):
+
+        return nglib.run_batched(
+            'UNWIND {rows} AS row '
+            + 'MERGE (n:' + check_name(label) + ' {' + check_name(key) + ':row.' + key + '}) '
+            + 'SET n += row', list(rows))
+
+    def update_nodes(self, label, rows, key='name'):
+
+        return nglib.run_batched(
+            'UNWIND {rows} AS row '
+            + 'MATCH (n:' + check_name(label) + ' {' + check_name(key) + ':row.' + key + '}) '
+            + 'SET n += row', list(rows))
+
+    def get_node(self, label, value, key='name'):
+
+        results = nglib.bolt_ses.run(
+            'MATCH (n:' + check_name(label) + ' {' + check_name(key) + ':{value}}) '
+            + 'RETURN n LIMIT 1', {'value': value})
+
+        for r in results:
+            return dict(r['n'].properties)
+
+        return None
+
+    def increment(self, label, value, field, props=None, key='name'):
+
+        results = nglib.bolt_ses.run(
+            'MERGE (n:' + check_name(label) + ' {' + check_name(key) + ':{value}}) '
+            + 'SET n += {props}, n.' + check_name(field) + ' = coalesce(n.' + field + ',0)+1 '
+            + 'RETURN n.' + field + ' AS count', {'value': value, 'props': props or dict()})
+
+        for r in results:
+            return r['count']
+
+        return None
+
+    def scan_nodes(self, label, fields, where=None):
+
+        params = dict()
+        query = 'MATCH (n:' + check_name(label) + ') '
+
+        if where:
+            query += 'WHERE ' + ' AND '.join(
+                ['n.' + check_name(f) + ' = {w_' + f + '}' for f in sorted(where)]) + ' '
+            for f in where:
+                params['w_' + f] = where[f]
+
+        query += 'RETURN ' + ', '.join(['n.' + check_name(f) + ' AS `' + f + '`' for f in fields])
+
+        for r in nglib.bolt_ses.run(query, params):
+            yield dict((f, r[f]) for f in fields)
+
+    def merge_edges(self, rtype, rows, src_label, dst_label, keys=(), key='name'):
+
+        match = ', '.join([check_name(k) + ':row.props.' + k for k in keys])
+        if match:
+            match = ' {' + match + '}'
+
+        return nglib.run_batched(
+            'UNWIND {rows} AS row '
+            + 'MATCH (s:' + check_name(src_label) + ' {' + check_name(key) + ':row.src}), '
+            + '(d:' + check_name(dst_label) + ' {' + key + ':row.dst}) '
+            + 'MERGE (s)-[e:' + check_name(rtype) + match + ']->(d) '
+            + 'SET e += row.props', list(rows))
+
+    def scan_edges(self, rtypes, src_label, dst_label, fields=(), key='name'):
+
+        if isinstance(rtypes, str):
+            rtypes = [rtypes]
+
+        query = 'MATCH (s:' + check_name(src_label) + ')' \
+            + '-[e:' + '|'.join([check_name(t) for t in rtypes]) + ']->' \
+            + '(d:' + check_name(dst_label) + ') ' \
+            + 'RETURN type(e) AS type, s.' + check_name(key) + ' AS src, d.' + key + ' AS dst'
+        for f in fields:
+            query += ', e.' + check_name(f) + ' AS `' + f + '`'
+
+        for r in nglib.bolt_ses.run(query):
+            edge = {'type': r['type'], 'src': r['src'], 'dst': r['dst']}
+            for f in fields:
+                edge[f] = r[f]
+            yield edge
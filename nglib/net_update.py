@@ -31,79 +31,113 @@
 #
 """ NetGrph Network Import Routines """
 
-import ipaddress
 import logging
 import nglib
+import nglib.prefix
 
 logger = logging.getLogger(__name__)
 
 # Keep a global vrf cache for performance when matching routers to VRFs
 vrf_cache = dict()
 
-def import_networks(fileName, ignore_new=False):
+def import_networks(fileName, ignore_new=False, bulk=False):
     """
     Import CSV File of networks
 
     Format: Subnet,VLAN,VRF,Router,MGMT Group,Description,Location
+
+    Notes: bulk=True diffs the file against the graph and writes in batches
     """
 
+    if bulk:
+        bulk_import_networks(fileName, ignore_new)
+        nglib.prefix.invalidate_network_index()
+        return
+
     logger.info("Importing List of Networks from " + fileName)
 
-    # Remap default VRFs for devices in config
+    vrfmap = get_vrfmap()
+
+    ndb = nglib.importCSVasDict(fileName)
+
+    for en in ndb:
+        import_single_net(en, ignore_new, vrfmap)
+
+    # New networks invalidate the prefix index
+    nglib.prefix.invalidate_network_index()
+
+
+def get_vrfmap():
+    """Remap default VRFs for devices in config"""
+
     vrfmap = dict()
     try:
         for key in nglib.config['default_vrf']:
-            #print(key, config['default_vrf'][key])
             vrfmap[key] = nglib.config['default_vrf'][key]
     except KeyError:
         pass
 
-    ndb = nglib.importCSVasDict(fileName)
+    return vrfmap
 
-    for en in ndb:
-        import_single_net(en, ignore_new, vrfmap)
 
+def parse_net(net, vrfmap):
+    """Normalize a network CSV entry into a dict of import values"""
 
-def import_single_net(net, ignore_new, vrfmap):
-    """Import a CIDR Entry in to NetGrph"""
-
-    time = nglib.get_time()
+    entry = dict()
 
-    router = net['Router']
-    gateway = net['Gateway']
-    cidr = net['Subnet']
-    desc = net['Description']
-    vrf = net['VRF']
-    vlan = net['VLAN']
-    p2p = net['P2P']
-    standby = net['Standby']
-    rip = net['Gateway_Physical']
-    vpriority = net['Virtual_Priority']
-    vgroup = net['Virtual_Group']
-    vproto = net['Virtual_Protocol']
-    vver = net['Virtual_Version']
-    secondary = False
+    entry['router'] = net['Router']
+    entry['gateway'] = net['Gateway']
+    entry['cidr'] = net['Subnet']
+    entry['desc'] = net['Description']
+    entry['vrf'] = net['VRF']
+    entry['vlan'] = net['VLAN']
+    entry['rip'] = net['Gateway_Physical']
+    entry['vpriority'] = net['Virtual_Priority']
+    entry['vgroup'] = net['Virtual_Group']
+    entry['vproto'] = net['Virtual_Protocol']
+    entry['vver'] = net['Virtual_Version']
+    entry['secondary'] = False
     if 'Secondary' in net and net['Secondary'] == '1':
-        print('secondary', cidr)
-        secondary = True
+        entry['secondary'] = True
 
     # Check VRF Mapping to remap defaults
-    if vrf == 'default' and router in vrfmap:
-        vrf = vrfmap[router]
-        #print("VRF", vrf)
+    if entry['vrf'] == 'default' and entry['router'] in vrfmap:
+        entry['vrf'] = vrfmap[entry['router']]
 
     # Process P2P and Standby Router bools
-    if p2p == "True":
-        p2p = True
-    else:
-        p2p = False
+    entry['p2p'] = net['P2P'] == "True"
+    entry['standby'] = net['Standby'] == "True"
 
-    if standby == "True":
-        standby = True
-    else:
-        standby = False
+    entry['vrfcidr'] = '{0}-{1}'.format(entry['vrf'], entry['cidr']) #unique key
+
+    return entry
+
+
+def import_single_net(net, ignore_new, vrfmap):
+    """Import a CIDR Entry in to NetGrph"""
+
+    time = nglib.get_time()
+
+    entry = parse_net(net, vrfmap)
+
+    router = entry['router']
+    gateway = entry['gateway']
+    cidr = entry['cidr']
+    desc = entry['desc']
+    vrf = entry['vrf']
+    vlan = entry['vlan']
+    p2p = entry['p2p']
+    standby = entry['standby']
+    rip = entry['rip']
+    vpriority = entry['vpriority']
+    vgroup = entry['vgroup']
+    vproto = entry['vproto']
+    vver = entry['vver']
+    secondary = entry['secondary']
+    if secondary:
+        print('secondary', cidr)
 
-    vrfcidr = '{0}-{1}'.format(vrf, cidr) #unique key
+    vrfcidr = entry['vrfcidr']
 
     # Check the Router VRF Cache only once to add new relationship to routers
     check_vrf_cache(router, vrf)
@@ -325,6 +359,233 @@ def check_vrf_cache(router, vrf):
         nglib.dev_update.link_router_to_vrf(router, vrf)
 
 
+def bulk_import_networks(fileName, ignore_new=False):
+    """
+    Bulk Import CSV File of networks
+
+    - Parses the whole file and diffs it against one read of the graph
+    - Replays import_single_net() decisions in memory (first row creates,
+      later rows for the same vrfcidr update)
+    - Writes nodes and relationships in batched UNWIND transactions
+    """
+
+    logger.info("Bulk Importing List of Networks from " + fileName)
+
+    time = nglib.get_time()
+    vrfmap = get_vrfmap()
+    state = load_network_state()
+
+    entries = []
+    for en in nglib.importCSVasDict(fileName):
+        entries.append(parse_net(en, vrfmap))
+
+    networks = dict()
+    newnets = []
+    vrfon = dict()
+    vrfin = dict()
+    rlinks = dict()
+    l3new = []
+    l3touch = dict()
+
+    for entry in entries:
+        vrfcidr = entry['vrfcidr']
+        router = entry['router']
+        vrf = entry['vrf']
+        entry['time'] = time
+
+        # Router to VRF links, only once per pair
+        rtov = router + "__" + vrf
+        if rtov not in vrf_cache:
+            vrf_cache[rtov] = 1
+            vrfon[(router, vrf)] = {'router': router, 'vrf': vrf, 'time': time}
+
+        # Network Node (last entry wins like SET on existing)
+        if vrfcidr not in state['networks'] and vrfcidr not in networks:
+            logger.info("New: Inserting CIDR %s", vrfcidr)
+            if not ignore_new:
+                newnets.append(entry)
+        networks[vrfcidr] = entry
+
+        # Member of VRF Edge, later rows touch the timestamp
+        if vrfcidr not in vrfin:
+            vrfin[vrfcidr] = {'vrfcidr': vrfcidr, 'vrf': vrf, 'time': time,
+                              'new': vrfcidr not in state['vrf_in'], 'touch': False}
+            if vrfin[vrfcidr]['new']:
+                logger.info("New: Creating VRF Relationship %s -> %s ",
+                            entry['cidr'], vrf)
+            else:
+                vrfin[vrfcidr]['touch'] = True
+        else:
+            vrfin[vrfcidr]['touch'] = True
+
+        # Router Edges
+        if entry['p2p']:
+            key = ('ROUTED', vrfcidr, router, vrf)
+        elif entry['standby']:
+            key = ('ROUTED_STANDBY', vrfcidr, router, None)
+        else:
+            key = ('ROUTED_BY', vrfcidr, router, None)
+
+        if router not in state['routers']:
+            logger.warning("Failed to Create Router Relationship "
+                           + "{0} -> {1} ".format(entry['cidr'], router))
+        else:
+            if key not in state['rlinks'] and key not in rlinks:
+                logger.info("New: Creating %s Relationship %s -> %s (%s)",
+                            key[0], entry['cidr'], router, vrf)
+            rlinks[key] = entry
+
+        # Link up L2 to L3 info
+        l3key = (vrfcidr, entry['vlan'])
+        if l3key in state['l3tol2']:
+            l3touch[l3key] = {'vrfcidr': vrfcidr, 'vid': entry['vlan'], 'time': time}
+        elif state['routers'].get(router) and (router, entry['vlan']) in state['rvlans']:
+            vname = state['rvlans'][(router, entry['vlan'])]
+            logger.info("New: Creating L3toL2 Relationship "
+                        + "{0} vid:{1} -> {2} through {3}".format(
+                            vrfcidr, entry['vlan'], vname, router))
+            l3new.append({'vrfcidr': vrfcidr, 'vname': vname, 'time': time})
+            state['l3tol2'].add(l3key)
+
+    # Write Network Nodes
+    nrows = [networks[k] for k in networks if k not in state['networks']]
+    urows = [networks[k] for k in networks if k in state['networks']]
+
+    nglib.run_batched(
+        'UNWIND {rows} AS row '
+        + 'CREATE (n:Network {cidr:row.cidr, vrfcidr:row.vrfcidr, name:row.vrfcidr, '
+        + 'vrf:row.vrf, desc:row.desc, vid:row.vlan, virtual_proto:row.vproto, '
+        + 'virtual_version:row.vver, virtual_group:row.vgroup, gateway:row.gateway, '
+        + 'secondary:row.secondary, time:row.time})',
+        nrows)
+
+    nglib.run_batched(
+        'UNWIND {rows} AS row MATCH (n:Network {vrfcidr:row.vrfcidr}) '
+        + 'SET n += {desc:row.desc, vid:row.vlan, virtual_group:row.vgroup, '
+        + 'gateway:row.gateway, virtual_proto:row.vproto, virtual_version:row.vver, '
+        + 'secondary:row.secondary, time:row.time}',
+        urows)
+
+    # Store NewNetwork Objects for alerting
+    nglib.run_batched(
+        'UNWIND {rows} AS row '
+        + 'CREATE (n:NewNetwork {cidr:row.cidr, vrfcidr:row.vrfcidr, name:row.vrfcidr, '
+        + 'vrf:row.vrf, desc:row.desc, vid:row.vlan, gateway:row.gateway, '
+        + 'virtual_proto:row.vproto, virtual_version:row.vver, time:row.time})',
+        newnets)
+
+    # Router VRF_ON Edges
+    nglib.run_batched(
+        'UNWIND {rows} AS row '
+        + 'MATCH (r:Switch:Router {name:row.router}), (v:VRF {name:row.vrf}) '
+        + 'MERGE (r)<-[e:VRF_ON]-(v) SET e.time = row.time',
+        list(vrfon.values()))
+
+    # VRF_IN Edges
+    nglib.run_batched(
+        'UNWIND {rows} AS row '
+        + 'MATCH (n:Network {vrfcidr:row.vrfcidr}), (v:VRF {name:row.vrf}) '
+        + 'CREATE (n)-[e:VRF_IN]->(v)',
+        [r for r in vrfin.values() if r['new']])
+
+    nglib.run_batched(
+        'UNWIND {rows} AS row '
+        + 'MATCH (n:Network {vrfcidr:row.vrfcidr})-[e:VRF_IN]->(v:VRF {name:row.vrf}) '
+        + 'SET e.time = row.time',
+        [r for r in vrfin.values() if r['touch']])
+
+    # Router Edges by type
+    for rtype in ('ROUTED_BY', 'ROUTED_STANDBY', 'ROUTED'):
+        crows = [rlinks[k] for k in rlinks if k[0] == rtype and k not in state['rlinks']]
+        trows = [rlinks[k] for k in rlinks if k[0] == rtype and k in state['rlinks']]
+
+        if rtype == 'ROUTED':
+            props = '{vrf:row.vrf, gateway:row.gateway, ipv4:row.rip, time:row.time}'
+            mprops = ' {vrf:row.vrf}'
+        else:
+            props = '{vrf:row.vrf, ipv4:row.rip, v_prio:row.vpriority, time:row.time}'
+            mprops = ''
+
+        nglib.run_batched(
+            'UNWIND {rows} AS row MATCH (n:Network {vrfcidr:row.vrfcidr}), '
+            + '(r:Switch:Router {name:row.router}) '
+            + 'CREATE (n)-[e:' + rtype + ' ' + props + ']->(r)',
+            crows)
+
+        nglib.run_batched(
+            'UNWIND {rows} AS row MATCH (n:Network {vrfcidr:row.vrfcidr})'
+            + '-[e:' + rtype + mprops + ']->(r:Switch:Router {name:row.router}) '
+            + 'SET e += ' + props,
+            trows)
+
+    # L3toL2 Edges
+    nglib.run_batched(
+        'UNWIND {rows} AS row '
+        + 'MATCH (n:Network {vrfcidr:row.vrfcidr}), (v:VLAN {name:row.vname}) '
+        + 'CREATE (n)-[e:L3toL2 {time:row.time}]->(v)',
+        l3new)
+
+    nglib.run_batched(
+        'UNWIND {rows} AS row '
+        + 'MATCH (n:Network {vrfcidr:row.vrfcidr})-[e:L3toL2]->(v:VLAN {vid:row.vid}) '
+        + 'SET e.time = row.time',
+        list(l3touch.values()))
+
+    logger.info("Bulk Network Import: %s rows, %s new networks, %s updated networks",
+                len(entries), len(nrows), len(urows))
+
+
+def load_network_state():
+    """
+    Load existing Networks and their relationships for bulk diffs
+
+    Returns a dict of sets/dicts keyed the same way as bulk_import_networks()
+    """
+
+    state = dict()
+    state['networks'] = set()
+    state['vrf_in'] = set()
+    state['rlinks'] = set()
+    state['l3tol2'] = set()
+    state['routers'] = dict()
+    state['rvlans'] = dict()
+
+    results = nglib.bolt_ses.run('MATCH (n:Network) RETURN n.vrfcidr AS vrfcidr')
+    for r in results:
+        state['networks'].add(r['vrfcidr'])
+
+    results = nglib.bolt_ses.run(
+        'MATCH (n:Network)-[e:VRF_IN|ROUTED_BY|ROUTED_STANDBY|ROUTED|L3toL2]->(x) '
+        + 'RETURN n.vrfcidr AS vrfcidr, type(e) AS type, x.name AS name, '
+        + 'x.vid AS vid, e.vrf AS vrf')
+
+    for r in results:
+        if r['type'] == 'VRF_IN':
+            state['vrf_in'].add(r['vrfcidr'])
+        elif r['type'] == 'L3toL2':
+            state['l3tol2'].add((r['vrfcidr'], r['vid']))
+        elif r['type'] == 'ROUTED':
+            state['rlinks'].add((r['type'], r['vrfcidr'], r['name'], r['vrf']))
+        else:
+            state['rlinks'].add((r['type'], r['vrfcidr'], r['name'], None))
+
+    # Routers and their management group
+    results = nglib.bolt_ses.run(
+        'MATCH (r:Switch:Router) RETURN r.name AS name, r.mgmt AS mgmt')
+    for r in results:
+        state['routers'][r['name']] = r['mgmt']
+
+    # First VLAN name found for each router VID
+    results = nglib.bolt_ses.run(
+        'MATCH (r:Router)<-[e:Switched]-(v:VLAN) '
+        + 'RETURN r.name AS router, v.vid AS vid, v.name AS vname')
+    for r in results:
+        if (r['router'], r['vid']) not in state['rvlans']:
+            state['rvlans'][(r['router'], r['vid'])] = r['vname']
+
+    return state
+
+
 def import_supernets(fileName):
     """
     Import Supernets
@@ -379,31 +640,28 @@ def update_supernet_links():
     supernet CIDR
     """
 
-    snet = dict()
+    snet = nglib.prefix.PrefixTrie()
 
-    # Load Supernets as dictionary
+    # Load Supernets into a prefix trie
     results = nglib.py2neo_ses.cypher.execute('MATCH (n:Supernet) RETURN n.cidr as cidr')
     for record in results:
-        snet[record.cidr] = 1
+        snet.insert(record.cidr, record.cidr, record.cidr)
 
 
     results = nglib.py2neo_ses.cypher.execute(
         'MATCH (n:Network) RETURN n.cidr as cidr, n.vrfcidr as vrfcidr')
 
-    # Scan all networks and try to link to supernet
+    # Scan all networks and link to every supernet containing the network IP
     for record in results:
         cidr = record.cidr
         if cidr:
             ip = nglib.getEntry(cidr.rsplit('/'))
 
-            # Search through Supernets for cidr match
-            for key in snet.keys():
-
-                if ipaddress.ip_address(ip) in ipaddress.ip_network(key):
-                    logger.debug(cidr + " in Supernet " + key)
+            for key in snet.supernets(ip):
+                logger.debug(cidr + " in Supernet " + key)
 
-                    # Create or update supernet link
-                    superLink(record.vrfcidr, key)
+                # Create or update supernet link
+                superLink(record.vrfcidr, key)
 
 
 def superLink(vrfcidr, supercidr):
@@ -30,6 +30,10 @@
 #
 """
 NetGrph NetDB Interface
+
+ - Connections come from a small pool ([netdb] pool_size) and are pinged
+   before reuse, connections idle longer than idle_timeout are closed
+ - Use netdb_cursor() as a context manager, queries take %s parameters
 """
 
 import datetime
@@ -38,20 +42,25 @@ import csv
 import re
 import os
 import sys
+import time
 import logging
+import threading
+import contextlib
 import pymysql
 import nglib
 
 
 logger = logging.getLogger(__name__)
 
-# DB connection is global
-netdb_ses = None
+# Idle connections as (connection, last used), most recent last
+idle_pool = []
+pool_lock = threading.Lock()
+pool_size = 4
+idle_timeout = 300
 
 def connect_netdb():
-    """Update the netdb_ses handle"""
+    """Open a new NetDB connection"""
 
-    global netdb_ses
     netdbhost = None
     netdbuser = None
     netdbpasswd = None
@@ -68,11 +77,89 @@ def connect_netdb():
     if not netdbuser:
         raise Exception("NetDB Credentials not Configured")
 
-    netdb_ses = pymysql.connect(user=netdbuser, password=netdbpasswd,
-                                host=netdbhost,
-                                database="netdb")
+    # Autocommit so pooled connections see new rows on every query,
+    # instead of the first query's REPEATABLE READ snapshot
+    return pymysql.connect(user=netdbuser, password=netdbpasswd,
+                           host=netdbhost,
+                           database="netdb",
+                           autocommit=True)
+
+
+def get_connection():
+    """Borrow a healthy NetDB connection, opening one if none are idle"""
+
+    global pool_size
+    global idle_timeout
+
+    if 'netdb' in nglib.config:
+        pool_size = int(nglib.config['netdb'].get('pool_size', pool_size))
+        idle_timeout = float(nglib.config['netdb'].get('idle_timeout', idle_timeout))
+
+    while True:
+        with pool_lock:
+            if not idle_pool:
+                break
+            conn, used = idle_pool.pop()
+
+        # Recycle idle connections, check the rest are still alive
+        if time.time() - used > idle_timeout:
+            close_connection(conn)
+            continue
+        try:
+            conn.ping(reconnect=True)
+            return conn
+        except pymysql.MySQLError as e:
+            logger.debug("NetDB: Dropping dead connection: %s", e)
+            close_connection(conn)
+
+    return connect_netdb()
+
+
+def release_connection(conn):
+    """Return a connection to the pool, closing it if the pool is full"""
+
+    with pool_lock:
+        if len(idle_pool) < pool_size:
+            idle_pool.append((conn, time.time()))
+            return
+
+    close_connection(conn)
 
-    return netdb_ses
+
+def close_connection(conn):
+    """Close a connection, ignoring errors"""
+
+    try:
+        conn.close()
+    except pymysql.MySQLError:
+        pass
+
+
+@contextlib.contextmanager
+def netdb_cursor():
+    """
+    Yield a DictCursor on a pooled connection
+
+    Notes: Connections are closed instead of pooled if the block raises
+    """
+
+    conn = get_connection()
+    cursor = conn.cursor(pymysql.cursors.DictCursor)
+    failed = True
+
+    try:
+        yield cursor
+        failed = False
+    finally:
+        try:
+            cursor.close()
+        except pymysql.MySQLError:
+            failed = True
+
+        if failed:
+            close_connection(conn)
+        else:
+            release_connection(conn)
 
 
 def get_lastseen(hours=168):
@@ -86,24 +173,21 @@ def get_lastseen(hours=168):
 def get_mac_and_port_counts(switch, vlan):
     """Get the number of mac addresses and ports on a VLAN for a switch"""
 
-    connect_netdb()
-
     lastseen = get_lastseen()
 
-    cursor = netdb_ses.cursor(pymysql.cursors.DictCursor)
+    with netdb_cursor() as cursor:
 
-    cursor.execute("SELECT count(vlan) AS pcount FROM switchstatus "
-                   + "WHERE switch = '{}' and vlan='{}'".format(switch, vlan))
+        cursor.execute("SELECT count(vlan) AS pcount FROM switchstatus "
+                       + "WHERE switch = %s and vlan = %s", (switch, vlan))
 
-    pc = cursor.fetchall()
-    pcount = pc[0]['pcount']
+        pc = cursor.fetchall()
+        pcount = pc[0]['pcount']
 
-    # MACs on switch with lastseen
-    mac_query = "SELECT count(mac) AS mcount FROM switchports "
-    mac_query += "WHERE switch = '{}' AND s_vlan='{}' ".format(switch, vlan)
-    mac_query += "AND lastseen > '{}'".format(lastseen)
-    cursor.execute(mac_query)
-    mc = cursor.fetchall()
-    mcount = mc[0]['mcount']
+        # MACs on switch with lastseen
+        cursor.execute("SELECT count(mac) AS mcount FROM switchports "
+                       + "WHERE switch = %s AND s_vlan = %s AND lastseen > %s",
+                       (switch, vlan, lastseen))
+        mc = cursor.fetchall()
+        mcount = mc[0]['mcount']
 
     return(pcount, mcount)
@@ -34,7 +34,6 @@ NetGrph NetDB IP Interface
 import re
 import socket
 import logging
-import pymysql
 import functools
 import nglib.netdb
 import nglib.ngtree
@@ -42,6 +41,9 @@ import nglib.ngtree
 
 logger = logging.getLogger(__name__)
 
+# IPs per superarp IN (...) query in get_netdb_ips
+ip_chunk = 500
+
 
 @functools.lru_cache(maxsize=2)
 def get_netdb_ip(ip, hours=720):
@@ -54,17 +56,47 @@ def get_netdb_ip(ip, hours=720):
         except socket.gaierror:
             raise Exception("Hostname Lookup Failure on: " + ip)
 
-    netdb_ses = nglib.netdb.connect_netdb()
+    lastseen = nglib.netdb.get_lastseen(hours)
+
+    with nglib.netdb.netdb_cursor() as cursor:
+        cursor.execute("SELECT * FROM superarp WHERE ip = %s AND lastseen > %s",
+                       (ip, lastseen))
+        pc = cursor.fetchall()
+
+    return get_ip_tree(ip, pc)
+
+
+def get_netdb_ips(ips, hours=720):
+    """
+    Get details for many resolved IPs, returns {ip: ngtree or None}
+
+    Notes: Fetches superarp rows with one IN (...) query per ip_chunk IPs
+    """
 
     lastseen = nglib.netdb.get_lastseen(hours)
 
-    cursor = netdb_ses.cursor(pymysql.cursors.DictCursor)
-    # cursor = netdb_ses.cursor(dictionary=True)
+    rows = dict()
+    for ip in ips:
+        rows[ip] = []
 
-    cursor.execute("SELECT * FROM superarp "
-                   + "WHERE ip = '{}' AND lastseen > '{}'".format(ip, lastseen))
+    with nglib.netdb.netdb_cursor() as cursor:
+        for chunk in nglib.chunk_list(sorted(rows), ip_chunk):
+            cursor.execute("SELECT * FROM superarp WHERE ip IN ("
+                           + ",".join(["%s"] * len(chunk))
+                           + ") AND lastseen > %s", chunk + [lastseen])
+            for en in cursor.fetchall():
+                if en['ip'] in rows:
+                    rows[en['ip']].append(en)
 
-    pc = cursor.fetchall()
+    trees = dict()
+    for ip in rows:
+        trees[ip] = get_ip_tree(ip, rows[ip])
+
+    return trees
+
+
+def get_ip_tree(ip, pc):
+    """Build the NetDB ngtree for ip from its superarp rows"""
 
     multi_entry = False
     pngtree = nglib.ngtree.get_ngtree("IPs", tree_type="NetDB")
@@ -117,17 +149,12 @@ def get_netdb_ip(ip, hours=720):
 def arp(router, hours=1):
     """Pull the ARP Table on a router from NetDB, use router='%' for everything"""
 
-    netdb_ses = nglib.netdb.connect_netdb()
-
     lastseen = nglib.netdb.get_lastseen(hours)
 
-    cursor = netdb_ses.cursor(pymysql.cursors.DictCursor)
-    # cursor = netdb_ses.cursor(dictionary=True)
-
-    cursor.execute("SELECT * FROM superarp "
-                   + "WHERE router LIKE '{}' AND lastseen > '{}'".format(router, lastseen))
-
-    pc = cursor.fetchall()
+    with nglib.netdb.netdb_cursor() as cursor:
+        cursor.execute("SELECT * FROM superarp WHERE router LIKE %s AND lastseen > %s",
+                       (router, lastseen))
+        pc = cursor.fetchall()
 
     pngtree = nglib.ngtree.get_ngtree("ARP-Table", tree_type="NetDB")
 
@@ -34,7 +34,6 @@ NetGrph NetDB Switch Interface
 import re
 import socket
 import logging
-import pymysql
 import nglib.netdb
 import nglib.ngtree
 
@@ -47,38 +46,34 @@ def get_switch(switch, port='%', hours=720, trunc=True):
     # Truncated Values to retrieve
     tr = ['switch', 'port', 'status', 'description', 'vlan', 'speed', 'duplex']
 
-    netdb_ses = nglib.netdb.connect_netdb()
     lastseen = nglib.netdb.get_lastseen(hours)
 
-    cursor = netdb_ses.cursor(pymysql.cursors.DictCursor)
-
-    # cursor.execute("SELECT * FROM superswitch "
-    #                + "WHERE ip = '{}' AND lastseen > '{}'".format(switch, lastseen))
-
-    cursor.execute(
-        "SELECT switchstatus.switch,switchstatus.port,switchstatus.vlan,switchstatus.status,"
-        + "switchstatus.speed,switchstatus.duplex,switchstatus.description,"
-        + "switchstatus.p_uptime,switchstatus.p_minutes,switchstatus.lastup,"
-        + "superswitch.mac,superswitch.ip,superswitch.s_ip,superswitch.s_name,"
-        + "superswitch.name,superswitch.static,superswitch.mac_nd,"
-        + "superswitch.vendor,superswitch.vrf,superswitch.router,"
-        + "superswitch.uptime,superswitch.minutes,superswitch.firstseen,"
-        + "superswitch.lastseen,nacreg.userID,nacreg.firstName,nacreg.lastName,"
-        + "nacreg.role,nd.n_host,nd.n_ip,nd.n_desc,nd.n_model,nd.n_port,"
-        + "nd.n_protocol,nd.n_lastseen,superswitch.s_speed,superswitch.s_ip,"
-        + "superswitch.s_vlan "
-        + "FROM switchstatus LEFT OUTER JOIN superswitch "
-        + "ON switchstatus.switch = superswitch.switch "
-        + "AND switchstatus.port = superswitch.port "
-        + "AND superswitch.lastseen > '{}' ".format(lastseen)
-        + "LEFT OUTER JOIN neighbor as nd "
-        + "ON ( switchstatus.switch = nd.switch AND switchstatus.port = nd.port ) "
-        + "LEFT OUTER JOIN nacreg ON nacreg.mac = superswitch.mac "
-        + "WHERE (switchstatus.switch like '{}' AND switchstatus.port like '{}') ".format(switch, port)
-        + "ORDER BY switchstatus.port"
-    )
-
-    pc = cursor.fetchall()
+    with nglib.netdb.netdb_cursor() as cursor:
+        cursor.execute(
+            "SELECT switchstatus.switch,switchstatus.port,switchstatus.vlan,switchstatus.status,"
+            + "switchstatus.speed,switchstatus.duplex,switchstatus.description,"
+            + "switchstatus.p_uptime,switchstatus.p_minutes,switchstatus.lastup,"
+            + "superswitch.mac,superswitch.ip,superswitch.s_ip,superswitch.s_name,"
+            + "superswitch.name,superswitch.static,superswitch.mac_nd,"
+            + "superswitch.vendor,superswitch.vrf,superswitch.router,"
+            + "superswitch.uptime,superswitch.minutes,superswitch.firstseen,"
+            + "superswitch.lastseen,nacreg.userID,nacreg.firstName,nacreg.lastName,"
+            + "nacreg.role,nd.n_host,nd.n_ip,nd.n_desc,nd.n_model,nd.n_port,"
+            + "nd.n_protocol,nd.n_lastseen,superswitch.s_speed,superswitch.s_ip,"
+            + "superswitch.s_vlan "
+            + "FROM switchstatus LEFT OUTER JOIN superswitch "
+            + "ON switchstatus.switch = superswitch.switch "
+            + "AND switchstatus.port = superswitch.port "
+            + "AND superswitch.lastseen > %s "
+            + "LEFT OUTER JOIN neighbor as nd "
+            + "ON ( switchstatus.switch = nd.switch AND switchstatus.port = nd.port ) "
+            + "LEFT OUTER JOIN nacreg ON nacreg.mac = superswitch.mac "
+            + "WHERE (switchstatus.switch like %s AND switchstatus.port like %s) "
+            + "ORDER BY switchstatus.port",
+            (lastseen, switch, port)
+        )
+
+        pc = cursor.fetchall()
 
     pngtree = nglib.ngtree.get_ngtree(switch, tree_type="INTs")
 
@@ -102,18 +97,13 @@ def get_switch(switch, port='%', hours=720, trunc=True):
 def mac(switch, port='%', hours=1):
     """Pull the MAC Table on a switch from NetDB, use switch='%' for everything"""
 
-    netdb_ses = nglib.netdb.connect_netdb()
-
     lastseen = nglib.netdb.get_lastseen(hours)
 
-    cursor = netdb_ses.cursor(pymysql.cursors.DictCursor)
-    # cursor = netdb_ses.cursor(dictionary=True)
-
-    cursor.execute("SELECT * FROM superswitch "
-                   + "WHERE switch LIKE '{}' AND port LIKE '{}' ".format(switch, port)
-                   + "AND lastseen > '{}'".format(lastseen))
-
-    pc = cursor.fetchall()
+    with nglib.netdb.netdb_cursor() as cursor:
+        cursor.execute("SELECT * FROM superswitch "
+                       + "WHERE switch LIKE %s AND port LIKE %s AND lastseen > %s",
+                       (switch, port, lastseen))
+        pc = cursor.fetchall()
 
     pngtree = nglib.ngtree.get_ngtree("MAC-Table", tree_type="NetDB")
 
@@ -130,17 +120,13 @@ def mac(switch, port='%', hours=1):
 def count(switch, hours=1):
     """ Get the mac address count from a switch """
 
-    netdb_ses = nglib.netdb.connect_netdb()
-
     lastseen = nglib.netdb.get_lastseen(hours)
 
-    cursor = netdb_ses.cursor(pymysql.cursors.DictCursor)
-
-    cursor.execute("SELECT count(mac) FROM superswitch "
-                   + "WHERE switch LIKE '{}' ".format(switch)
-                   + "AND lastseen > '{}'".format(lastseen))
-
-    pc = cursor.fetchall()
+    with nglib.netdb.netdb_cursor() as cursor:
+        cursor.execute("SELECT count(mac) FROM superswitch "
+                       + "WHERE switch LIKE %s AND lastseen > %s",
+                       (switch, lastseen))
+        pc = cursor.fetchall()
 
     pngtree = nglib.ngtree.get_ngtree("MAC-Count", tree_type="NetDB")
     pngtree['switch'] = switch
@@ -40,23 +40,36 @@ ngtrees are nested dicts that convert to JSON/YAML
 - Adding a child ngtree will nest an ngtree under a parent
 - Adding a parent ngtree will add a special parent ngtree for when you want
   the perspective of a certain tree level, but want to add a parent object
+- With [nglib] compact_trees, new ngtrees are slotted NGTree mappings
 
 """
-import re
+import sys
 import datetime
 import logging
 import nglib
 from . import export
 from . import upgrade
+from .node import NGTree
 
 logger = logging.getLogger(__name__)
 
 verbose = 0
 
+# Keys hidden from tree output, keys containing a head key do not stop a
+# section from printing as a header only line
+struct_keys = frozenset(['Name', 'data'])
+head_keys = ('Name', '_type', '_ccount', 'data')
+
+# Lines buffered by print_ngtree between writes
+print_buffer = 1000
+
 
 def get_ngtree(name, tree_type="VLAN"):
     """Initialize an NGTree"""
 
+    if nglib.compact_trees:
+        return NGTree(name, tree_type, 0, [])
+
     ngtree = dict()
     ngtree['Name'] = name
     ngtree['_type'] = tree_type
@@ -73,132 +86,92 @@ def add_child_ngtree(ngtree, cngtree):
     ngtree['_ccount'] = ngtree['_ccount'] + 1
     ngtree['data'].append(cngtree)
 
-def print_ngtree(ngtree, dtree, parent=False, depth=0, lasttree=False):
+def print_ngtree(ngtree, dtree=None, parent=False, depth=0, lasttree=False, out=None):
     """
-    Recrusively print NGTrees using UTF-8 line drawing characters. If this
-    causes terminal problems for you and you would prefer an ASCII only mode,
+    Print NGTrees using UTF-8 line drawing characters. If this causes
+    terminal problems for you and you would prefer an ASCII only mode,
     contact me.
 
-    Notes: This code is complicated, even to me. It should probably be rewritten,
-    but basically, it nests multiple levels of ngtrees and their children in a
-    pretty output format for use on the CLI.
-
-    get_space_indent() gets output to prepend to lines to form the tree
-    structure during output. It keeps track of where output is relative to the
-    rest of the tree structure.
-
-    The dtree dict keeps track of positions on tree to print continuations.
+    Trees are walked with a stack instead of recursion and the ngtree is not
+    modified, so it can be exported again or cached after printing. Output
+    is buffered and written to out (default sys.stdout).
 
-    The close out section needs to be better understood, but when closing out a
-    child tree, you need to keep pipes from connecting sections below.
+    Each stack entry carries the prefix for its lines. A child adds four
+    columns to its parent's prefix, with a pipe in the first column while
+    the parent has more children below it. dtree and depth set the starting
+    position (see get_space_indent).
 
     """
 
-    dtree = dtree.copy()
-
-    # Get indentation spaces variable based on depth
-    spaces, indent = get_space_indent(depth, dtree)
-
-    # Get indentation spaces variable based on depth
-    spaces, indent = get_space_indent(depth, dtree)
-
-    # Print Header
-
-    if depth == 0:
-        indent = ""
-
-    # Last tree terminates with └
-    if lasttree:
-        indent = indent.replace('├', '└')
-
-    # Abbreviate certain types for shorter headers
-    ngtype = ngtree['_type']
-    if ngtype == "VLAN":
-        ngtype = ""
-    elif ngtree['_type'] == "Neighbor":
-        ngtype = ""
-    else:
-        ngtype = " " + ngtype
-    header = " "
-    header = header.join([ngtype, ngtree['Name']])
-
-    # Print section header -[header]
-    if depth == 0:
-        print("{:}┌─[{:} ]".format(indent, header))
-        print("│")
-    else:
-        # Headonly for QPATH Results
-        headonly = True
-        for en in ngtree:
-            #if not re.search(r'Name|_type|_ccount', en):
-            if not re.search(r'Name|_type|_ccount|data', en) \
-                or len(ngtree['data']):
-
-                headonly = False
-                break
-        if headonly:
-            print("{:}──[{:} ]".format(indent, header))
-        else:
-            print("{:}┬─[{:} ]".format(indent, header))
-
-    # Store Children list from data
-    clist = ngtree['data']
-
-    # If there are no children, do not indent tree structure
-    if len(clist) == 0:
-        dtree.pop(depth, None)
+    if out is None:
+        out = sys.stdout
 
-    # Get indentation spaces variable based on current depth
-    spaces, indent = get_space_indent(depth, dtree)
+    lines = []
+    spaces, indent = get_space_indent(depth, dtree or dict())
+    stack = [(ngtree, spaces, depth, lasttree)]
 
-    # Filter tree of structural data (_ccount etc)
-    ftree = filter_tree(ngtree)
-    if nglib.verbose > 1:
-        ftree = ngtree
+    while stack:
+        ngtree, spaces, depth, lasttree = stack.pop()
+        clist = ngtree['data']
 
-    # Print all keys at current depth
-    # Last one prints special if terminating section
-    lastcount = len(ftree.keys())
-    for key in sorted(ftree.keys()):
-        lastcount = lastcount - 1
-
-        # If there are children of current tree, then continue tree.
-        # Otherwise terminate tree with └
-        if lastcount or len(clist) > 0:
-            print("{:}├── {:} : {:}".format(spaces, key, ftree[key]))
+        # Abbreviate certain types for shorter headers
+        ngtype = ngtree['_type']
+        if ngtype in ("VLAN", "Neighbor"):
+            ngtype = ""
         else:
-            print("{:}└── {:} : {:}".format(spaces, key, ftree[key]))
-
+            ngtype = " " + ngtype
+        header = " ".join([ngtype, ngtree['Name']])
 
-    # Close out a section with empty line for visual separation
-    if len(clist) > 0:
-        spaces = spaces + "│"
-    print(spaces)
-
-    # Print child trees with recursive call to this function
-    while len(clist) > 0:
-
-        ctree = clist.pop(0)
-
-        # Continue printing with depth
-        if len(clist) != 0:
-            dtree[depth] = 1
-
-        lasttree = False
-        # End of indentation, un-indent
-        if len(clist) == 0:
-            dtree.pop(depth, None)
-            lasttree = True
+        # Print section header -[header]
+        if depth == 0:
+            lines.append("┌─[{:} ]".format(header))
+            lines.append("│")
+        else:
+            indent = "└───" if lasttree else "├───"
+            if depth > 5:
+                indent = spaces[:depth - 5] + " " + indent
+
+            # Headonly for QPATH Results
+            headonly = not clist and all(
+                any(s in en for s in head_keys) for en in ngtree)
+            if headonly:
+                lines.append("{:}──[{:} ]".format(indent, header))
+            else:
+                lines.append("{:}┬─[{:} ]".format(indent, header))
+
+        # Filter tree of structural data (_ccount etc)
+        if nglib.verbose > 1:
+            keys = sorted(ngtree.keys())
+        else:
+            keys = sorted(filter_tree(ngtree).keys())
+
+        # Print all keys at current depth, if there are children of current
+        # tree then continue tree. Otherwise terminate tree with └
+        for i, key in enumerate(keys):
+            if i < len(keys) - 1 or clist:
+                lines.append("{:}├── {:} : {:}".format(spaces, key, ngtree[key]))
+            else:
+                lines.append("{:}└── {:} : {:}".format(spaces, key, ngtree[key]))
+
+        # Close out a section with empty line for visual separation
+        if clist:
+            lines.append(spaces + "│")
+        else:
+            lines.append(spaces)
 
-        spaces, indent = get_space_indent(depth, dtree)
+        # Child trees print next, continuing the pipe under all but the last
+        if clist:
+            stack.append((clist[-1], spaces + "    ", depth + 4, True))
+        cspaces = spaces + "│   "
+        for ctree in reversed(clist[:-1]):
+            stack.append((ctree, cspaces, depth + 4, False))
 
-        # Indent and print child tree recursively
-        cdepth = depth + 4
-        print_ngtree(ctree, dtree, depth=cdepth, lasttree=lasttree)
+        if len(lines) >= print_buffer:
+            out.write("\n".join(lines) + "\n")
+            lines = []
 
-        # Ending section, un-indent
-        if len(clist) == 0:
-            dtree.pop(depth, None)
+    if lines:
+        out.write("\n".join(lines) + "\n")
 
 
 def get_space_indent(depth, dtree):
@@ -228,12 +201,5 @@ def get_space_indent(depth, dtree):
 def filter_tree(ngtree):
     '''Filter structural data'''
 
-    keys = ngtree.keys()
-    newtree = dict()
-
-    for key in keys:
-        if not re.search('(^_)|(^Name$)|(^data$)', key):
-            newtree[key] = ngtree[key]
-            #ngtree.pop(key)
-
-    return newtree
+    return dict((key, ngtree[key]) for key in ngtree
+                if key not in struct_keys and not key.startswith('_'))
@@ -40,7 +40,11 @@ import json
 import yaml
 import csv
 import sys
+import io
+from collections.abc import Mapping
+from json.encoder import encode_basestring_ascii
 import nglib.ngtree
+from nglib.ngtree.node import NGTree
 
 verbose = 0
 logger = logging.getLogger(__name__)
@@ -71,9 +75,16 @@ def exp_JSON(ngtree):
 def get_JSON(ngtree):
     """Returns an ngtree as JSON Object"""
 
-    jtree = json.dumps(ngtree, indent=2, sort_keys=True)
+    jtree = json.dumps(ngtree, indent=2, sort_keys=True, default=json_default)
     return jtree
 
+def json_default(obj):
+    """Serialize compact NGTrees as JSON objects"""
+
+    if isinstance(obj, NGTree):
+        return dict(obj.items())
+    raise TypeError(repr(obj) + " is not JSON serializable")
+
 # Export as YAML
 def exp_YAML(ngtree):
     """Prints an ngtree as YAML"""
@@ -84,6 +95,12 @@ def get_YAML(ngtree):
     ytree = yaml.dump(ngtree, Dumper=yaml.Dumper, default_flow_style=False)
     return ytree
 
+def represent_ngtree(dumper, ngtree):
+    """Dump compact NGTrees as YAML mappings"""
+    return dumper.represent_dict(ngtree)
+
+yaml.add_representer(NGTree, represent_ngtree, Dumper=yaml.Dumper)
+
 def exp_qtree(ngtree):
     """Prints an ngtree with headers only"""
 
@@ -100,12 +117,21 @@ def cleanNGTree(ngtree):
 def exp_CSV(ngtree, level=1):
     """Flatten NGTREE and dump as CSV, optional two levels deep"""
 
+    fieldnames = get_CSV_fields(ngtree['data'], level=level)
+
+    for line in stream_CSV(ngtree['data'], fieldnames, level=level):
+        sys.stdout.write(line)
+
+
+def get_CSV_fields(children, level=1):
+    """Pre-scan child ngtrees for CSV fieldnames"""
+
     fieldnames = []
     if level == 2:
         fieldnames.append('_ctype')
         fieldnames.append('CName')
 
-    for child in ngtree['data']:
+    for child in children:
         for en in sorted(child.keys()):
             if isinstance(en, (int, str)) and en != 'data' \
                 and en not in fieldnames:
@@ -117,12 +143,26 @@ def exp_CSV(ngtree, level=1):
                 for en in sorted(gchild.keys()):
                     if isinstance(en, (int, str)) and en != 'data' \
                         and en not in fieldnames:
-                        fieldnames.append(en) 
+                        fieldnames.append(en)
 
-    excsv = csv.DictWriter(sys.stdout, fieldnames=fieldnames)
+    return fieldnames
+
+
+def stream_CSV(children, fieldnames, level=1):
+    """
+    Yield CSV lines for child ngtrees one row at a time
+
+    - children can be any iterable or generator of ngtrees
+    - fieldnames is the declared or pre-scanned schema (get_CSV_fields)
+    - Fields outside the schema are dropped
+    """
+
+    buf = io.StringIO()
+    excsv = csv.DictWriter(buf, fieldnames=fieldnames, extrasaction='ignore')
     excsv.writeheader()
+    yield _drain(buf)
 
-    for child in ngtree['data']:
+    for child in children:
         entry = dict()
         for en in sorted(child.keys()):
             if isinstance(en, (int, str)) and not re.search('data|Switches', en):
@@ -139,9 +179,207 @@ def exp_CSV(ngtree, level=1):
                         else:
                             centry[en] = gchild[en]
                 excsv.writerow(centry)
+                yield _drain(buf)
 
         else:
             excsv.writerow(entry)
+            yield _drain(buf)
+
+
+def stream_JSON(head, children, counts=('_ccount',), rename=None):
+    """
+    Yield an ngtree as JSON fragments from a generator of child trees
+
+    - head holds the top level keys (data is ignored)
+    - Children are serialized and released one at a time under data
+    - Each key in counts is set to the number of children at the end
+    - rename is applied to keys as they are serialized (see dump_JSON)
+    """
+
+    keyname = rename or _same_key
+    ckeys = set(keyname(c) for c in counts)
+    ckeys.add(keyname('data'))
+    hkeys = dict((keyname(k), k) for k in head.keys() if k != 'data' and k not in counts)
+    hkeys = dict((k, hkeys[k]) for k in hkeys if k not in ckeys)
+
+    yield '{'
+    for key in sorted(hkeys):
+        yield '\n  ' + encode_basestring_ascii(_JSON_key(key)) + ': ' \
+            + dump_JSON(head[hkeys[key]], rename=rename, level=1) + ','
+
+    yield '\n  ' + encode_basestring_ascii(keyname('data')) + ': ['
+
+    ccount = 0
+    for child in children:
+        if ccount:
+            yield ','
+        ccount += 1
+        yield '\n    ' + dump_JSON(child, rename=rename, level=2)
+
+    if ccount:
+        yield '\n  ]'
+    else:
+        yield ']'
+
+    for key in sorted(keyname(c) for c in counts):
+        yield ',\n  ' + encode_basestring_ascii(key) + ': ' + str(ccount)
+
+    yield '\n}\n'
+
+
+def dump_JSON(obj, rename=None, keyed=False, level=0):
+    """
+    Returns obj as JSON text, the same as get_JSON()
+
+    - rename(key) renames dictionary keys as they are serialized (v2 API),
+      covering the same keys as upgrade_ngt_v2 without modifying obj
+    - keyed keeps the top level keys (results keyed by query)
+    - level indents the output to nest under a parent at that depth
+    """
+
+    out = []
+    if keyed and isinstance(obj, Mapping):
+        _dump_dict(obj, out.append, rename, level, keyname=_same_key)
+    else:
+        _dump(obj, out.append, rename, level)
+    return ''.join(out)
+
+
+def _dump(obj, write, rename, level):
+    """Write JSON for any value, ngtree dicts have their keys renamed"""
+
+    if isinstance(obj, str):
+        write(encode_basestring_ascii(obj))
+    elif obj is None:
+        write('null')
+    elif obj is True:
+        write('true')
+    elif obj is False:
+        write('false')
+    elif isinstance(obj, int):
+        write(int.__repr__(obj))
+    elif isinstance(obj, float):
+        write(_JSON_float(obj))
+    elif isinstance(obj, Mapping):
+        _dump_dict(obj, write, rename, level)
+    elif isinstance(obj, list):
+        _dump_list(obj, write, rename, level)
+    elif isinstance(obj, tuple):
+        _dump_list(obj, write, None, level)
+    else:
+        _dump(json_default(obj), write, rename, level)
+
+
+def _dump_dict(obj, write, rename, level, keyname=None):
+    """Write a JSON object with sorted (renamed) keys"""
+
+    if not obj:
+        write('{}')
+        return
+
+    # Renamed keys that collide keep the last value, as in upgrade_ngt_v2
+    if rename or keyname:
+        keyname = keyname or rename
+        items = sorted(dict((keyname(k), v) for k, v in obj.items()).items())
+    else:
+        items = sorted(obj.items())
+
+    indent = '\n' + '  ' * (level + 1)
+    first = True
+    for key, value in items:
+        if first:
+            write('{' + indent)
+            first = False
+        else:
+            write(',' + indent)
+        write(encode_basestring_ascii(_JSON_key(key)) + ': ')
+        _dump(value, write, rename, level + 1)
+    write('\n' + '  ' * level + '}')
+
+
+def _dump_list(obj, write, rename, level):
+    """Write a JSON array, nested lists are not renamed (as upgrade_ngt_v2)"""
+
+    if not obj:
+        write('[]')
+        return
+
+    indent = '\n' + '  ' * (level + 1)
+    first = True
+    for value in obj:
+        if first:
+            write('[' + indent)
+            first = False
+        else:
+            write(',' + indent)
+        if isinstance(value, (list, tuple)):
+            _dump(value, write, None, level + 1)
+        else:
+            _dump(value, write, rename, level + 1)
+    write('\n' + '  ' * level + ']')
+
+
+def _JSON_key(key):
+    """Convert a dictionary key to a string like json.dumps"""
+
+    if isinstance(key, str):
+        return key
+    elif key is True:
+        return 'true'
+    elif key is False:
+        return 'false'
+    elif key is None:
+        return 'null'
+    elif isinstance(key, int):
+        return int.__repr__(key)
+    elif isinstance(key, float):
+        return _JSON_float(key)
+    raise TypeError("keys must be str, int, float, bool or None, not "
+                    + key.__class__.__name__)
+
+
+def _JSON_float(value):
+    """Float text like json.dumps"""
+
+    if value != value:
+        return 'NaN'
+    elif value == float('inf'):
+        return 'Infinity'
+    elif value == -float('inf'):
+        return '-Infinity'
+    return float.__repr__(value)
+
+
+def _same_key(key):
+    return key
+
+
+def exp_stream(head, children, rtype, fieldnames=None, counts=('_ccount',)):
+    """
+    Stream a large ngtree to stdout as JSON or CSV
+
+    Notes: CSV fieldnames are pre-scanned if not declared, which requires
+    children to be a list
+    """
+
+    if rtype == "JSON":
+        for frag in stream_JSON(head, children, counts=counts):
+            sys.stdout.write(frag)
+    elif rtype == "CSV":
+        if not fieldnames:
+            children = list(children)
+            fieldnames = get_CSV_fields(children)
+        for line in stream_CSV(children, fieldnames):
+            sys.stdout.write(line)
+
+
+def _drain(buf):
+    """Return and clear a StringIO buffer"""
+
+    text = buf.getvalue()
+    buf.seek(0)
+    buf.truncate(0)
+    return text
 
 
 def strip_ngtree(ngtree, top=True):
@@ -0,0 +1,182 @@
+#!/usr/bin/env python
+#
+# Compact ngtree nodes
+#
+# Copyright (c) 2016 "Jonathan Yantis"
+#
+# This file is a part of NetGrph.
+#
+#    This program is free software: you can redistribute it and/or  modify
+#    it under the terms of the GNU Affero General Public License, version 3,
+#    as published by the Free Software Foundation.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#    As a special exception, the copyright holders give permission to link the
+#    code of portions of this program with the OpenSSL library under certain
+#    conditions as described in each individual source file and distribute
+#    linked combinations including the program with the OpenSSL library. You
+#    must comply with the GNU Affero General Public License in all respects
+#    for all of the code used other than as permitted herein. If you modify
+#    file(s) with this exception, you may extend this exception to your
+#    version of the file(s), but you are not obligated to do so. If you do not
+#    wish to do so, delete this exception statement from your version. If you
+#    delete this exception statement from all source files in the program,
+#    then also delete it in the license file.
+#
+#
+"""
+Compact ngtree nodes ([nglib] compact_trees)
+
+- Name, _type, _ccount and data are stored in slots
+- Other keys share a key layout (shape) between nodes that were built with
+  the same keys in the same order, each node only keeps a tuple of values
+- NGTree behaves like a dict for queries and exports (to_dict converts back)
+"""
+from collections.abc import Mapping, MutableMapping
+
+# Keys stored in slots, in get_ngtree order
+fields = ('Name', '_type', '_ccount', 'data')
+field_set = frozenset(fields)
+
+# Marks an unset slot
+_missing = object()
+
+
+class Shape(object):
+    """Shared key layout for the non-structural keys of NGTrees"""
+
+    __slots__ = ('keys', 'index', 'next')
+
+    def __init__(self, keys=()):
+        self.keys = keys
+        self.index = dict((k, i) for i, k in enumerate(keys))
+        self.next = dict()
+
+    def add(self, key):
+        """Return the shape with key appended"""
+
+        shape = self.next.get(key)
+        if shape is None:
+            shape = self.next.setdefault(key, Shape(self.keys + (key,)))
+        return shape
+
+
+root_shape = Shape()
+
+
+class NGTree(MutableMapping):
+    """Compact dict-like ngtree node"""
+
+    __slots__ = ('Name', '_type', '_ccount', 'data', '_shape', '_values')
+
+    def __init__(self, name=_missing, tree_type=_missing, ccount=_missing, data=_missing):
+        self.Name = name
+        self._type = tree_type
+        self._ccount = ccount
+        self.data = data
+        self._shape = root_shape
+        self._values = ()
+
+    @classmethod
+    def from_items(cls, items):
+        """New NGTree from (key, value) pairs"""
+
+        tree = cls()
+        for key, value in items:
+            tree[key] = value
+        return tree
+
+    @classmethod
+    def from_dict(cls, ngtree):
+        """Convert a dict ngtree and its data children to NGTrees"""
+
+        tree = cls.from_items(ngtree.items())
+        if isinstance(tree.data, list):
+            tree.data = [cls.from_dict(c) if isinstance(c, dict) else c for c in tree.data]
+        return tree
+
+    def __getitem__(self, key):
+        if key in field_set:
+            value = getattr(self, key)
+            if value is _missing:
+                raise KeyError(key)
+            return value
+
+        i = self._shape.index.get(key)
+        if i is None:
+            raise KeyError(key)
+        return self._values[i]
+
+    def __setitem__(self, key, value):
+        if key in field_set:
+            setattr(self, key, value)
+            return
+
+        i = self._shape.index.get(key)
+        if i is None:
+            self._shape = self._shape.add(key)
+            self._values += (value,)
+        else:
+            self._values = self._values[:i] + (value,) + self._values[i + 1:]
+
+    def __delitem__(self, key):
+        if key in field_set:
+            if getattr(self, key) is _missing:
+                raise KeyError(key)
+            setattr(self, key, _missing)
+            return
+
+        i = self._shape.index.get(key)
+        if i is None:
+            raise KeyError(key)
+
+        # Rebuild the shape without key
+        keys = self._shape.keys[:i] + self._shape.keys[i + 1:]
+        self._values = self._values[:i] + self._values[i + 1:]
+        shape = root_shape
+        for k in keys:
+            shape = shape.add(k)
+        self._shape = shape
+
+    def __contains__(self, key):
+        if key in field_set:
+            return getattr(self, key) is not _missing
+        return key in self._shape.index
+
+    def __iter__(self):
+        for key in fields:
+            if getattr(self, key) is not _missing:
+                yield key
+        for key in self._shape.keys:
+            yield key
+
+    def __len__(self):
+        return sum(1 for key in fields if getattr(self, key) is not _missing) \
+            + len(self._values)
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+    def __reduce__(self):
+        return (self.__class__.from_items, (list(self.items()),))
+
+    def copy(self):
+        """Shallow copy, like dict.copy()"""
+        return self.__class__.from_items(self.items())
+
+
+def to_dict(ngtree):
+    """Return a plain dict copy of an ngtree with NGTrees converted"""
+
+    if isinstance(ngtree, Mapping):
+        return dict((k, to_dict(v)) for k, v in ngtree.items())
+    elif isinstance(ngtree, list):
+        return [to_dict(v) for v in ngtree]
+    return ngtree
@@ -1,8 +1,13 @@
 'Upgrade older ngtrees to newer version'
 import logging
+import functools
+from collections.abc import Mapping
 
 logger = logging.getLogger(__name__)
 
+# Translated key names kept by upgrade_key_v2
+key_cache_size = 4096
+
 def upgrade_ngt_v2(ngt):
     'Upgrade ngt structures to version 2 for the API'
 
@@ -18,22 +23,29 @@ def upgrade_ngt_v2(ngt):
         for f in nt:
             # Upgrade dictionary key
             tree.pop(f)
-            tree[_new_name(f)] = nt[f]
+            tree[upgrade_key_v2(f)] = nt[f]
 
             # Found a nested dict, add to stack
-            if isinstance(nt[f], dict):
+            if isinstance(nt[f], Mapping):
                 stack.append(nt[f])
 
             # Found a nested list
             elif isinstance(nt[f], list):
                 for en in nt[f]:
                     # nested dict in list, add to stack
-                    if isinstance(en, dict):
+                    if isinstance(en, Mapping):
                         stack.append(en)
 
     return ngt
 
 
+@functools.lru_cache(maxsize=key_cache_size)
+def upgrade_key_v2(key):
+    'Return the version 2 name for a single ngtree key (memoized)'
+
+    return _new_name(key)
+
+
 def _new_name(old):
     'Get new name for fields (lowercase, replace spaces with _)'
 
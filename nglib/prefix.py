@@ -0,0 +1,273 @@
+#!/usr/bin/env python
+#
+# Copyright (c) 2016 "Jonathan Yantis"
+#
+# This file is a part of NetGrph.
+#
+#    This program is free software: you can redistribute it and/or  modify
+#    it under the terms of the GNU Affero General Public License, version 3,
+#    as published by the Free Software Foundation.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#    As a special exception, the copyright holders give permission to link the
+#    code of portions of this program with the OpenSSL library under certain
+#    conditions as described in each individual source file and distribute
+#    linked combinations including the program with the OpenSSL library. You
+#    must comply with the GNU Affero General Public License in all respects
+#    for all of the code used other than as permitted herein. If you modify
+#    file(s) with this exception, you may extend this exception to your
+#    version of the file(s), but you are not obligated to do so. If you do not
+#    wish to do so, delete this exception statement from your version. If you
+#    delete this exception statement from all source files in the program,
+#    then also delete it in the license file.
+#
+#
+"""
+Prefix Index for Longest Prefix Match Lookups
+
+ - PrefixTrie is a path compressed binary (Patricia) trie keyed by integer
+   address and prefix length, with one trie per IP version
+ - Each prefix holds values keyed by VRF (or any other key)
+ - The shared network index is built from one bulk query and reloads when
+   networks are imported or the graph marker changes
+"""
+import ipaddress
+import logging
+import threading
+import nglib
+import nglib.graph
+
+logger = logging.getLogger(__name__)
+
+# Shared network index and the graph marker it was built from
+net_index = None
+net_marker = None
+index_lock = threading.Lock()
+
+
+class PrefixNode(object):
+    """Trie node covering addr/plen, values are set on real prefixes"""
+
+    __slots__ = ('addr', 'plen', 'children', 'values')
+
+    def __init__(self, addr, plen):
+        self.addr = addr
+        self.plen = plen
+        self.children = [None, None]
+        self.values = None
+
+
+class PrefixTrie(object):
+    """VRF aware Patricia trie supporting LPM, subnet and supernet lookups"""
+
+    def __init__(self):
+        self.roots = {4: PrefixNode(0, 0), 6: PrefixNode(0, 0)}
+        self.count = 0
+
+    def insert(self, cidr, key, value):
+        """Store value for cidr under key (usually the VRF)"""
+
+        net = ipaddress.ip_network(cidr, strict=False)
+        bits = net.max_prefixlen
+        node = self._insert(self.roots[net.version], int(net.network_address),
+                            net.prefixlen, bits)
+        if node.values is None:
+            node.values = dict()
+        if key not in node.values:
+            self.count += 1
+        node.values[key] = value
+
+    def longest_match(self, ip, key=None):
+        """Return values of the most specific prefix containing ip"""
+
+        addr = ipaddress.ip_address(ip)
+        best = None
+        for node in self._walk(self.roots[addr.version], int(addr),
+                               addr.max_prefixlen, addr.max_prefixlen):
+            values = _filter(node, key)
+            if values:
+                best = values
+        return best or []
+
+    def supernets(self, cidr, key=None):
+        """Return values of all prefixes containing cidr (including itself)"""
+
+        net = ipaddress.ip_network(cidr, strict=False)
+        values = []
+        for node in self._walk(self.roots[net.version], int(net.network_address),
+                               net.prefixlen, net.max_prefixlen):
+            values.extend(_filter(node, key))
+        return values
+
+    def subnets(self, cidr, key=None):
+        """Return values of all prefixes contained in cidr (including itself)"""
+
+        net = ipaddress.ip_network(cidr, strict=False)
+        bits = net.max_prefixlen
+        addr = int(net.network_address)
+        plen = net.prefixlen
+
+        values = []
+        node = self.roots[net.version]
+        while node is not None:
+            if node.plen >= plen:
+                if _mask(node.addr, plen, bits) == addr:
+                    stack = [node]
+                    while stack:
+                        sub = stack.pop()
+                        values.extend(_filter(sub, key))
+                        for child in reversed(sub.children):
+                            if child is not None:
+                                stack.append(child)
+                break
+            if _mask(addr, node.plen, bits) != node.addr:
+                break
+            node = node.children[_bit(addr, node.plen, bits)]
+
+        return values
+
+    def _insert(self, node, addr, plen, bits):
+        """Find or create the node for addr/plen, splitting edges as needed"""
+
+        while node.plen != plen:
+            bit = _bit(addr, node.plen, bits)
+            child = node.children[bit]
+
+            if child is None:
+                new = PrefixNode(_mask(addr, plen, bits), plen)
+                node.children[bit] = new
+                return new
+
+            common = _common(child.addr, addr, min(child.plen, plen), bits)
+            if common == child.plen:
+                node = child
+                continue
+
+            # Split the edge at the first differing bit
+            mid = PrefixNode(_mask(addr, common, bits), common)
+            node.children[bit] = mid
+            mid.children[_bit(child.addr, common, bits)] = child
+            if common == plen:
+                return mid
+
+            new = PrefixNode(_mask(addr, plen, bits), plen)
+            mid.children[_bit(addr, common, bits)] = new
+            return new
+
+        return node
+
+    def _walk(self, node, addr, plen, bits):
+        """Yield nodes covering addr/plen from least to most specific"""
+
+        while node is not None and node.plen <= plen:
+            if _mask(addr, node.plen, bits) != node.addr:
+                return
+            yield node
+            if node.plen == bits:
+                return
+            node = node.children[_bit(addr, node.plen, bits)]
+
+
+def _mask(addr, plen, bits):
+    """Mask addr down to plen bits"""
+    return addr & (((1 << plen) - 1) << (bits - plen))
+
+
+def _bit(addr, pos, bits):
+    """Return bit at pos (0 is the most significant bit)"""
+    return (addr >> (bits - pos - 1)) & 1
+
+
+def _common(addr1, addr2, limit, bits):
+    """Return the common prefix length of two addresses up to limit"""
+    diff = addr1 ^ addr2
+    if not diff:
+        return limit
+    return min(bits - diff.bit_length(), limit)
+
+
+def _filter(node, key):
+    """Return node values, optionally only for key"""
+
+    if not node.values:
+        return []
+    if key is None:
+        return [node.values[k] for k in sorted(node.values)]
+    if key in node.values:
+        return [node.values[key]]
+    return []
+
+
+def get_network_index():
+    """Return the shared network index, rebuilding it if the graph changed"""
+
+    global net_index
+    global net_marker
+
+    marker = nglib.get_graph_marker()
+
+    with index_lock:
+        if net_index is None or net_marker != marker:
+            net_index = load_network_index()
+            net_marker = marker
+
+    return net_index
+
+
+def load_network_index():
+    """Build a PrefixTrie of all networks keyed by VRF"""
+
+    trie = PrefixTrie()
+
+    results = nglib.graph.get_graph().scan_nodes(
+        'Network', ['cidr', 'vrf', 'vrfcidr', 'gateway'])
+
+    for r in results:
+        if r['cidr']:
+            try:
+                trie.insert(r['cidr'], r['vrf'], {
+                    'cidr': r['cidr'], 'vrf': r['vrf'],
+                    'vrfcidr': r['vrfcidr'], 'gateway': r['gateway']})
+            except ValueError:
+                logger.warning("Prefix Index: Invalid CIDR %s", r['cidr'])
+
+    logger.debug("Loaded %s networks into prefix index", trie.count)
+
+    return trie
+
+
+def invalidate_network_index():
+    """Drop the shared index after network imports"""
+
+    global net_index
+
+    with index_lock:
+        net_index = None
+
+
+def longest_match(ip, vrf=None):
+    """Return the most specific network entry for ip (or None)"""
+
+    values = get_network_index().longest_match(ip, vrf)
+    if values:
+        return values[0]
+    return None
+
+
+def subnets_of(cidr, vrf=None):
+    """Return all network entries contained in cidr"""
+
+    return get_network_index().subnets(cidr, vrf)
+
+
+def supernets_of(cidr, vrf=None):
+    """Return all network entries containing cidr"""
+
+    return get_network_index().supernets(cidr, vrf)
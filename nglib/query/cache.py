@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+#
+# Copyright (c) 2016 "Jonathan Yantis"
+#
+# This file is a part of NetGrph.
+#
+#    This program is free software: you can redistribute it and/or  modify
+#    it under the terms of the GNU Affero General Public License, version 3,
+#    as published by the Free Software Foundation.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#    As a special exception, the copyright holders give permission to link the
+#    code of portions of this program with the OpenSSL library under certain
+#    conditions as described in each individual source file and distribute
+#    linked combinations including the program with the OpenSSL library. You
+#    must comply with the GNU Affero General Public License in all respects
+#    for all of the code used other than as permitted herein. If you modify
+#    file(s) with this exception, you may extend this exception to your
+#    version of the file(s), but you are not obligated to do so. If you do not
+#    wish to do so, delete this exception statement from your version. If you
+#    delete this exception statement from all source files in the program,
+#    then also delete it in the license file.
+#
+#
+"""
+Query Result Cache
+
+ - Caches NGTREE results of query functions keyed on the function name and
+   its normalized arguments (defaults applied, dicts sorted)
+ - LRU limited to cache_size entries, each entry expires after cache_ttl
+ - Cleared whenever ngupdate bumps the graph version marker
+ - Results are copied in and out since callers modify ngtrees in place
+"""
+import copy
+import time
+import inspect
+import logging
+import threading
+import functools
+from collections import OrderedDict
+from collections.abc import Mapping
+import nglib
+
+logger = logging.getLogger(__name__)
+
+# Cached results by key, oldest first, and the graph version they came from
+results = OrderedDict()
+cache_version = None
+cache_lock = threading.Lock()
+cache_stats = {'hits': 0, 'misses': 0, 'expired': 0, 'evictions': 0,
+               'invalidations': 0}
+
+
+def cached(func):
+    """
+    Decorate a query function to cache its NGTREE results
+
+    Notes: Other rtypes print their output and always run the query
+    """
+
+    sig = inspect.signature(func)
+    name = func.__module__ + '.' + func.__name__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+
+        bound = sig.bind(*args, **kwargs)
+        bound.apply_defaults()
+
+        if not nglib.cache_size or bound.arguments.get('rtype', 'NGTREE') != 'NGTREE':
+            return func(*args, **kwargs)
+
+        key = (name, normalize(bound.arguments))
+
+        found, result = get_result(key)
+        if found:
+            return result
+
+        result = func(*args, **kwargs)
+        if isinstance(result, Mapping):
+            put_result(key, result)
+
+        return result
+
+    return wrapper
+
+
+def normalize(value):
+    """Return a hashable, order independent version of query arguments"""
+
+    if isinstance(value, dict):
+        return tuple(sorted((str(k), normalize(v)) for k, v in value.items()))
+    elif isinstance(value, (list, tuple, set)):
+        return tuple(normalize(v) for v in value)
+
+    return value
+
+
+def get_result(key):
+    """Return (found, copy of result) for key, checking version and TTL"""
+
+    check_version()
+
+    with cache_lock:
+        entry = results.get(key)
+        if entry is None:
+            cache_stats['misses'] += 1
+            return False, None
+
+        # Expired entries count as a miss
+        if time.time() - entry[0] > nglib.cache_ttl:
+            del results[key]
+            cache_stats['expired'] += 1
+            cache_stats['misses'] += 1
+            return False, None
+
+        results.move_to_end(key)
+        cache_stats['hits'] += 1
+        result = entry[1]
+
+    return True, copy.deepcopy(result)
+
+
+def put_result(key, result):
+    """Store a copy of result, evicting least recently used entries"""
+
+    result = copy.deepcopy(result)
+
+    with cache_lock:
+        results[key] = (time.time(), result)
+        results.move_to_end(key)
+        while len(results) > nglib.cache_size:
+            results.popitem(last=False)
+            cache_stats['evictions'] += 1
+
+
+def check_version():
+    """Clear the cache if the graph version changed since it was filled"""
+
+    global cache_version
+
+    version = nglib.get_graph_version()
+
+    with cache_lock:
+        if version != cache_version:
+            if results:
+                logger.debug("Query Cache: graph version %s, clearing %s entries",
+                             version, len(results))
+                cache_stats['invalidations'] += 1
+            results.clear()
+            cache_version = version
+
+
+def clear_cache():
+    """Drop all cached results"""
+
+    with cache_lock:
+        results.clear()
+
+
+def get_cache_stats():
+    """Return query cache counters"""
+
+    with cache_lock:
+        stats = cache_stats.copy()
+        stats['size'] = len(results)
+        stats['version'] = cache_version
+
+    stats['max_size'] = nglib.cache_size
+    stats['ttl'] = nglib.cache_ttl
+    lookups = stats['hits'] + stats['misses']
+    stats['hit_ratio'] = round(stats['hits'] / lookups, 3) if lookups else 0.0
+
+    return stats
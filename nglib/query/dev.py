@@ -37,10 +37,12 @@ import sys
 import nglib
 import nglib.ngtree
 import nglib.ngtree.export
+from nglib.query.cache import cached
 from nglib.exceptions import OutputError, ResultError
 
 logger = logging.getLogger(__name__)
 
+@cached
 def get_device(dev, rtype="NGTREE", vrange=None):
     """Get Switch perspective (neighbors, vlans, routed networks)"""
 
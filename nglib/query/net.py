@@ -32,18 +32,24 @@
 """
 import sys
 import re
+import copy
 import socket
+from concurrent.futures import ThreadPoolExecutor
 from operator import itemgetter, attrgetter
 import ipaddress
 import logging
 import nglib
 import nglib.netdb.ip
+import nglib.prefix
 from nglib.exceptions import OutputError, ResultError
 
 from nglib.query.nNode import getJSONProperties
 
 logger = logging.getLogger(__name__)
 
+# Threads for concurrent DNS lookups in get_nets
+dns_workers = 16
+
 
 def get_net(ip, rtype="TREE", days=7, verbose=True):
     """Find a network for ip and return text output"""
@@ -74,6 +80,95 @@ def get_net(ip, rtype="TREE", days=7, verbose=True):
         raise OutputError("RType Not Supported", str(rtypes))
 
 
+def get_nets(ips, rtype="NGTREE", days=7):
+    """
+    Find networks for a list of IPs or hostnames, returns {query: ngtree}
+
+    Notes: Names that fail DNS and invalid addresses map to None. Networks
+    are matched on the prefix index and each CIDR tree is built once and
+    copied per IP. The IP field keeps the query as given, like get_net.
+    """
+
+    rtypes = ('NGTREE',)
+
+    if rtype not in rtypes:
+        raise OutputError("RType Not Supported", str(rtypes))
+
+    logger.info("Query: Batch IP lookup of %s IPs for %s", len(ips), nglib.user)
+
+    resolved = resolve_ips(ips)
+
+    # Longest prefix match against the in-memory index
+    cidrs = dict()
+    for ip in set(resolved.values()):
+        if ip:
+            cidrs[ip] = "0.0.0.0/0"
+            net = nglib.prefix.longest_match(ip)
+            if net:
+                cidrs[ip] = net['cidr']
+
+    nettrees = dict()
+    for cidr in set(cidrs.values()):
+        nettrees[cidr] = get_net_extended_tree(cidr, ngname="IP Object")
+
+    netdbtrees = dict()
+    if nglib.use_netdb and cidrs:
+        netdbtrees = nglib.netdb.ip.get_netdb_ips(cidrs.keys(), hours=days * 24)
+
+    ngtrees = dict()
+    for query in ips:
+        ip = resolved[query]
+        if not ip:
+            ngtrees[query] = None
+            continue
+
+        ngtree = copy.deepcopy(nettrees[cidrs[ip]])
+        for cngt in ngtree['data']:
+            cngt['IP'] = query
+
+        if netdbtrees.get(ip):
+            nglib.ngtree.add_child_ngtree(ngtree, copy.deepcopy(netdbtrees[ip]))
+
+        ngtrees[query] = ngtree
+
+    return ngtrees
+
+
+def resolve_ips(names):
+    """Resolve IPs or hostnames concurrently, returns {name: ip or None}"""
+
+    resolved = dict()
+    lookups = []
+
+    for name in set(names):
+        if re.search(r'^\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}$', name):
+            resolved[name] = name
+            try:
+                ipaddress.ip_address(name)
+            except ValueError:
+                logger.debug("Invalid IP Address: %s", name)
+                resolved[name] = None
+        else:
+            lookups.append(name)
+
+    if lookups:
+        with ThreadPoolExecutor(max_workers=min(dns_workers, len(lookups))) as pool:
+            for name, ip in zip(lookups, pool.map(_resolve_name, lookups)):
+                resolved[name] = ip
+
+    return resolved
+
+
+def _resolve_name(name):
+    """Return the IP for name, or None on lookup failure"""
+
+    try:
+        return socket.gethostbyname(name)
+    except socket.gaierror:
+        logger.debug("Hostname Lookup Failure on: %s", name)
+        return None
+
+
 def get_net_extended_tree(net, ip=None, router=None, ngtree=None, ngname="Networks"):
     """Built a Network ngtree with extended subnet attributes
 
@@ -282,13 +377,18 @@ def get_networks_on_cidr(cidr, rtype="CSV"):
         ngtree = nglib.ngtree.get_ngtree("IN CIDR", tree_type="NET")
         ngtree['CIDR'] = cidr
 
-        networks = nglib.bolt_ses.run(
-            'MATCH (n:Network) RETURN n.gateway AS gateway, n.name AS vrfcidr ORDER BY gateway')
+        # Candidates from the prefix index: subnets of cidr plus supernets
+        # whose gateway falls inside cidr
+        candidates = dict()
+        for n in nglib.prefix.subnets_of(cidr) + nglib.prefix.supernets_of(cidr):
+            candidates[n['vrfcidr']] = n
 
         # Sort results by gateway IP
         sort_nets = {}
-        for n in networks:
-            sort_nets[ipaddress.IPv4Address(n['gateway'])] = n
+        for vrfcidr in sorted(candidates):
+            n = candidates[vrfcidr]
+            if n['gateway']:
+                sort_nets[ipaddress.IPv4Address(n['gateway'])] = n
         for net in sorted(sort_nets.keys(), key=ipaddress.get_mixed_type_key):
             net = sort_nets[net]
 
@@ -347,19 +447,22 @@ def find_cidr(ip):
     # Always start with default route
     mostSpecific = "0.0.0.0/0"
 
-    # All networks
-    networks = nglib.py2neo_ses.cypher.execute('MATCH (n:Network) RETURN n.cidr as cidr')
-
-    if len(networks) > 1:
-        for r in networks.records:
-            if ipaddress.ip_address(ip) in ipaddress.ip_network(r.cidr):
-                if nglib.verbose > 1:
-                    print("find_cidr", ip + " in " + r.cidr)
-                mostSpecific = compare_cidr(mostSpecific, r.cidr)
+    # Longest prefix match on the shared network index
+    net = nglib.prefix.longest_match(ip)
+    if net:
+        if nglib.verbose > 1:
+            print("find_cidr", ip + " in " + net['cidr'])
+        mostSpecific = net['cidr']
 
     return mostSpecific
 
 
+def get_cidr_vrfs(cidr):
+    """Return the VRFs with a network on exactly cidr"""
+
+    return sorted(set(n['vrf'] for n in nglib.prefix.supernets_of(cidr) if n['cidr'] == cidr))
+
+
 def get_ipv4net(cidr):
     """Returns an IPv4Network Object"""
 
@@ -373,7 +476,7 @@ def compare_cidr(first, second):
     mask1 = first.split('/')
     mask2 = second.split('/')
 
-    if mask1[1] > mask2[1]:
+    if int(mask1[1]) > int(mask2[1]):
         return first
     else:
         return second
@@ -33,16 +33,23 @@ Network Path Algorithms Between Switches and Routers
 """
 import re
 import sys
+import copy
 import logging
+import functools
 import subprocess
 import nglib
-import nglib.query.nNode
 import nglib.netdb.ip
+import nglib.topology
+import nglib.routing
+import nglib.secpath
+from nglib.query.cache import cached
+from nglib.vlanset import VlanSet
 from nglib.exceptions import ResultError
 
 logger = logging.getLogger(__name__)
 
 
+@cached
 def get_full_path(src, dst, popt, rtype="NGTREE"):
     """ Gets the full path (switch->rt->VRF->rt->switch)
 
@@ -69,13 +76,23 @@ def get_full_path(src, dst, popt, rtype="NGTREE"):
 
         net1, net2 = src, dst
         n1tree, n2tree = None, None
+        srcres, dstres = None, None
+
+        # Independent lookups start together on the query pool
+        n1res = defer_query(nglib.query.net.get_net, net1, rtype="NGTREE",
+                            verbose=popt['verbose'])
+        n2res = defer_query(nglib.query.net.get_net, net2, rtype="NGTREE",
+                            verbose=popt['verbose'])
+        if nglib.use_netdb:
+            srcres = defer_query(nglib.netdb.ip.get_netdb_ip, src)
+            dstres = defer_query(nglib.netdb.ip.get_netdb_ip, dst)
 
         # Translate IPs to CIDRs
-        n1tree = nglib.query.net.get_net(net1, rtype="NGTREE", verbose=popt['verbose'])
+        n1tree = n1res()
         if n1tree:
             net1 = n1tree['data'][0]['Name']
 
-        n2tree = nglib.query.net.get_net(net2, rtype="NGTREE", verbose=popt['verbose'])
+        n2tree = n2res()
         if n2tree:
             net2 = n2tree['data'][0]['Name']
 
@@ -94,41 +111,53 @@ def get_full_path(src, dst, popt, rtype="NGTREE"):
             print("Warning: Could not locate", dst, file=sys.stderr)
             return          
 
+        # Routed path runs alongside the switched path lookups
+        rres = defer_query(get_full_routed_path, src, dst, popt.copy())
+
         # Routing Check
         routing = True
         if n1tree['data'][0]['vrfcidr'] == n2tree['data'][0]['vrfcidr']:
             routing = False
 
         if nglib.use_netdb:
-            srctree = nglib.netdb.ip.get_netdb_ip(src)
-            dsttree = nglib.netdb.ip.get_netdb_ip(dst)
+            srctree = srcres()
+            dsttree = dstres()
+
+        if srctree and not ('Switch' in srctree and srctree['Switch']):
+            srctree = None
+            print("Warning: Could not find source switch data in NetDB:", src, file=sys.stderr)
+
+        if dsttree and not ('Switch' in dsttree and dsttree['Switch']):
+            dsttree = None
+            print("Warning: Could not find destination switch data in NetDB", \
+                dst, file=sys.stderr)
+
+        # Switched paths to and from the routers run together
+        srcres, dstres = None, None
+
+        # If only switching, show the switched path between hosts
+        if not routing and srctree and dsttree:
+            srcres = defer_query(get_switched_path, srctree['Switch'],
+                                 dsttree['Switch'], popt.copy())
 
         # Find Switched Path from Source to Router
-        if srctree:
+        elif srctree:
             router = n1tree['data'][0]['Router']
             if 'StandbyRouter' in n1tree['data'][0]:
                 router = router + '|' + n1tree['data'][0]['StandbyRouter']
-            if 'Switch' in srctree and srctree['Switch']:
-                srcswp = get_switched_path(srctree['Switch'], router, popt)
-            else:
-                srctree = None
-                print("Warning: Could not find source switch data in NetDB:", src, file=sys.stderr)
+            srcres = defer_query(get_switched_path, srctree['Switch'], router, popt.copy())
 
         # Find Switched Path from Router to Destination
-        if dsttree:
+        if dsttree and routing:
             router = n2tree['data'][0]['Router']
             if 'StandbyRouter' in n2tree['data'][0]:
                 router = router + '|' + n2tree['data'][0]['StandbyRouter']
-            if 'Switch' in dsttree and dsttree['Switch']:
-                dstswp = get_switched_path(router, dsttree['Switch'], popt)
-            else:
-                dsttree = None
-                print("Warning: Could not find destination switch data in NetDB", \
-                    dst, file=sys.stderr)
+            dstres = defer_query(get_switched_path, router, dsttree['Switch'], popt.copy())
 
-            # If only switching, update srcswp to show switched path
-            if not routing and srctree and dsttree:
-                srcswp = get_switched_path(srctree['Switch'], dsttree['Switch'], popt)
+        if srcres:
+            srcswp = srcres()
+        if dstres:
+            dstswp = dstres()
 
         # Same switch/vlan check
         switching = True
@@ -183,7 +212,7 @@ def get_full_path(src, dst, popt, rtype="NGTREE"):
             nglib.ngtree.add_child_ngtree(ngtree, n1tree['data'][0])
 
         ## Check for routed paths (inter/intra VRF)
-        rtree = get_full_routed_path(src, dst, popt)
+        rtree = rres()
         if rtree and 'PATH' in rtree['_type']:
 
             # Breakdown L4 Path
@@ -227,6 +256,36 @@ def get_full_path(src, dst, popt, rtype="NGTREE"):
         else:
             raise ResultError("No Path Results", "Could not find a path from %s -> %s" % (src, dst))
 
+def defer_query(func, *args, **kwargs):
+    """
+    Start func on the query pool and return a callable for its result
+
+    Notes: Without a pool the call runs when its result is first needed
+    """
+
+    pool = nglib.get_query_pool()
+
+    if pool is None:
+        return functools.partial(func, *args, **kwargs)
+
+    return pool.submit(run_pooled, func, *args, **kwargs).result
+
+
+def run_pooled(func, *args, **kwargs):
+    """
+    Run func on a query pool thread
+
+    Notes: The thread's Bolt session goes back to the driver pool after each
+    call, so a dead connection is not reused by later lookups
+    """
+
+    try:
+        return func(*args, **kwargs)
+    finally:
+        if isinstance(nglib.bolt_ses, nglib.LocalSession):
+            nglib.bolt_ses.close()
+
+
 def get_full_routed_path(src, dst, popt, rtype="NGTREE"):
     """ Gets the full L3 Path between src -> dst IPs including inter-vrf routing
     """
@@ -293,13 +352,15 @@ def get_full_routed_path(src, dst, popt, rtype="NGTREE"):
         return ngtree
 
 
+@cached
 def get_routed_path(net1, net2, popt, rtype="NGTREE"):
     """
     Find the routed path between two CIDRs and return all interfaces and
-    devices between the two. This query need optimization.
+    devices between the two.
 
     - net1 and net2 can be IPs, and it will find the CIDR
-    - Uses Neo4j All Shortest Paths on ROUTED Relationships
+    - Uses Neo4j All Shortest Paths on ROUTED Relationships, or BFS on the
+      in-memory routing tables with path_engine = memory
     - Returns all distinct links along shortest paths along with distance
 
     """
@@ -346,90 +407,57 @@ def get_routed_path(net1, net2, popt, rtype="NGTREE"):
         popt['depth'] = str(int(popt['depth']) * 2)
 
         pathList = []
-        pathRec = []
-
-        # Finds all paths, then finds the relationships
-        rtrp = nglib.py2neo_ses.cypher.execute(
-            'MATCH (sn:Network)-[:ROUTED_BY|ROUTED_STANDBY]-(sr), '
-            + '(dn:Network)-[:ROUTED_BY|ROUTED_STANDBY]-(dr), rp = allShortestPaths '
-            + '((sr)-[:ROUTED*0..' + popt['depth'] + ']-(dr)) '
-            + 'WHERE ALL(v IN rels(rp) WHERE v.vrf = {vrf}) '
-            + 'AND sn.cidr =~ {net1} AND dn.cidr =~ {net2}'
-            + 'UNWIND nodes(rp) as r1 UNWIND nodes(rp) as r2 '
-            + 'MATCH (r1)<-[l1:ROUTED]-(n:Network {vrf:{vrf}})-[l2:ROUTED]->(r2) '
-            + 'OPTIONAL MATCH (n)-[:L3toL2]->(v:VLAN) '
-            + 'RETURN DISTINCT r1.name AS r1name, l1.gateway AS r1ip, '
-            + 'r2.name AS r2name, l2.gateway as r2ip, v.vid AS vid, '
-            + 'LENGTH(shortestPath((sn)<-[:ROUTED|ROUTED_BY|ROUTED_STANDBY*0..12]->(r1))) '
-            + 'AS distance ORDER BY distance',
-            {"net1": net1, "net2": net2, "vrf": popt['VRF']})
+
+        if nglib.path_engine == 'memory':
+            hops = nglib.routing.get_routed_links(net1, net2, popt['VRF'], popt['depth'])
+        else:
+            hops = get_routed_hops(net1, net2, popt['VRF'], popt['depth'])
 
         # Empty Query
-        if len(rtrp) == 0:
+        if not hops:
             return ngtree
 
-        allpaths = dict()
-        # Load all paths into tuples with distance value
-        for rec in rtrp:
-            p = (rec["r1name"], rec["r2name"])
-            allpaths[p] = rec["distance"]
-
-
-        # Find tuple with shortest distance (r1, core1) vs (core1, r1)
-        # Save to pathRec for second pass of records to populate tree
-        for en in allpaths:
-            if allpaths[en] < allpaths[tuple(reversed(en))]:
-                (r1, r2) = en
-                distance = allpaths[en]
-                pathRec.append((r1, r2, distance))
-
-        # Sort path records by distance, src router, dst router
-        pathRec = sorted(pathRec, key=lambda tup: (tup[2], tup[0], tup[1]))
-
-        # Build Trees and pathList from pathRecs
-        for path in pathRec:
-            for rec in rtrp:
-                if path[0] == rec['r1name'] and path[1] == rec['r2name']:
-                    #print(path[0], rec['r1ip'], '-->', path[1], rec['r2ip'])
-                    rtree = nglib.ngtree.get_ngtree("Hop", tree_type="L3-HOP")
-                    rtree['From Router'] = rec['r1name']
-                    rtree['From IP'] = rec['r1ip']
-                    rtree['To Router'] = rec['r2name']
-                    rtree['To IP'] = rec['r2ip']
-                    rtree['VLAN'] = rec['vid']
-
-                    # Calculate hop distance
-                    # Distance of 1 is correct, other distances should be:
-                    #   ((dist - 1) / 2) + 1
-                    distance = rec['distance']
-                    if distance != 1:
-                        distance = int((distance - 1) / 2) + 1
-
-                    # Save distance
-                    rtree['distance'] = distance
-
-                    # Rename rtree
-                    rtree['Name'] = "#{:} {:}({:}) -> {:}({:})".format( \
-                    distance, rec['r1name'], rec['r1ip'], rec['r2name'], rec['r2ip'])
-
-                    if 'VLAN' in rtree and rtree['VLAN'] != '0':
-                        rtree['Name'] = rtree['Name'] + ' [vid:' + str(rtree['VLAN']) + ']'
-
-                    # Add Switchpath if requested
-                    if popt['l2path']:
-                        spath = get_switched_path(rec['r1name'], rec['r2name'], popt)
-                        if spath:
-                            for sp in spath['data']:
-                                if '_rvlans' in sp:
-                                    vrgx = r'[^0-9]*' + rec['vid'] + '[^0-9]*'
-                                    if re.search(vrgx, sp['_rvlans']):
-                                        nglib.ngtree.add_child_ngtree(rtree, sp)
-
-                    # Single / Multi-path
-                    if not popt['onepath'] or distance not in hopSet:
-                        hopSet.add(distance)
-                        nglib.ngtree.add_child_ngtree(ngtree, rtree)
-                    pathList.append(rtree)
+        # Build Trees and pathList from hops (sorted by distance, routers)
+        for rec in hops:
+            #print(rec.r1name, rec.r1ip, '-->', rec.r2name, rec.r2ip)
+            rtree = nglib.ngtree.get_ngtree("Hop", tree_type="L3-HOP")
+            rtree['From Router'] = rec.r1name
+            rtree['From IP'] = rec.r1ip
+            rtree['To Router'] = rec.r2name
+            rtree['To IP'] = rec.r2ip
+            rtree['VLAN'] = rec.vid
+
+            # Calculate hop distance
+            # Distance of 1 is correct, other distances should be:
+            #   ((dist - 1) / 2) + 1
+            distance = rec.distance
+            if distance != 1:
+                distance = int((distance - 1) / 2) + 1
+
+            # Save distance
+            rtree['distance'] = distance
+
+            # Rename rtree
+            rtree['Name'] = "#{:} {:}({:}) -> {:}({:})".format( \
+            distance, rec.r1name, rec.r1ip, rec.r2name, rec.r2ip)
+
+            if 'VLAN' in rtree and rtree['VLAN'] != '0':
+                rtree['Name'] = rtree['Name'] + ' [vid:' + str(rtree['VLAN']) + ']'
+
+            # Add Switchpath if requested
+            if popt['l2path']:
+                spath = get_switched_path(rec.r1name, rec.r2name, popt)
+                if spath:
+                    for sp in spath['data']:
+                        if '_rvlans' in sp:
+                            if rec.vid in VlanSet(sp['_rvlans']):
+                                nglib.ngtree.add_child_ngtree(rtree, sp)
+
+            # Single / Multi-path
+            if not popt['onepath'] or distance not in hopSet:
+                hopSet.add(distance)
+                nglib.ngtree.add_child_ngtree(ngtree, rtree)
+            pathList.append(rtree)
 
         # Check Results
         if pathList:
@@ -458,6 +486,55 @@ def get_routed_path(net1, net2, popt, rtype="NGTREE"):
                 file=sys.stderr)
 
 
+def get_routed_hops(net1, net2, vrf, depth):
+    """
+    Routed path hops from Neo4j as nglib.routing.RoutedHop records
+
+    - depth is in ROUTED edges (two per router hop)
+    - Each router pair keeps the direction closer to the source network,
+      using the minimum distance when net1 matches several networks
+    - Sorted by distance, routers and gateways like get_routed_links()
+    """
+
+    rtrp = nglib.py2neo_ses.cypher.execute(
+        'MATCH (sn:Network)-[:ROUTED_BY|ROUTED_STANDBY]-(sr), '
+        + '(dn:Network)-[:ROUTED_BY|ROUTED_STANDBY]-(dr), rp = allShortestPaths '
+        + '((sr)-[:ROUTED*0..' + str(depth) + ']-(dr)) '
+        + 'WHERE ALL(v IN rels(rp) WHERE v.vrf = {vrf}) '
+        + 'AND sn.cidr =~ {net1} AND dn.cidr =~ {net2}'
+        + 'UNWIND nodes(rp) as r1 UNWIND nodes(rp) as r2 '
+        + 'MATCH (r1)<-[l1:ROUTED]-(n:Network {vrf:{vrf}})-[l2:ROUTED]->(r2) '
+        + 'OPTIONAL MATCH (n)-[:L3toL2]->(v:VLAN) '
+        + 'RETURN DISTINCT r1.name AS r1name, l1.gateway AS r1ip, '
+        + 'r2.name AS r2name, l2.gateway as r2ip, v.vid AS vid, '
+        + 'LENGTH(shortestPath((sn)<-[:ROUTED|ROUTED_BY|ROUTED_STANDBY*0..12]->(r1))) '
+        + 'AS distance ORDER BY distance',
+        {"net1": net1, "net2": net2, "vrf": vrf})
+
+    # Shortest distance per router pair (r1, core1) and records for each,
+    # source networks out of shortestPath range have no distance
+    allpaths = dict()
+    records = dict()
+    for rec in rtrp:
+        p = (rec.r1name, rec.r2name)
+        if rec.distance is not None:
+            allpaths[p] = min(rec.distance, allpaths.get(p, rec.distance))
+        records.setdefault(p, []).append(rec)
+
+    # Keep the tuple with the shortest distance (r1, core1) vs (core1, r1)
+    hops = set()
+    for en in allpaths:
+        rdist = allpaths.get(tuple(reversed(en)))
+        if rdist is None or allpaths[en] < rdist:
+            for rec in records[en]:
+                hops.add(nglib.routing.RoutedHop(
+                    rec.r1name, rec.r1ip, rec.r2name, rec.r2ip, rec.vid, allpaths[en]))
+
+    return sorted(hops, key=lambda r: (r.distance, r.r1name, r.r2name,
+                                       str(r.r1ip), str(r.r2ip), str(r.vid)))
+
+
+@cached
 def get_switched_path(switch1, switch2, popt, rtype="NGTREE"):
     """
     Find the path between two switches and return all interfaces and
@@ -493,19 +570,22 @@ def get_switched_path(switch1, switch2, popt, rtype="NGTREE"):
         ngtree["Name"] = str(switch1) + " -> " + str(switch2)
         ngtree['Search Depth'] = popt['depth']
 
-        swp = nglib.py2neo_ses.cypher.execute(
-            'MATCH (ss:Switch), (ds:Switch), '
-            + 'sp = allShortestPaths((ss)-[:NEI|NEI_EQ*0..' + popt['depth'] + ']-(ds)) '
-            + 'WHERE ss.name =~ {switch1} AND ds.name =~ {switch2}'
-            + 'UNWIND nodes(sp) as s1 UNWIND nodes(sp) as s2 '
-            + 'MATCH (s1)<-[nei:NEI|NEI_EQ]-(s2), plen = shortestPath((ss)-[:NEI*0..20]-(s1)) '
-            + 'RETURN DISTINCT s1.name AS csw, s2.name AS psw, '
-            + 's1.model AS cmodel, s1.version AS cver, s2.model AS pmodel, s2.version AS pver, '
-            + 'nei.pPort AS pport, nei.cPort as cport, nei.native AS native, '
-            + 'nei.cPc as cPc, nei.pPc AS pPc, nei.vlans AS vlans, nei.rvlans as rvlans, '
-            + 'nei._rvlans AS p_rvlans, '
-            + 'LENGTH(plen) as distance ORDER BY distance, s1.name, s2.name',
-            {"switch1": switch1, "switch2": switch2, "depth": str(popt['depth'])})
+        if nglib.path_engine == 'memory':
+            swp = nglib.topology.get_switched_links(switch1, switch2, popt['depth'])
+        else:
+            swp = nglib.py2neo_ses.cypher.execute(
+                'MATCH (ss:Switch), (ds:Switch), '
+                + 'sp = allShortestPaths((ss)-[:NEI|NEI_EQ*0..' + popt['depth'] + ']-(ds)) '
+                + 'WHERE ss.name =~ {switch1} AND ds.name =~ {switch2}'
+                + 'UNWIND nodes(sp) as s1 UNWIND nodes(sp) as s2 '
+                + 'MATCH (s1)<-[nei:NEI|NEI_EQ]-(s2), plen = shortestPath((ss)-[:NEI*0..20]-(s1)) '
+                + 'RETURN DISTINCT s1.name AS csw, s2.name AS psw, '
+                + 's1.model AS cmodel, s1.version AS cver, s2.model AS pmodel, s2.version AS pver, '
+                + 'nei.pPort AS pport, nei.cPort as cport, nei.native AS native, '
+                + 'nei.cPc as cPc, nei.pPc AS pPc, nei.vlans AS vlans, nei.rvlans as rvlans, '
+                + 'nei._rvlans AS p_rvlans, '
+                + 'LENGTH(plen) as distance ORDER BY distance, s1.name, s2.name',
+                {"switch1": switch1, "switch2": switch2, "depth": str(popt['depth'])})
 
         # Empty Query Check
         if len(swp) == 0:
@@ -666,65 +746,38 @@ def get_fw_path(src, dst, popt, rtype="TEXT"):
         if nglib.verbose:
             print("\nFinding security path from {:} -> {:}:\n".format(srcnet, dstnet))
 
-        # Shortest path between VRFs
-        path = nglib.py2neo_ses.cypher.execute(
-            'MATCH (s:Network { cidr:{src} })-[e1:VRF_IN]->(sv:VRF), '
-            + '(d:Network {cidr:{dst}})-[e2:VRF_IN]->(dv:VRF), '
-            + 'p = shortestPath((sv)-[:VRF_IN|ROUTED_FW|:SWITCHED_FW*0..'
-            + popt['depth'] + ']-(dv)) RETURN s,d,p',
-            src=srcnet, dst=dstnet)
+        # Precomputed shortest paths between the VRFs of both networks
+        paths = []
+        for svrf in nglib.query.net.get_cidr_vrfs(srcnet):
+            for dvrf in nglib.query.net.get_cidr_vrfs(dstnet):
+                secpath = nglib.secpath.get_security_path(svrf, dvrf, popt['depth'])
+                if secpath:
+                    paths.append(secpath)
 
         fwsearch = dict()
 
         ngtree = nglib.ngtree.get_ngtree("Security Path", tree_type="L4-PATH")
 
-        # Go through all nodes in the path
-        if len(path) > 0:
-            for r in path.records:
-                sn = r.s
-                snp = nglib.query.nNode.getJSONProperties(sn)
-                dn = r.d
-                dnp = nglib.query.nNode.getJSONProperties(dn)
+        # Go through all hops in the path
+        if paths:
+            for secpath in paths:
 
                 path = ""
 
                 # Path
-                nodes = r.p.nodes
-                for node in nodes:
-                    nProp = nglib.query.nNode.getJSONProperties(node)
-                    label = nglib.query.nNode.getLabel(node)
-                    tlabel = re.search(r'(\w+)', label)
-                    hop = nglib.ngtree.get_ngtree(tlabel.group(1), tree_type="L4-HOP")
-                    if re.search('VRF', label):
-                        path = path + "VRF:" + nProp['name'] + " -> "
-                        hop['_type'] = "L4VRF"
-
-                    if re.search('FW', label):
-                        path = path + nProp['name'] + " -> "
-                        fwsearch[nProp['name']] = nProp['hostname'] + "," + nProp['logIndex']
-                        hop['Name'] = nProp['name']
-                        hop['_type'] = "L4-FW"
-
-                    # Network Hop
-                    elif re.search('Network', label):
-                        hop['Name'] = nProp['cidr']
-                        hop['_type'] = "L4-GW"
-
-                        # Add properties
-                        #router = get_router(nProp)
-                        if 'vid' and 'vrf' in nProp:
-                            hop['Name'] = hop['Name'] + ' [rtr:' + get_router(nProp) \
-                                + ' vid:' + nProp['vid'] \
-                                + ' vrf:' + nProp['vrf'] + ']'
-                            #hop['Name'] = hop['Name'] + ' VRF:' + nProp['vrf']
-
-                    for prop in nProp:
-                        hop[prop] = nProp[prop]
+                for hop in copy.deepcopy(secpath['hops']):
+                    if hop['_type'] == "L4VRF":
+                        path = path + "VRF:" + hop['name'] + " -> "
+
+                    elif hop['_type'] == "L4-FW":
+                        path = path + hop['Name'] + " -> "
+                        fwsearch[hop['Name']] = hop['hostname'] + "," + hop['logIndex']
+
                     nglib.ngtree.add_child_ngtree(ngtree, hop)
 
                 # Save the Path
                 ngtree['Name'] = re.search(r'(.*)\s->\s$', path).group(1)
-                path = snp['cidr'] + " -> " + path + dnp['cidr']
+                path = srcnet + " -> " + path + dstnet
 
                 # Text output for standalone query
                 if rtype == "TEXT":
@@ -765,13 +818,3 @@ def get_fw_path(src, dst, popt, rtype="TEXT"):
             # Export NGTree
             ngtree = nglib.query.exp_ngtree(ngtree, rtype)
             return ngtree
-
-def get_router(ngtree):
-    """ Return router and standby router properties if they exist"""
-
-    router = ""
-    if 'Router' in ngtree:
-        router = ngtree['Router']
-    if 'StandbyRouter' in ngtree:
-        router = router + '|' + ngtree['StandbyRouter']
-    return router
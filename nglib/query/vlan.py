@@ -37,6 +37,7 @@ import re
 import logging
 import nglib
 from nglib.query.nNode import getJSONProperties
+from nglib.query.cache import cached
 from nglib.exceptions import OutputError, ResultError
 
 logger = logging.getLogger(__name__)
@@ -60,6 +61,7 @@ def get_vlan_range(vlanRange):
 
     return vlow, vhigh
 
+@cached
 def get_vlan(vlan, rtype="NGTREE", allSwitches=True):
     """ Gets a VLAN in VID or VNAME Format """
 
@@ -68,8 +70,12 @@ def get_vlan(vlan, rtype="NGTREE", allSwitches=True):
     else:
         return search_vlan_id(vlan, rtype=rtype, allSwitches=allSwitches)
 
-def search_vlan_id(vid, rtype="NGTREE", allSwitches=True):
-    """Search a VLAN ID for all Bridge Groups"""
+def search_vlan_id(vid, rtype="NGTREE", allSwitches=True, vdata=None):
+    """
+    Search a VLAN ID for all Bridge Groups
+
+    Notes: vdata from load_vlan_data() can be shared across VID searches
+    """
 
     rtypes = ('TREE', 'JSON', 'YAML', 'NGTREE', 'QTREE')
 
@@ -82,7 +88,10 @@ def search_vlan_id(vid, rtype="NGTREE", allSwitches=True):
         if rtype != "NGTREE":
             logger.info("Query: VLAN ID %s for %s", vid, nglib.user)
 
-        vnames = get_vlan_bridges(vid)
+        if not vdata:
+            vdata = load_vlan_data(vid)
+
+        vnames = get_vlan_bridges(vid, vdata=vdata)
 
         # Attach trees to parent tree if count more than 1
         pngtree = nglib.ngtree.get_ngtree(str(vid), tree_type="VID")
@@ -93,10 +102,10 @@ def search_vlan_id(vid, rtype="NGTREE", allSwitches=True):
 
             # Truncate switches on tree returns
             if rtype == "TREE":
-                ngtree = load_bridge_tree(vn, getSW=allSwitches)
+                ngtree = build_bridge_tree(vn, vdata, getSW=allSwitches)
                 nglib.ngtree.add_child_ngtree(pngtree, ngtree)
             else:
-                ngtree = load_bridge_tree(vn, getSW=allSwitches)
+                ngtree = build_bridge_tree(vn, vdata, getSW=allSwitches)
                 nglib.ngtree.add_child_ngtree(pngtree, ngtree)
 
         # Export Results
@@ -107,8 +116,8 @@ def search_vlan_id(vid, rtype="NGTREE", allSwitches=True):
         raise OutputError("RType Not Supported", str(rtypes))
 
 
-def get_vtree(vname, rtype="NGTREE", allSwitches=True):
-    """Get a VTree on a Vlan Name"""
+def get_vtree(vname, rtype="NGTREE", allSwitches=True, vdata=None):
+    """Get a VTree on a Vlan Name (vdata from load_vlan_data() is optional)"""
 
     rtypes = ('TREE', 'JSON', 'YAML', 'NGTREE')
 
@@ -119,7 +128,10 @@ def get_vtree(vname, rtype="NGTREE", allSwitches=True):
 
     if rtype in rtypes:
 
-        ngtree = load_bridge_tree(vname, getSW=allSwitches)
+        if vdata:
+            ngtree = build_bridge_tree(vname, vdata, getSW=allSwitches)
+        else:
+            ngtree = load_bridge_tree(vname, getSW=allSwitches)
         # Export Results
         nglib.query.exp_ngtree(ngtree, rtype)
         return ngtree
@@ -244,6 +256,72 @@ def load_bridge_tree(vname, root=True, getSW=False):
     return ngtree
 
 
+def build_bridge_tree(vname, vdata, root=True, getSW=False):
+    """
+    Create a Bridge Tree from bulk loaded vdata (see load_vlan_data())
+
+    Notes: Same output as load_bridge_tree() without per VLAN queries
+    """
+
+    sMax = 7
+    if getSW:
+        sMax = 10000
+
+    # Initialize Empty Tree
+    ngtree = nglib.ngtree.get_ngtree(vname, tree_type="VNAME")
+
+    if vname in vdata['vlans']:
+        vrec = vdata['vlans'][vname]
+        swlist = vdata['switches'].get(vname, [])
+        (pcount, mcount) = vdata['counts'].get(vname, (0, 0))
+        vroot = vdata['roots'].get(vname)
+        l3 = vdata['l3'].get(vname, {})
+
+        # Populate ngtree with variables
+        if l3.get('cidr'):
+            ngtree['CIDR'] = l3['cidr']
+        if l3.get('vrf'):
+            ngtree['VRF'] = l3['vrf']
+        if l3.get('router'):
+            ngtree['Router'] = l3['router']
+        if l3.get('gateway'):
+            ngtree['Gateway'] = l3['gateway']
+        if vrec['lroot']:
+            ngtree['localroot'] = vrec['lroot']
+        if vrec['lstp']:
+            ngtree['localstp'] = vrec['lstp']
+        if root:
+            ngtree['VLAN ID'] = vrec['vid']
+        ngtree['Description'] = vrec['desc']
+        if vroot:
+            ngtree['Root'] = vroot
+        ngtree['Switch Count'] = len(swlist)
+
+        # NetDB Port and MAC Counts
+        ngtree['Port Count'] = pcount
+        ngtree['MAC Count'] = mcount
+
+        # SW Tree Search for list and counts
+        if len(swlist):
+            slist = swlist[:sMax]
+            if len(swlist) > sMax:
+                slist.append("...")
+            ngtree['Switches'] = slist
+
+        # Child VLANs, last BRIDGE edge sets the Bridge data
+        for (cvname, pswitch, cswitch) in vdata['children'].get(vname, []):
+            cngtree = build_bridge_tree(cvname, vdata, root=False, getSW=getSW)
+            for (bcvname, bpswitch, bcswitch) in vdata['children'][vname]:
+                if bcvname == cvname:
+                    cngtree["Bridge"] = bcswitch + ' <-> ' + bpswitch
+            nglib.ngtree.add_child_ngtree(ngtree, cngtree)
+
+    else:
+        raise ResultError("No VLAN Name Found", "Expecting VNAME eg. Core-16: " + vname)
+
+    return ngtree
+
+
 def get_parent_ngtree(vname):
     """
     Build a Parent NGTree (only one Parent allowed)
@@ -293,69 +371,64 @@ def get_parent_ngtree(vname):
     return ngtree
 
 
-def get_vlan_bridges(vid):
+def get_vlan_bridges(vid, vdata=None):
     """
     Get all distinct vlan bridges returning the root node of the tree for each
     Used for VLAN ID Searches
+
+    Notes: Uses vdata from load_vlan_data() (loaded for vid if not passed)
     """
 
     vfound = dict()
     vname = dict()
     vid = str(vid)
 
-    vnames = nglib.py2neo_ses.cypher.execute(
-        'MATCH (v:VLAN {vid:{vid}}) RETURN v.name AS name, v.vid AS vid',
-        vid=vid)
+    if not vdata:
+        vdata = load_vlan_data(vid)
 
+    vnames = vdata['vids'].get(vid, [])
 
     # Found VID
     if len(vnames) > 0:
-        for vn in vnames.records:
+        for vn in vnames:
             if nglib.verbose > 2:
-                print("Found", vn.name, vn.vid)
+                print("Found", vn, vid)
 
-            if vn.name not in vfound.keys():
+            if vn not in vfound.keys():
 
                 # Mark VName as found
-                vfound[vn.name] = 1
+                vfound[vn] = 1
 
-                vbridges = nglib.py2neo_ses.cypher.execute(
-                    'MATCH (v:VLAN {name:{vname}})-[:BRIDGE*]-(rv:VLAN) RETURN rv.name AS rname',
-                    vname=vn.name)
+                vbridges = get_bridge_members(vn, vdata)
 
                 # Standalone VLAN
                 if len(vbridges) == 0:
                     if nglib.verbose > 2:
-                        print(vid, "not bridged on", vn.name)
-                    vname[vn.name] = vid
+                        print(vid, "not bridged on", vn)
+                    vname[vn] = vid
 
                 # Search Bridge remote for root node
                 else:
                     rFound = False
                     for rvn in vbridges:
                         if nglib.verbose > 2:
-                            print("Found Root VLAN", rvn.rname)
+                            print("Found Root VLAN", rvn)
 
                         # Mark all members of bridge as found
-                        vfound[rvn.rname] = 1
-
-                        findroot = nglib.py2neo_ses.cypher.execute(
-                            'MATCH (v:VLAN {name:{vname}})<-[:BRIDGE]-(rv:VLAN) '
-                            + 'RETURN rv.name AS rname',
-                            vname=rvn.rname)
+                        vfound[rvn] = 1
 
                         # Root node has no outgoing BRIDGE relationships
-                        if len(findroot) == 0:
+                        if not vdata['parents'].get(rvn):
                             if nglib.verbose > 2:
-                                print("Found root", rvn.rname)
-                            vname[rvn.rname] = vid
+                                print("Found root", rvn)
+                            vname[rvn] = vid
                             rFound = True
 
                     # I must be the root node since others have bridge relationships
                     if not rFound:
                         if nglib.verbose > 2:
-                            print("I'm the root of", vn.name)
-                        vname[vn.name] = vid
+                            print("I'm the root of", vn)
+                        vname[vn] = vid
 
     else:
         raise ResultError("No VID Found", "Expecting VLAN id in range 1-4096: " + vid)
@@ -363,6 +436,130 @@ def get_vlan_bridges(vid):
     return vname
 
 
+def get_bridge_members(vname, vdata):
+    """Return all VLANs bridged to vname in either direction (BRIDGE*)"""
+
+    members = []
+    seen = set([vname])
+    queue = [vname]
+
+    while queue:
+        current = queue.pop(0)
+        for (cvname, pswitch, cswitch) in vdata['children'].get(current, []):
+            if cvname not in seen:
+                seen.add(cvname)
+                members.append(cvname)
+                queue.append(cvname)
+        for pvname in vdata['parents'].get(current, []):
+            if pvname not in seen:
+                seen.add(pvname)
+                members.append(pvname)
+                queue.append(pvname)
+
+    return members
+
+
+def load_vlan_data(vlow, vhigh=None):
+    """
+    Bulk load all VLAN, Switch, Root, L3 and Bridge data for a VID range
+
+    - Runs a constant number of queries for the whole range
+    - Used by build_bridge_tree() to assemble trees in memory
+    - BRIDGE links are always within one VID, so a range is self contained
+    """
+
+    try:
+        vlow = int(vlow)
+        if vhigh is None:
+            vhigh = vlow
+        vhigh = int(vhigh)
+    except ValueError:
+        raise ResultError("No VID Found", "Expecting VLAN id in range 1-4096: " + str(vlow))
+
+    vdata = dict()
+    vdata['vlans'] = dict()
+    vdata['vids'] = dict()
+    vdata['switches'] = dict()
+    vdata['counts'] = dict()
+    vdata['roots'] = dict()
+    vdata['l3'] = dict()
+    vdata['children'] = dict()
+    vdata['parents'] = dict()
+
+    vrange = {"vlow": vlow, "vhigh": vhigh}
+
+    vlans = nglib.bolt_ses.run(
+        'MATCH (v:VLAN) WHERE toInt(v.vid) >= {vlow} AND toInt(v.vid) <= {vhigh} '
+        + 'RETURN v.name as vname, v.lstp AS lstp, v.lroot AS lroot, v.vid AS vid, '
+        + 'v.desc AS desc',
+        vrange)
+
+    for v in vlans:
+        vdata['vlans'][v['vname']] = {'vname': v['vname'], 'lstp': v['lstp'],
+                                      'lroot': v['lroot'], 'vid': v['vid'],
+                                      'desc': v['desc']}
+        vid = str(v['vid'])
+        if vid not in vdata['vids']:
+            vdata['vids'][vid] = []
+        vdata['vids'][vid].append(v['vname'])
+
+    switches = nglib.bolt_ses.run(
+        'MATCH (v:VLAN)-[sw:Switched]->(s:Switch) '
+        + 'WHERE toInt(v.vid) >= {vlow} AND toInt(v.vid) <= {vhigh} '
+        + 'RETURN v.name AS vname, s.name AS name, sw.pcount AS pcount, sw.mcount AS mcount',
+        vrange)
+
+    for sw in switches:
+        vname = sw['vname']
+        if vname not in vdata['switches']:
+            vdata['switches'][vname] = []
+            vdata['counts'][vname] = [0, 0]
+        vdata['switches'][vname].append(sw['name'])
+        if sw['pcount']:
+            vdata['counts'][vname][0] += sw['pcount']
+        if sw['mcount']:
+            vdata['counts'][vname][1] += sw['mcount']
+
+    roots = nglib.bolt_ses.run(
+        'MATCH (v:VLAN)-[sw:ROOT]->(s:Switch) '
+        + 'WHERE toInt(v.vid) >= {vlow} AND toInt(v.vid) <= {vhigh} '
+        + 'RETURN v.name AS vname, s.name AS root',
+        vrange)
+
+    for r in roots:
+        if r['vname'] not in vdata['roots']:
+            vdata['roots'][r['vname']] = r['root']
+
+    l3 = nglib.bolt_ses.run(
+        'MATCH (v:VLAN)<-[sw:L3toL2]-(n:Network)-[e:ROUTED_BY|ROUTED]->(r:Router) '
+        + 'WHERE toInt(v.vid) >= {vlow} AND toInt(v.vid) <= {vhigh} '
+        + 'RETURN v.name AS vname, n.cidr AS cidr, n.gateway AS gateway, '
+        + 'n.vrf AS vrf, r.name as router',
+        vrange)
+
+    for n in l3:
+        if n['vname'] not in vdata['l3']:
+            vdata['l3'][n['vname']] = {'cidr': n['cidr'], 'gateway': n['gateway'],
+                                       'vrf': n['vrf'], 'router': n['router']}
+
+    bridges = nglib.bolt_ses.run(
+        'MATCH (pv:VLAN)-[e:BRIDGE]->(cv:VLAN) '
+        + 'WHERE toInt(pv.vid) >= {vlow} AND toInt(pv.vid) <= {vhigh} '
+        + 'RETURN pv.name AS pvname, cv.name AS cvname, '
+        + 'e.pswitch AS pswitch, e.cswitch AS cswitch',
+        vrange)
+
+    for b in bridges:
+        if b['pvname'] not in vdata['children']:
+            vdata['children'][b['pvname']] = []
+        vdata['children'][b['pvname']].append((b['cvname'], b['pswitch'], b['cswitch']))
+        if b['cvname'] not in vdata['parents']:
+            vdata['parents'][b['cvname']] = []
+        vdata['parents'][b['cvname']].append(b['pvname'])
+
+    return vdata
+
+
 def get_vlans_on_group(group, vrange, rtype="TABLE"):
     """ Get VLAN Group Report """
 
@@ -380,8 +577,10 @@ def get_vlans_on_group(group, vrange, rtype="TABLE"):
             + 'RETURN v.name AS name ORDER BY v.vid',
             {'group': group, 'vlow': vlow, 'vhigh': vhigh})
 
+        vdata = load_vlan_data(vlow, vhigh)
+
         for r in results:
-            cngt = get_vtree(r['name'])
+            cngt = get_vtree(r['name'], vdata=vdata)
             nglib.ngtree.add_child_ngtree(ngt, cngt)
 
         ngt = nglib.ngtree.export.exp_ngtree(ngt, rtype=rtype)
@@ -36,6 +36,7 @@ import os
 import sys
 import logging
 import functools
+import itertools
 import configparser
 import ipaddress
 import nglib
@@ -44,6 +45,10 @@ import nglib.query
 verbose = 0
 logger = logging.getLogger(__name__)
 
+# Declared CSV schema for truncated device reports
+dev_fields = ['Name', '_type', '_ccount', 'Distance', 'FQDN', 'Location',
+              'MGMT Group', 'Model', 'Platform', 'Version']
+
 
 def get_vlan_report(vrange, group='.*', report="full", rtype="NGTREE"):
     """Generate VLAN Reports"""
@@ -56,6 +61,12 @@ def get_vlan_report(vrange, group='.*', report="full", rtype="NGTREE"):
         if report == "full":
             logger.info("Query: Generating Full VLAN Report (%s) for %s", vrange, nglib.user)
 
+            # Stream large JSON reports
+            if rtype == "JSON" and group == '.*':
+                ngtree = nglib.ngtree.get_ngtree("Report", tree_type="VIDs")
+                nglib.ngtree.export.exp_stream(ngtree, iter_vlan_data(vrange, rtype), rtype)
+                return
+
             # Get all VLANs as NGTree
             ngtree = None
             if group != '.*':
@@ -123,6 +134,16 @@ def get_empty_vlans(ngtree, etree):
 def get_vlan_data(vrange, rtype, group='.*'):
     """Get all vlans in a range for reports"""
 
+    pngtree = nglib.ngtree.get_ngtree("Report", tree_type="VIDs")
+
+    for vtree in iter_vlan_data(vrange, rtype, group=group):
+        nglib.ngtree.add_child_ngtree(pngtree, vtree)
+    return pngtree
+
+
+def iter_vlan_data(vrange, rtype, group='.*'):
+    """Yield VID ngtrees in a range one at a time"""
+
     allSwitches = True
     if rtype == "TREE":
         allSwitches = False
@@ -135,12 +156,12 @@ def get_vlan_data(vrange, rtype, group='.*'):
         + 'RETURN DISTINCT v.vid AS vid ORDER BY toInt(vid)',
         {"vlow": vlow, "vhigh": vhigh, "group": group})
 
-    pngtree = nglib.ngtree.get_ngtree("Report", tree_type="VIDs")
+    # Bulk load the whole range once for all VID trees
+    vdata = nglib.query.vlan.load_vlan_data(vlow, vhigh)
 
     for v in vlans:
-        vtree = nglib.query.vlan.search_vlan_id(v['vid'], allSwitches=allSwitches)
-        nglib.ngtree.add_child_ngtree(pngtree, vtree)
-    return pngtree
+        yield nglib.query.vlan.search_vlan_id(v['vid'], allSwitches=allSwitches,
+                                              vdata=vdata)
 
 
 def get_vrf_report(vrf, rtype="NGTREE"):
@@ -192,40 +213,34 @@ def get_dev_report(dev, group=".*", trunc=False, rtype="NGTREE"):
     Get all devices on a regex
 
     Options: trunc==True returns truncated list
+    Notes: JSON and CSV stream devices to stdout as they are built
     """
 
-    rtypes = ('TREE', 'JSON', 'YAML', 'NGTREE')
+    rtypes = ('TREE', 'JSON', 'YAML', 'NGTREE', 'CSV')
 
     if rtype in rtypes:
         logger.info("Query: Generating Device Report (%s) for %s", dev, nglib.user)
 
-        devices = nglib.bolt_ses.run(
-            'MATCH(s:Switch) WHERE s.mgmt =~ {mgmt} AND s.name =~ {dev} '
-            + 'RETURN s.name AS name, s.mgmt AS mgmt, '
-            + 's.location AS location, s.model AS model, s.version AS version, '
-            + 's.distance AS distance, s.Platform AS platform, s.FQDN as FQDN '
-            + 'ORDER BY name',
-            {'dev': dev, 'mgmt': group})
-
         ngtree = nglib.ngtree.get_ngtree("Report", tree_type="DEVS")
         ngtree['Device Regex'] = dev
 
-        for d in devices:
-            if d["mgmt"]:
-                if trunc:
-                    ct = nglib.ngtree.get_ngtree(d['name'], tree_type="DEV")
-                    ct['Distance'] = d['distance']
-                    ct['Location'] = d['location']
-                    ct['MGMT Group'] = d['mgmt']
-                    ct['Model'] = d['model']
-                    ct['Version'] = d['version']
-                    ct['Platform'] = d['platform']
-                    ct['FQDN'] = d['FQDN']
-                    nglib.ngtree.add_child_ngtree(ngtree, ct)
-                else:
-                    cngtree = nglib.query.dev.get_device(d["name"])
-                    if cngtree:
-                        nglib.ngtree.add_child_ngtree(ngtree, cngtree)
+        # Stream large reports, peek first so empty results still warn
+        if rtype in ('JSON', 'CSV'):
+            devices = iter_dev_report(dev, group=group, trunc=trunc)
+            first = next(devices, None)
+            if first is None:
+                print("No Devices found on regex:", dev)
+                return
+            fieldnames = None
+            if trunc:
+                fieldnames = dev_fields
+            nglib.ngtree.export.exp_stream(
+                ngtree, itertools.chain((first,), devices), rtype,
+                fieldnames=fieldnames, counts=('_ccount', 'Device Count'))
+            return
+
+        for cngtree in iter_dev_report(dev, group=group, trunc=trunc):
+            nglib.ngtree.add_child_ngtree(ngtree, cngtree)
 
         # Found Devices, count and print
         if '_ccount' in ngtree.keys():
@@ -239,4 +254,30 @@ def get_dev_report(dev, group=".*", trunc=False, rtype="NGTREE"):
         raise Exception("RType Not Supported, use:" + str(rtypes))
 
 
-        
+def iter_dev_report(dev, group=".*", trunc=False):
+    """Yield device ngtrees for a device report one at a time"""
+
+    devices = nglib.bolt_ses.run(
+        'MATCH(s:Switch) WHERE s.mgmt =~ {mgmt} AND s.name =~ {dev} '
+        + 'RETURN s.name AS name, s.mgmt AS mgmt, '
+        + 's.location AS location, s.model AS model, s.version AS version, '
+        + 's.distance AS distance, s.Platform AS platform, s.FQDN as FQDN '
+        + 'ORDER BY name',
+        {'dev': dev, 'mgmt': group})
+
+    for d in devices:
+        if d["mgmt"]:
+            if trunc:
+                ct = nglib.ngtree.get_ngtree(d['name'], tree_type="DEV")
+                ct['Distance'] = d['distance']
+                ct['Location'] = d['location']
+                ct['MGMT Group'] = d['mgmt']
+                ct['Model'] = d['model']
+                ct['Version'] = d['version']
+                ct['Platform'] = d['platform']
+                ct['FQDN'] = d['FQDN']
+                yield ct
+            else:
+                cngtree = nglib.query.dev.get_device(d["name"])
+                if cngtree:
+                    yield cngtree
@@ -0,0 +1,255 @@
+#!/usr/bin/env python
+#
+# Copyright (c) 2016 "Jonathan Yantis"
+#
+# This file is a part of NetGrph.
+#
+#    This program is free software: you can redistribute it and/or  modify
+#    it under the terms of the GNU Affero General Public License, version 3,
+#    as published by the Free Software Foundation.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#    As a special exception, the copyright holders give permission to link the
+#    code of portions of this program with the OpenSSL library under certain
+#    conditions as described in each individual source file and distribute
+#    linked combinations including the program with the OpenSSL library. You
+#    must comply with the GNU Affero General Public License in all respects
+#    for all of the code used other than as permitted herein. If you modify
+#    file(s) with this exception, you may extend this exception to your
+#    version of the file(s), but you are not obligated to do so. If you do not
+#    wish to do so, delete this exception statement from your version. If you
+#    delete this exception statement from all source files in the program,
+#    then also delete it in the license file.
+#
+#
+"""
+In-memory Routed Path Engine
+
+ - Loads Networks and their ROUTED, ROUTED_BY and ROUTED_STANDBY edges once
+ - Keeps a router adjacency per VRF, with the transit network gateways and
+   VLAN of every router to router hop
+ - Answers routed path queries with BFS instead of allShortestPaths
+ - Reloads when the graph marker changes (stamped by ngupdate)
+
+Enable with path_engine = memory in the [topology] config section
+"""
+import re
+import logging
+import threading
+from collections import deque, namedtuple
+import nglib
+import nglib.graph
+
+logger = logging.getLogger(__name__)
+
+# Same fields as the get_routed_path() Cypher records
+RoutedHop = namedtuple('RoutedHop', [
+    'r1name', 'r1ip', 'r2name', 'r2ip', 'vid', 'distance'])
+
+# Max edges from the source network used for hop distance (*0..12)
+distance_depth = 12
+
+# Loaded routing tables, shared by all queries
+routing = None
+routing_lock = threading.Lock()
+
+
+def get_routing():
+    """Return the loaded routing tables, reloading if the graph was updated"""
+
+    global routing
+
+    marker = nglib.get_graph_marker()
+
+    with routing_lock:
+        if routing is None or routing['marker'] != marker:
+            routing = load_routing()
+            routing['marker'] = marker
+
+    return routing
+
+
+def load_routing():
+    """
+    Load Networks and router edges from the graph
+
+    - nets: network name -> cidr
+    - owners: network name -> routers over ROUTED_BY|ROUTED_STANDBY
+    - adj: vrf -> router -> routers sharing a ROUTED transit network in vrf
+    - hops: (router, router) -> [(network vrf, gateway, gateway, vid)]
+    - links: undirected network/router adjacency over all three edge types
+    """
+
+    logger.info("Loading in-memory routing tables")
+
+    graph = nglib.graph.get_graph()
+
+    rt = dict()
+    rt['nets'] = dict()
+    rt['owners'] = dict()
+    rt['adj'] = dict()
+    rt['hops'] = dict()
+    rt['links'] = dict()
+
+    netvrf = dict()
+    for r in graph.scan_nodes('Network', ['name', 'cidr', 'vrf']):
+        rt['nets'][r['name']] = r['cidr']
+        netvrf[r['name']] = r['vrf']
+
+    vids = dict()
+    vlans = dict((r['name'], r['vid']) for r in graph.scan_nodes('VLAN', ['name', 'vid']))
+    for r in graph.scan_edges('L3toL2', 'Network', 'VLAN'):
+        vids.setdefault(r['src'], set()).add(vlans.get(r['dst']))
+
+    transit = dict()
+    count = 0
+    for r in graph.scan_edges(('ROUTED_BY', 'ROUTED_STANDBY', 'ROUTED'),
+                              'Network', 'Router', ['vrf', 'gateway']):
+        net, router = ('N', r['src']), ('R', r['dst'])
+        rt['links'].setdefault(net, set()).add(router)
+        rt['links'].setdefault(router, set()).add(net)
+
+        if r['type'] == 'ROUTED':
+            transit.setdefault(r['src'], []).append((r['dst'], r['vrf'], r['gateway']))
+        else:
+            rt['owners'].setdefault(r['src'], set()).add(r['dst'])
+        count += 1
+
+    # Router pairs on each transit network
+    for net in transit:
+        for r1, vrf1, gw1 in transit[net]:
+            for r2, vrf2, gw2 in transit[net]:
+                if r1 == r2:
+                    continue
+                if vrf1 == vrf2:
+                    rt['adj'].setdefault(vrf1, dict()).setdefault(r1, set()).add(r2)
+                for vid in sorted(vids.get(net, [None]), key=str):
+                    rt['hops'].setdefault((r1, r2), []).append((netvrf.get(net), gw1, gw2, vid))
+
+    logger.info("Loaded %s networks and %s router edges", len(rt['nets']), count)
+
+    return rt
+
+
+def bfs(adj, start, depth=None):
+    """Return hop distances from start over adj, optionally capped at depth"""
+
+    dist = {start: 0}
+    queue = deque([start])
+
+    while queue:
+        node = queue.popleft()
+        if depth is not None and dist[node] >= depth:
+            continue
+        for nei in adj.get(node, ()):
+            if nei not in dist:
+                dist[nei] = dist[node] + 1
+                queue.append(nei)
+
+    return dist
+
+
+def get_routed_links(net1, net2, vrf, depth):
+    """
+    Find all router hops along all shortest routed paths in vrf
+
+    - net1 and net2 are CIDR regexes (like Cypher =~) matching the networks
+      whose routers (ROUTED_BY|ROUTED_STANDBY) start and end the paths
+    - depth is in ROUTED edges (two per router hop over a transit network),
+      as in the ROUTED*0..depth Cypher pattern
+    - Each hop runs from the router closer to the source network, distance
+      is the edge count from the source network to that router. When net1
+      matches several networks (one CIDR in several VRFs), the nearest
+      source network whose routers' paths use the hop sets the distance
+      (the minimum, as in get_routed_hops)
+    - Returns RoutedHop records ordered by distance, routers, gateways
+    """
+
+    rt = get_routing()
+    adj = rt['adj'].get(vrf, dict())
+    depth = int(depth) // 2
+
+    srcs = [n for n in rt['nets'] if n in rt['owners'] and re.fullmatch(net1, str(rt['nets'][n]))]
+    dsts = [n for n in rt['nets'] if n in rt['owners'] and re.fullmatch(net2, str(rt['nets'][n]))]
+
+    srouters = set(r for n in srcs for r in rt['owners'][n])
+    drouters = set(r for n in dsts for r in rt['owners'][n])
+
+    # Router pairs one hop apart along any shortest path (either direction),
+    # with the source routers whose paths use them
+    pairs = dict()
+    dst_dist = dict()
+    for sr in sorted(srouters):
+        sdist = bfs(adj, sr, depth)
+        for dr in sorted(drouters):
+            if dr not in sdist:
+                continue
+            if dr not in dst_dist:
+                dst_dist[dr] = bfs(adj, dr, depth)
+            ddist = dst_dist[dr]
+            total = sdist[dr]
+
+            for u in sdist:
+                if u not in ddist or sdist[u] + ddist[u] != total:
+                    continue
+                for v in adj.get(u, ()):
+                    if sdist.get(v) == sdist[u] + 1 and ddist.get(v) == ddist[u] - 1:
+                        pairs.setdefault(tuple(sorted((u, v))), set()).add(sr)
+
+    # Edge distance of each router from each source network (any VRF)
+    dists = dict((n, bfs_multi(rt['links'], [('N', n)], distance_depth)) for n in srcs)
+
+    records = set()
+    for (u, v), routers in pairs.items():
+        nets = [n for n in srcs if routers.intersection(rt['owners'][n])]
+        du = min_distance(dists, nets, ('R', u))
+        dv = min_distance(dists, nets, ('R', v))
+
+        # Orient the hop away from the source, skip equidistant routers
+        if du is None or (dv is not None and dv < du):
+            u, v, du = v, u, dv
+        elif dv is not None and dv == du:
+            continue
+        if du is None:
+            continue
+
+        for nvrf, gw1, gw2, vid in rt['hops'].get((u, v), []):
+            if nvrf == vrf:
+                records.add(RoutedHop(u, gw1, v, gw2, vid, du))
+
+    return sorted(records, key=lambda r: (r.distance, r.r1name, r.r2name,
+                                          str(r.r1ip), str(r.r2ip), str(r.vid)))
+
+
+def min_distance(dists, nets, node):
+    """Shortest distance to node from any of nets (or None)"""
+
+    found = [dists[n][node] for n in nets if node in dists[n]]
+    if found:
+        return min(found)
+    return None
+
+
+def bfs_multi(adj, starts, depth):
+    """Return hop distances from the nearest of starts over adj, capped at depth"""
+
+    dist = dict.fromkeys(starts, 0)
+    queue = deque(starts)
+
+    while queue:
+        node = queue.popleft()
+        if dist[node] >= depth:
+            continue
+        for nei in adj.get(node, ()):
+            if nei not in dist:
+                dist[nei] = dist[node] + 1
+                queue.append(nei)
+
+    return dist
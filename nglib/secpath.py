@@ -0,0 +1,215 @@
+#!/usr/bin/env python
+#
+# Copyright (c) 2016 "Jonathan Yantis"
+#
+# This file is a part of NetGrph.
+#
+#    This program is free software: you can redistribute it and/or  modify
+#    it under the terms of the GNU Affero General Public License, version 3,
+#    as published by the Free Software Foundation.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#    As a special exception, the copyright holders give permission to link the
+#    code of portions of this program with the OpenSSL library under certain
+#    conditions as described in each individual source file and distribute
+#    linked combinations including the program with the OpenSSL library. You
+#    must comply with the GNU Affero General Public License in all respects
+#    for all of the code used other than as permitted herein. If you modify
+#    file(s) with this exception, you may extend this exception to your
+#    version of the file(s), but you are not obligated to do so. If you do not
+#    wish to do so, delete this exception statement from your version. If you
+#    delete this exception statement from all source files in the program,
+#    then also delete it in the license file.
+#
+#
+"""
+VRF Security Path Index
+
+ - Precomputes the shortest VRF to VRF path over VRF_IN and ROUTED_FW
+   edges for every pair of VRFs (ngupdate -full, -ifw, -ivrf, -inet and
+   after clearing aged nodes or edges)
+ - Hops copy the current firewall network properties, so anything that
+   changes VRF, FW or Network nodes must rebuild the table
+ - Each path is stored on a SecPath node as the ordered VRF, firewall
+   interface network and firewall hops (with security levels and log
+   indexes), so firewall path queries need no graph traversal
+ - The table is loaded once and reloads when the graph marker changes
+"""
+import json
+import logging
+import threading
+from collections import deque
+import nglib
+import nglib.graph
+import nglib.ngtree
+
+logger = logging.getLogger(__name__)
+
+# Loaded security paths {(src vrf, dst vrf): path} and their graph marker
+sec_paths = None
+sec_marker = None
+sec_lock = threading.Lock()
+
+
+def update_security_paths():
+    """Rebuild the SecPath table from VRFs and firewalls, returns the count"""
+
+    logger.info("Updating VRF Security Paths")
+
+    graph = nglib.graph.get_graph()
+    time = nglib.get_time()
+
+    nodes = dict()
+    adj = dict()
+
+    def link(n1, n2):
+        adj.setdefault(n1, set()).add(n2)
+        adj.setdefault(n2, set()).add(n1)
+
+    for r in graph.scan_nodes('VRF', ['name']):
+        nodes[('VRF', r['name'])] = None
+        adj[('VRF', r['name'])] = set()
+
+    # Firewall interface networks and the VRF each one sits in
+    for r in graph.scan_edges('ROUTED_FW', 'Network', 'FW'):
+        nodes[('Network', r['src'])] = None
+        nodes[('FW', r['dst'])] = None
+        link(('Network', r['src']), ('FW', r['dst']))
+
+    for r in graph.scan_edges('VRF_IN', 'Network', 'VRF'):
+        if ('Network', r['src']) in nodes and ('VRF', r['dst']) in nodes:
+            link(('Network', r['src']), ('VRF', r['dst']))
+
+    for node in nodes:
+        nodes[node] = graph.get_node(node[0], node[1]) or {'name': node[1]}
+
+    vrfs = sorted(n for n in nodes if n[0] == 'VRF')
+
+    rows = []
+    for sv in vrfs:
+        parents = bfs_parents(adj, sv)
+        for dv in vrfs:
+            if dv not in parents:
+                continue
+
+            path = [dv]
+            while path[-1] != sv:
+                path.append(parents[path[-1]])
+            path.reverse()
+
+            hops = [get_hop(node, nodes[node]) for node in path]
+            rows.append({'name': sv[1] + '->' + dv[1], 'src': sv[1], 'dst': dv[1],
+                         'length': len(path) - 1, 'hops': json.dumps(hops), 'time': time})
+
+    graph.merge_nodes('SecPath', rows)
+
+    logger.info("Updated %s Security Paths between %s VRFs", len(rows), len(vrfs))
+
+    return len(rows)
+
+
+def bfs_parents(adj, start):
+    """BFS parents from start, neighbors visited in sorted order"""
+
+    parents = {start: None}
+    queue = deque([start])
+
+    while queue:
+        node = queue.popleft()
+        for nei in sorted(adj.get(node, ())):
+            if nei not in parents:
+                parents[nei] = node
+                queue.append(nei)
+
+    return parents
+
+
+def get_hop(node, props):
+    """L4 path hop ngtree for a VRF, firewall or firewall network node"""
+
+    label, name = node
+    hop = nglib.ngtree.get_ngtree(label, tree_type="L4-HOP")
+
+    if label == 'VRF':
+        hop['_type'] = "L4VRF"
+
+    elif label == 'FW':
+        hop['Name'] = name
+        hop['_type'] = "L4-FW"
+
+    # Network Hop
+    else:
+        hop['Name'] = props.get('cidr')
+        hop['_type'] = "L4-GW"
+        if 'vrf' in props:
+            hop['Name'] = str(hop['Name']) + ' [rtr:' + get_router(props) \
+                + ' vid:' + str(props.get('vid')) + ' vrf:' + str(props['vrf']) + ']'
+
+    for prop in props:
+        hop[prop] = props[prop]
+
+    return hop
+
+
+def get_router(props):
+    """ Return router and standby router properties if they exist"""
+
+    router = ""
+    if 'Router' in props:
+        router = props['Router']
+    if 'StandbyRouter' in props:
+        router = router + '|' + props['StandbyRouter']
+    return router
+
+
+def get_security_paths():
+    """Return the loaded security paths, reloading if the graph changed"""
+
+    global sec_paths
+    global sec_marker
+
+    marker = nglib.get_graph_marker()
+
+    with sec_lock:
+        if sec_paths is None or sec_marker != marker:
+            sec_paths = load_security_paths()
+            sec_marker = marker
+
+    return sec_paths
+
+
+def load_security_paths():
+    """Load all SecPath nodes as {(src vrf, dst vrf): path}"""
+
+    rows = list(nglib.graph.get_graph().scan_nodes(
+        'SecPath', ['src', 'dst', 'length', 'hops', 'time']))
+
+    # Pairs missing from the last update are stale
+    latest = max([r['time'] for r in rows] or [None])
+
+    paths = dict()
+    for r in rows:
+        if r['time'] == latest:
+            paths[(r['src'], r['dst'])] = {'length': r['length'], 'hops': json.loads(r['hops'])}
+
+    logger.debug("Loaded %s security paths", len(paths))
+
+    return paths
+
+
+def get_security_path(src_vrf, dst_vrf, depth=None):
+    """Return the security path between two VRFs (or None)"""
+
+    path = get_security_paths().get((src_vrf, dst_vrf))
+
+    if path and depth is not None and path['length'] > int(depth):
+        return None
+
+    return path
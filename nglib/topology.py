@@ -0,0 +1,191 @@
+#!/usr/bin/env python
+#
+# Copyright (c) 2016 "Jonathan Yantis"
+#
+# This file is a part of NetGrph.
+#
+#    This program is free software: you can redistribute it and/or  modify
+#    it under the terms of the GNU Affero General Public License, version 3,
+#    as published by the Free Software Foundation.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#    As a special exception, the copyright holders give permission to link the
+#    code of portions of this program with the OpenSSL library under certain
+#    conditions as described in each individual source file and distribute
+#    linked combinations including the program with the OpenSSL library. You
+#    must comply with the GNU Affero General Public License in all respects
+#    for all of the code used other than as permitted herein. If you modify
+#    file(s) with this exception, you may extend this exception to your
+#    version of the file(s), but you are not obligated to do so. If you do not
+#    wish to do so, delete this exception statement from your version. If you
+#    delete this exception statement from all source files in the program,
+#    then also delete it in the license file.
+#
+#
+"""
+In-memory Switch Topology Engine
+
+ - Loads all Switch nodes and NEI/NEI_EQ edges once into adjacency lists
+ - Answers switched path queries with BFS instead of allShortestPaths
+ - Reloads when the graph marker changes (stamped by ngupdate)
+
+Enable with path_engine = memory in the [topology] config section
+"""
+import re
+import logging
+import threading
+from collections import deque, namedtuple
+import nglib
+import nglib.graph
+
+logger = logging.getLogger(__name__)
+
+# Same fields as the get_switched_path() Cypher records
+SwitchLink = namedtuple('SwitchLink', [
+    'csw', 'psw', 'cmodel', 'cver', 'pmodel', 'pver', 'pport', 'cport',
+    'native', 'cPc', 'pPc', 'vlans', 'rvlans', 'p_rvlans', 'distance'])
+
+# Max NEI hops used for link distance (matches shortestPath *0..20)
+link_depth = 20
+
+# Loaded topology, shared by all queries
+topology = None
+topology_lock = threading.Lock()
+
+
+def get_topology():
+    """Return the loaded topology, reloading if the graph was updated"""
+
+    global topology
+
+    marker = nglib.get_graph_marker()
+
+    with topology_lock:
+        if topology is None or topology['marker'] != marker:
+            topology = load_topology()
+            topology['marker'] = marker
+
+    return topology
+
+
+def load_topology():
+    """
+    Load Switch nodes and NEI/NEI_EQ edges from the graph
+
+    - adj: all neighbors of a switch (undirected NEI|NEI_EQ)
+    - nei: neighbors over NEI edges only (used for link distance)
+    - links: (parent, child) -> list of edge properties
+    """
+
+    logger.info("Loading in-memory switch topology")
+
+    topo = dict()
+    topo['switches'] = dict()
+    topo['adj'] = dict()
+    topo['nei'] = dict()
+    topo['links'] = dict()
+
+    graph = nglib.graph.get_graph()
+
+    for r in graph.scan_nodes('Switch', ['name', 'model', 'version']):
+        topo['switches'][r['name']] = (r['model'], r['version'])
+        topo['adj'][r['name']] = set()
+        topo['nei'][r['name']] = set()
+
+    results = graph.scan_edges(
+        ('NEI', 'NEI_EQ'), 'Switch', 'Switch',
+        ['pPort', 'cPort', 'native', 'cPc', 'pPc', 'vlans', 'rvlans', '_rvlans'])
+
+    count = 0
+    for r in results:
+        psw, csw = r['src'], r['dst']
+        topo['adj'][psw].add(csw)
+        topo['adj'][csw].add(psw)
+        if r['type'] == 'NEI':
+            topo['nei'][psw].add(csw)
+            topo['nei'][csw].add(psw)
+
+        if (psw, csw) not in topo['links']:
+            topo['links'][(psw, csw)] = []
+        topo['links'][(psw, csw)].append(
+            (r['pPort'], r['cPort'], r['native'], r['cPc'], r['pPc'],
+             r['vlans'], r['rvlans'], r['_rvlans']))
+        count += 1
+
+    logger.info("Loaded %s switches and %s links", len(topo['switches']), count)
+
+    return topo
+
+
+def bfs(adj, start, depth=None):
+    """Return hop distances from start over adj, optionally capped at depth"""
+
+    dist = {start: 0}
+    queue = deque([start])
+
+    while queue:
+        node = queue.popleft()
+        if depth is not None and dist[node] >= depth:
+            continue
+        for nei in adj[node]:
+            if nei not in dist:
+                dist[nei] = dist[node] + 1
+                queue.append(nei)
+
+    return dist
+
+
+def get_switched_links(switch1, switch2, depth):
+    """
+    Find all links along all shortest paths between two switch regexes
+
+    - Switch names must fully match switch1 and switch2 (like Cypher =~)
+    - distance is the NEI only hop count from the source switch to the child
+    - Returns SwitchLink records ordered by distance, child, parent
+    """
+
+    topo = get_topology()
+    depth = int(depth)
+
+    srcs = [s for s in topo['switches'] if re.fullmatch(switch1, s)]
+    dsts = [s for s in topo['switches'] if re.fullmatch(switch2, s)]
+
+    records = set()
+    dst_dist = dict()
+
+    for ss in srcs:
+        sdist = bfs(topo['adj'], ss, depth)
+        ldist = bfs(topo['nei'], ss, link_depth)
+
+        for ds in dsts:
+            if ds not in sdist:
+                continue
+            if ds not in dst_dist:
+                dst_dist[ds] = bfs(topo['adj'], ds, depth)
+            ddist = dst_dist[ds]
+            total = sdist[ds]
+
+            # Node pairs one hop apart along any shortest path
+            for u in sdist:
+                if u not in ddist or sdist[u] + ddist[u] != total:
+                    continue
+                for v in topo['adj'][u]:
+                    if sdist.get(v) != sdist[u] + 1 or ddist.get(v) != total - sdist[v]:
+                        continue
+                    for (psw, csw) in ((u, v), (v, u)):
+                        if csw not in ldist:
+                            continue
+                        for link in topo['links'].get((psw, csw), []):
+                            records.add((csw, psw) + topo['switches'][csw] \
+                                + topo['switches'][psw] + link + (ldist[csw],))
+
+    records = [SwitchLink._make(r) for r in records]
+
+    return sorted(records, key=lambda r: (r.distance, r.csw, r.psw, str(r.pport), str(r.cport)))
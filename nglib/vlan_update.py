@@ -37,6 +37,7 @@ import csv
 from collections import defaultdict
 import nglib
 import nglib.query.dev
+from nglib.vlanset import VlanSet
 
 logger = logging.getLogger(__name__)
 
@@ -169,15 +170,10 @@ def import_links(fileName):
         if (pname, pport) in ldb and (cname, cport) in ldb:
 
             # Set of intersected VLANs between two trunks
-            iset = intersect_vlans(ldb[(pname, pport)]['vlans'], \
-            ldb[(cname, cport)]['vlans'])
-
-            rset = set()
+            iset = VlanSet(ldb[(pname, pport)]['vlans']) & VlanSet(ldb[(cname, cport)]['vlans'])
 
             # If VLAN exists on both switches and is in trunk, then it traverses link
-            for v in iset:
-                if int(v) in vcache[pname] and int(v) in vcache[cname]:
-                    rset.add(v)
+            rset = iset & vcache[pname] & vcache[cname]
 
             if nglib.verbose>3:
                 print("ps", ldb[(pname, pport)]['vlans'])
@@ -185,13 +181,10 @@ def import_links(fileName):
                 print("pvc", vcache[pname])
                 print("cvc", vcache[cname])
             if nglib.verbose>2:
-                print("ON LINK", sorted(rset), "on", pname, pport, cname, cport)
+                print("ON LINK", list(rset), "on", pname, pport, cname, cport)
 
-            # Convert set to sorted vstring
-            rlist = []
-            for en in sorted(rset):
-                rlist.append(str(en))
-            vstring = ','.join(rlist)
+            # Full VLAN list for bridge and path lookups
+            vstring = rset.to_list()
 
             # No Vlans on trunk
             if not vstring and nglib.verbose>1:
@@ -204,8 +197,8 @@ def import_links(fileName):
             # Update Link Info
             pldb = ldb[(pname, pport)]
             pldb['_rvlans'] = vstring
-            pldb['rvlans'] = compact_vlans(rset)
-            pldb['cvlans'] = compact_vlans(iset)
+            pldb['rvlans'] = rset.to_range()
+            pldb['cvlans'] = iset.to_range()
             cldb = ldb[(cname, cport)]
             #print("Update Info", pname, pport, cname, cport, pldb, cldb )
             add_vlans_int(pldb, cldb)
@@ -216,16 +209,16 @@ def import_links(fileName):
 
 
 def cache_vlans():
-    """Build a VLAN Cache from each switch"""
+    """Build a VlanSet Cache from each switch"""
 
-    vcache = defaultdict(set)
+    vcache = defaultdict(VlanSet)
 
     vlans = nglib.bolt_ses.run(
         'MATCH(s:Switch)<-[e:Switched]-(v) ' +
         'RETURN s.name, v.vid')
 
     for v in vlans:
-        vcache[v['s.name']].add(int(v['v.vid']))
+        vcache[v['s.name']].add(v['v.vid'])
 
     return vcache
 
@@ -233,58 +226,19 @@ def cache_vlans():
 def intersect_vlans(set1, set2):
     """Reduce VLANS to common range, returns set"""
 
-    set1 = expand_vlans(set1)
-    set2 = expand_vlans(set2)
-
-    iset = set(set1).intersection(set2)
-    return iset
+    return set(VlanSet(set1) & VlanSet(set2))
 
 
 def expand_vlans(oset):
     """Expand a VLAN range to a set"""
 
-    lset = oset.split(',')
-    nset = set()
-
-    # Process vlan ranges eg. 1,2,3-20,4,5 into set
-    for en in lset:
-        sset = en.split('-')
-        if len(sset) > 1:
-            for x in range(int(sset[0]), int(sset[1])+1):
-                nset.add(x)
-        elif en:
-            nset.add(int(en))
-
-    return nset
+    return set(VlanSet(oset))
 
 
 def compact_vlans(oset):
     """Convert set of vlans to range format"""
 
-    last = 0
-    crange = 0
-    nset = []
-
-    for en in sorted(oset):
-        if last and en == (last+1):
-            if not crange:
-                crange = last
-        elif crange:
-            nset.pop()
-            nset.append(str(crange) + '-' + str(last))
-            crange = 0
-            nset.append(str(en))
-        else:
-            nset.append(str(en))
-        last = en
-
-    if crange:
-        nset.pop()
-        nset.append(str(crange) + '-' + str(last))
-
-    #print("os", sorted(oset), "rs", nset)
-
-    return ",".join(nset)
+    return VlanSet(oset).to_range()
 
 def add_vlans_int(pldb, cldb):
     """Add VLAN Info to link pldb->cldb"""
@@ -326,12 +280,12 @@ def root_election():
     # Find the local root for each switch domain
     if nglib.verbose:
         logger.info("Local Switch Domain Root Election")
-    find_local_root()
+    vlans = find_local_root()
 
     # Search all bridge trees for lowest STP and link the root domain to the root
     if nglib.verbose:
         logger.info("Bridged Switch Domain Root Election")
-    find_bridged_root()
+    find_bridged_root(vlans)
 
 
 def update_vlan_desc():
@@ -375,54 +329,78 @@ def update_vlan_desc():
 
 
 def update_bridge_domains():
-    """Update all vlan bridges between vlan management domains"""
+    """
+    Update all vlan bridges between vlan management domains
 
-    # Get all Switches and their child neighbors
-    results = nglib.py2neo_ses.cypher.execute(
-        'MATCH (ps:Switch)-[e:NEI|NEI_EQ]->(cs:Switch) '
+    - Loads cross-domain links, switch VLANs and BRIDGE edges once
+    - Bridges VIDs on both switches that also traverse the link (_rvlans)
+    - Creates new and touches existing BRIDGE edges in batched transactions
+    """
+
+    time = nglib.get_time()
+
+    # VLANs on every switch
+    vcache = cache_vlans()
+
+    # Existing bridges in either direction
+    bridges = set()
+    results = nglib.bolt_ses.run(
+        'MATCH (pv:VLAN)-[e:BRIDGE]->(cv:VLAN) RETURN pv.name AS pvlan, cv.name AS cvlan')
+    for r in results:
+        bridges.add(frozenset((r['pvlan'], r['cvlan'])))
+
+    # Adjacent switches in different MGMT Domains
+    results = nglib.bolt_ses.run(
+        'MATCH (ps:Switch)-[e:NEI|NEI_EQ]->(cs:Switch) WHERE ps.mgmt <> cs.mgmt '
         + 'RETURN ps.name as pswitch, ps.mgmt AS pmgmt, cs.name as cswitch, '
         + 'cs.mgmt AS cmgmt, e._rvlans AS rvlans')
 
-    if len(results) > 0:
-        for r in results.records:
-
-            # Different MGMT Domain and adjacent, look to bridge VLANs
-            if r.pmgmt != r.cmgmt:
-
-                # Get all VIDs for both parent and child switches
-                pvlans = nglib.py2neo_ses.cypher.execute(
-                    'MATCH (ps:Switch {name:{pswitch}})<-[e:Switched]-(v:VLAN) '
-                    + 'RETURN v.vid as vid',
-                    pswitch=r.pswitch)
-                cvlans = nglib.py2neo_ses.cypher.execute(
-                    'MATCH (ps:Switch {name:{cswitch}})<-[e:Switched]-(v:VLAN) '
-                    + 'RETURN v.vid as vid',
-                    cswitch=r.cswitch)
-
-                # Bridge VLANs across MGMT Domains if they exist on link
-                if len(pvlans) > 0 and len(cvlans) > 0:
-                    pvdb = dict()
-                    cvdb = dict()
-                    rvlans = set()
-                    if r.rvlans:
-                        rvlans = set(r.rvlans.split(','))
-
-                    # Load dicts of vlan IDs both both parent and child
-                    for p in pvlans.records:
-                        pvdb[p.vid] = 1
-                    for c in cvlans.records:
-                        cvdb[c.vid] = 1
-
-                    # If VIDs Match between parent and child across mgmt domains,
-                    # bridge the two
-                    for vlan in pvdb.keys():
-                        if vlan in cvdb.keys():
-                            if vlan in rvlans:
-                                update_bridge(r.pmgmt, r.cmgmt, vlan, r.pswitch, r.cswitch)
-                            elif nglib.verbose>1:
-                                logger.debug("Switches adjacent, missing rvlans to bridge: " +
-                                             "v:%s, ps:%s, cs:%s, rv:%s",
-                                             vlan, r.pswitch, r.cswitch, rvlans)
+    new = []
+    touch = dict()
+
+    for r in results:
+
+        # VIDs on both parent and child switches
+        shared = vcache[r['pswitch']] & vcache[r['cswitch']]
+        rvlans = VlanSet(r['rvlans'])
+
+        if shared - rvlans and nglib.verbose>1:
+            logger.debug("Switches adjacent, missing rvlans to bridge: " +
+                         "v:%s, ps:%s, cs:%s, rv:%s",
+                         shared - rvlans, r['pswitch'], r['cswitch'], rvlans)
+
+        # If VIDs Match between parent and child across mgmt domains,
+        # bridge the two if they exist on link
+        for vlan in shared & rvlans:
+            pvlan = r['pmgmt'] + "-" + str(vlan)
+            cvlan = r['cmgmt'] + "-" + str(vlan)
+            key = frozenset((pvlan, cvlan))
+
+            if nglib.verbose > 2:
+                print("Bridge: ", r['pmgmt'], r['cmgmt'], vlan, r['pswitch'], r['cswitch'])
+
+            if key in bridges:
+                touch[key] = {'pvlan': pvlan, 'cvlan': cvlan, 'time': time}
+            else:
+                logger.info("New: Bridge (%s)-[:BRIDGE]->(%s) Relationship", pvlan, cvlan)
+                bridges.add(key)
+                new.append({'pvlan': pvlan, 'cvlan': cvlan, 'pswitch': r['pswitch'],
+                            'cswitch': r['cswitch'], 'time': time})
+
+    nglib.run_batched(
+        'UNWIND {rows} AS row '
+        + 'MATCH (pv:VLAN {name:row.pvlan}), (cv:VLAN {name:row.cvlan}) '
+        + 'MERGE (pv)-[e:BRIDGE]->(cv) '
+        + 'ON CREATE SET e += {pswitch:row.pswitch, cswitch:row.cswitch, time:row.time}',
+        new)
+
+    nglib.run_batched(
+        'UNWIND {rows} AS row '
+        + 'MATCH (pv:VLAN {name:row.pvlan})-[e:BRIDGE]-(cv:VLAN {name:row.cvlan}) '
+        + 'SET e.time = row.time',
+        list(touch.values()))
+
+    logger.info("Bridge Domains: %s new bridges, %s updated bridges", len(new), len(touch))
 
 
 def update_bridge(pmgmt, cmgmt, vlan, pswitch, cswitch):
@@ -462,96 +440,168 @@ def find_local_root():
     """
     Go through every Switch in a management domain
     Find the lowest STP value and assume root within domain
+
+    - Loads every VLAN and Switched STP value in two queries
+    - Writes lroot/lstp for all switched VLANs in batched transactions
+    - Returns all VLANs by name with their vid, lroot and lstp
     """
 
-    results = nglib.py2neo_ses.cypher.execute(
-        'MATCH (v:VLAN)-[:Switched]->() RETURN DISTINCT(v.name) AS name, v.vid AS vid')
+    vlans = load_vlan_roots()
+    switched = defaultdict(list)
+
+    results = nglib.bolt_ses.run(
+        'MATCH (v:VLAN)-[e:Switched]->(s) '
+        + 'RETURN v.name AS name, e.stp AS stp, s.name AS switch')
+
+    for r in results:
+        switched[r['name']].append((r['switch'], int(r['stp'])))
+
+    rows = []
 
     # Find the local root for vid on each switch
-    if len(results) > 0:
-        for v in results.records:
-            vname = v.name
-            stpmin = 32768
-            switch = None
+    for vname in switched:
+        stpmin = 32768
+        switch = None
 
-            # Get STP values from all Switched Relationships
-            results = nglib.py2neo_ses.cypher.execute(
-                'MATCH (v:VLAN {name:{vname}})-[e:Switched]->(s) '
-                + 'RETURN e.stp AS stp, s.name AS switch ORDER BY switch',
-                vname=vname)
+        # Find the lowest value, ties go to the first switch by name
+        for sw, stp in sorted(switched[vname]):
+            if stp < stpmin and stp != 0:
+                stpmin = stp
+                switch = sw
+                if nglib.verbose > 3:
+                    print("Local Root: ", vname, stp, switch)
 
-            # Find the lowest value
-            for s in results.records:
-                stp = int(s.stp)
-                if stp < stpmin and stp != 0:
-                    stpmin = stp
-                    switch = s.switch
-                    if nglib.verbose > 3:
-                        print("Local Root: ", vname, stp, switch)
+        vlans[vname]['lroot'] = switch
+        vlans[vname]['lstp'] = stpmin
+        rows.append({'vname': vname, 'switch': switch, 'stp': stpmin})
 
-            # Update VLAN with lowest value
-            results = nglib.py2neo_ses.cypher.execute(
-                'MATCH (v:VLAN {name:{vname}}) SET v += {lroot:{switch}, lstp:{stp}}',
-                vname=vname, switch=switch, stp=stpmin)
+    # Update VLANs with lowest value
+    nglib.run_batched(
+        'UNWIND {rows} AS row MATCH (v:VLAN {name:row.vname}) '
+        + 'SET v += {lroot:row.switch, lstp:row.stp}',
+        rows)
 
+    return vlans
 
-def find_bridged_root():
-    """Go through each VLAN, search all BRIDGED nodes for lowest STP value"""
 
-    # Get all VLANs
-    results = nglib.py2neo_ses.cypher.execute(
-        'MATCH (v:VLAN) RETURN v.name AS name')
+def load_vlan_roots():
+    """Return all VLANs by name with their vid and current lroot/lstp"""
 
-    if len(results) > 0:
-        for r in results.records:
-            vname = r.name
-            stp = 32768
-            rootSwitch = None
-
-            # Find Bridged VLANs first
-            bridged = nglib.py2neo_ses.cypher.execute(
-                'MATCH (v:VLAN {name:{vname}})-[e:BRIDGE*]-(b:VLAN) '
-                + 'RETURN b.name AS name, b.lstp AS lstp, b.lroot AS lroot',
-                vname=vname)
+    vlans = dict()
 
-            # Local Values
-            local = nglib.py2neo_ses.cypher.execute(
-                'MATCH (v:VLAN {name:{vname}}) '
-                + 'RETURN v.name AS name, v.lstp AS lstp, v.lroot AS lroot, v.vid as vid',
-                vname=vname)
+    results = nglib.bolt_ses.run(
+        'MATCH (v:VLAN) RETURN v.name AS name, v.vid AS vid, '
+        + 'v.lroot AS lroot, v.lstp AS lstp')
+
+    for r in results:
+        vlans[r['name']] = {'vid': r['vid'], 'lroot': r['lroot'], 'lstp': r['lstp']}
+
+    return vlans
+
+
+def find_bridged_root(vlans=None):
+    """
+    Go through each VLAN, search all BRIDGED nodes for lowest STP value
+
+    - Groups VLANs into bridge domains with union-find over BRIDGE edges
+    - The VLAN with the single lowest lstp in a domain is its root and gets
+      a ROOT link to its local root switch, ties are logged as duplicates
+    - Bridge directions are only fixed on domains with bridges
+    """
+
+    if vlans is None:
+        vlans = load_vlan_roots()
+
+    time = nglib.get_time()
+    parent = dict((vname, vname) for vname in vlans)
+
+    results = nglib.bolt_ses.run(
+        'MATCH (pv:VLAN)-[e:BRIDGE]->(cv:VLAN) RETURN pv.name AS pvlan, cv.name AS cvlan')
+
+    for r in results:
+        if r['pvlan'] in parent and r['cvlan'] in parent:
+            union_vlans(parent, r['pvlan'], r['cvlan'])
+
+    # Bridge domains and their members
+    domains = defaultdict(list)
+    for vname in vlans:
+        domains[find_vlan(parent, vname)].append(vname)
+
+    roots = set()
+    results = nglib.bolt_ses.run(
+        'MATCH (v:VLAN)-[e:ROOT]->(s:Switch) RETURN v.name AS vname, s.name AS switch')
+    for r in results:
+        roots.add((r['vname'], r['switch']))
+
+    rows = []
+    directions = []
+
+    for members in domains.values():
+
+        # Lowest STP in the domain and how many VLANs share it
+        stps = sorted((get_lstp(vlans[vname]), vname) for vname in members)
+        stp, vname = stps[0]
+        dup = len(stps) > 1 and stps[1][0] == stp
+
+        # Link Bridge domain to root
+        if stp < 32768:
+            rootSwitch = vlans[vname]['lroot']
+            if nglib.verbose > 3:
+                print("Low STP: ", vname, stp, rootSwitch)
+
+            # Duplicate roots all link, like the per VLAN election
+            for lstp, dname in stps:
+                if lstp != stp:
+                    break
+                droot = vlans[dname]['lroot']
+                if (dname, droot) not in roots:
+                    logger.info("New: Root for VLAN (%s)-[:ROOT]->(%s)", dname, droot)
+                rows.append({'vname': dname, 'switch': droot, 'stp': stp, 'time': time})
+
+            if not dup:
+                if len(members) > 1:
+                    directions.append((vname, vlans[vname]['vid'], rootSwitch))
+            elif nglib.verbose:
+                logger.info("Duplicate Root Found across another domain:"
+                            + " %s rs:%s", vname, rootSwitch)
+
+    nglib.run_batched(
+        'UNWIND {rows} AS row '
+        + 'MATCH (v:VLAN {name:row.vname}), (s:Switch {name:row.switch}) '
+        + 'MERGE (v)-[e:ROOT]->(s) SET e += {stp:row.stp, time:row.time}',
+        rows)
+
+    for vname, vid, rootSwitch in directions:
+        update_bridge_direction(vname, vid, rootSwitch)
+
+
+def get_lstp(vlan):
+    """Local STP value of a VLAN, VLANs without one never win"""
+
+    if vlan['lstp']:
+        return int(vlan['lstp'])
+
+    return 32768
+
+
+def find_vlan(parent, vname):
+    """Union-find lookup of a VLAN's bridge domain (path halving)"""
+
+    while parent[vname] != vname:
+        parent[vname] = parent[parent[vname]]
+        vname = parent[vname]
+
+    return vname
+
+
+def union_vlans(parent, vname1, vname2):
+    """Merge the bridge domains of two VLANs"""
+
+    root1 = find_vlan(parent, vname1)
+    root2 = find_vlan(parent, vname2)
 
-            dup = 32768
-            if len(bridged) > 0:
-                for b in bridged:
-
-                    # New Lowest STP Domain
-                    if int(b.lstp) < stp:
-                        #print("Low STP: ",vname,b.name,b.lstp,b.lroot)
-                        stp = int(b.lstp)
-                        dup = stp
-                    elif int(b.lstp) == stp:
-                        dup = stp
-
-            # Check local stp values
-            if len(local) > 0:
-                v = local.records[0]
-
-                # If local root is the root for the BRIDGE domain, create root relationship
-                if v.lstp and int(v.lstp) <= stp:
-                    stp = int(v.lstp)
-                    rootSwitch = v.lroot
-                    vid = v.vid
-
-                    # Link Bridge domain to root
-                    if stp < 32768:
-                        if nglib.verbose > 3:
-                            print("Low STP: ", vname, stp, rootSwitch)
-                        link_vlan_to_root(vname, stp, rootSwitch)
-                        if stp != dup:
-                            update_bridge_direction(vname, vid, rootSwitch)
-                        elif nglib.verbose:
-                            logger.info("Duplicate Root Found across another domain:"
-                                        + " %s rs:%s", vname, rootSwitch)
+    if root1 != root2:
+        parent[root2] = root1
 
 
 def link_vlan_to_root(vname, stp, rootSwitch):
@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+#
+# Copyright (c) 2016 "Jonathan Yantis"
+#
+# This file is a part of NetGrph.
+#
+#    This program is free software: you can redistribute it and/or  modify
+#    it under the terms of the GNU Affero General Public License, version 3,
+#    as published by the Free Software Foundation.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#    As a special exception, the copyright holders give permission to link the
+#    code of portions of this program with the OpenSSL library under certain
+#    conditions as described in each individual source file and distribute
+#    linked combinations including the program with the OpenSSL library. You
+#    must comply with the GNU Affero General Public License in all respects
+#    for all of the code used other than as permitted herein. If you modify
+#    file(s) with this exception, you may extend this exception to your
+#    version of the file(s), but you are not obligated to do so. If you do not
+#    wish to do so, delete this exception statement from your version. If you
+#    delete this exception statement from all source files in the program,
+#    then also delete it in the license file.
+#
+#
+"""
+VLAN Set Algebra
+
+ - VlanSet is a bitmap of VLAN IDs stored in a Python int
+ - Parses trunk range strings (eg. 1,5,10-20) one range at a time
+ - Intersection, union and difference are single bitwise operations
+ - Formats back to range strings (10-20) or full lists (10,11,12)
+"""
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Trunks allowing all VLANs are parsed as 1-4096
+max_vid = 4096
+
+
+class VlanSet(object):
+    """Set of VLAN IDs (0-4096) backed by an int bitmap"""
+
+    __slots__ = ('bits',)
+
+    def __init__(self, vlans=None):
+        self.bits = 0
+
+        if isinstance(vlans, VlanSet):
+            self.bits = vlans.bits
+        elif isinstance(vlans, str):
+            self.bits = parse_vlans(vlans)
+        elif vlans is not None:
+            for vid in vlans:
+                self.add(vid)
+
+    @classmethod
+    def from_bits(cls, bits):
+        """Return a VlanSet from a raw bitmap"""
+
+        vset = cls()
+        vset.bits = bits
+        return vset
+
+    def add(self, vid):
+        """Add a single VLAN ID"""
+        self.bits |= 1 << check_vid(vid)
+
+    def __contains__(self, vid):
+        try:
+            vid = int(vid)
+        except (TypeError, ValueError):
+            return False
+
+        return 0 <= vid <= max_vid and bool(self.bits >> vid & 1)
+
+    def __and__(self, other):
+        return VlanSet.from_bits(self.bits & other.bits)
+
+    def __or__(self, other):
+        return VlanSet.from_bits(self.bits | other.bits)
+
+    def __sub__(self, other):
+        return VlanSet.from_bits(self.bits & ~other.bits)
+
+    def __eq__(self, other):
+        return isinstance(other, VlanSet) and self.bits == other.bits
+
+    def __hash__(self):
+        return hash(self.bits)
+
+    def __bool__(self):
+        return bool(self.bits)
+
+    def __len__(self):
+        return bin(self.bits).count('1')
+
+    def __iter__(self):
+        bits = self.bits
+        while bits:
+            low = bits & -bits
+            yield low.bit_length() - 1
+            bits ^= low
+
+    def ranges(self):
+        """Yield (first, last) for each run of consecutive VLANs"""
+
+        bits = self.bits
+        while bits:
+            first = (bits & -bits).bit_length() - 1
+            run = bits >> first
+            length = (run ^ (run + 1)).bit_length() - 1
+            yield first, first + length - 1
+            bits &= ~(((1 << length) - 1) << first)
+
+    def to_range(self):
+        """Range string format (eg. 1-3,5)"""
+
+        rlist = []
+        for first, last in self.ranges():
+            if first == last:
+                rlist.append(str(first))
+            else:
+                rlist.append(str(first) + '-' + str(last))
+
+        return ','.join(rlist)
+
+    def to_list(self):
+        """Comma separated list of every VLAN (eg. 1,2,3,5)"""
+        return ','.join(str(vid) for vid in self)
+
+    def __str__(self):
+        return self.to_range()
+
+    def __repr__(self):
+        return "VlanSet('" + self.to_range() + "')"
+
+
+def check_vid(vid):
+    """Return vid as an int, raising ValueError if out of range"""
+
+    vid = int(vid)
+    if vid < 0 or vid > max_vid:
+        raise ValueError("VLAN ID out of range: " + str(vid))
+
+    return vid
+
+
+def parse_vlans(vstring):
+    """Parse a VLAN range string (eg. 1,2,3-20) into a bitmap"""
+
+    bits = 0
+
+    for en in vstring.split(','):
+        sset = en.split('-')
+        if len(sset) > 1:
+            first = check_vid(sset[0])
+            last = check_vid(sset[1])
+            if last >= first:
+                bits |= ((1 << (last - first + 1)) - 1) << first
+        elif en.strip():
+            bits |= 1 << check_vid(en)
+
+    return bits
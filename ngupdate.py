@@ -40,6 +40,7 @@ import argparse
 import configparser
 import logging
 import getpass
+from functools import partial
 from timeit import default_timer as timer
 import nglib
 import nglib.dev_update
@@ -48,6 +49,8 @@ import nglib.fw_update
 import nglib.cache_update
 import nglib.vlan_update
 import nglib.alerts
+import nglib.secpath
+import nglib.delta
 
 
 # Default Config File Location
@@ -84,6 +87,10 @@ parser.add_argument("-uvlan", help="Update VLAN Names and Bridges",
                     action="store_true")
 parser.add_argument("--ignoreNew", help="Do Not Create NewNetwork Events on Load",
                     action="store_true")
+parser.add_argument("--bulk", help="Use batched bulk imports (-full, -inet, -ind)",
+                    action="store_true")
+parser.add_argument("--delta", help="Only import changed CSV rows (-full)",
+                    action="store_true")
 parser.add_argument("-isnet", help="Import Supernets Network Data",
                     action="store_true")
 parser.add_argument("-ifw", help="Import FW Data from CSV file",
@@ -102,7 +109,7 @@ parser.add_argument("--clearEdges", help="Clear Edges Older than -h hours",
                     action="store_true")
 parser.add_argument("--clearNodes", help="Clear Nodes Older than -h hours",
                     action="store_true")
-parser.add_argument("--reSeed", help="Reseed All Neighbors (takes a few iterations)",
+parser.add_argument("--reSeed", help="Reseed All Neighbors and Switch Distances",
                     action="store_true")
 parser.add_argument("--dropDatabase",
                     help="Clear all database Data (Warning: drops all data)",
@@ -173,18 +180,13 @@ if args.full:
 
     logger.info("Full Import Requested")
     start = timer()
-    run_cmd(nglib.dev_update.import_vrfs, fileName=ngfiles['vrfs'])
-    run_cmd(nglib.dev_update.import_devicelist,
-            fileName=ngfiles['devices'], devFile=ngfiles['device_info'])
-    run_cmd(nglib.dev_update.import_neighbors, fileName=ngfiles['neighbors'])
-    run_cmd(nglib.net_update.import_networks, fileName=ngfiles['networks'])
-    run_cmd(nglib.net_update.import_supernets, fileName=ngfiles['supernets'])
-    run_cmd(nglib.fw_update.import_fw, fileName=ngfiles['firewalls'])
-
-    run_cmd(nglib.vlan_update.import_vlans, fileName=ngfiles['vlans'])
-    run_cmd(nglib.vlan_update.import_links, fileName=ngfiles['links'])
-
-    run_cmd(nglib.vlan_update.update_vlans)
+
+    # Incremental import of changed rows only
+    if args.delta:
+        run_cmd(partial(nglib.delta.import_delta, ngfiles, bulk=args.bulk))
+    else:
+        for _, func in nglib.delta.get_full_stages(ngfiles, bulk=args.bulk):
+            run_cmd(func)
     stop = timer()
     runtime = "%.3f" % (stop - start)
     logger.info("Import Completed in " + str(runtime) + "sec")
@@ -192,6 +194,7 @@ if args.full:
 # Reseed is a single operation
 elif args.reSeed:
     nglib.dev_update.reseed_neighbors()
+    nglib.dev_update.update_distances(ngfiles['neighbors'])
 
 # Drop everything in the database
 elif args.dropDatabase:
@@ -210,13 +213,17 @@ elif args.id:
     nglib.dev_update.import_devicelist(ngfiles['devices'],
                                        ngfiles['device_info'])
 elif args.ind:
-    nglib.dev_update.import_neighbors(ngfiles['neighbors'])
+    nglib.dev_update.update_distances(ngfiles['neighbors'])
+    nglib.dev_update.import_neighbors(ngfiles['neighbors'], bulk=args.bulk)
 elif args.ild:
     nglib.vlan_update.import_links(ngfiles['links'])
 elif args.ivrf:
     nglib.dev_update.import_vrfs(ngfiles['vrfs'])
+    nglib.secpath.update_security_paths()
 elif args.inet:
-    nglib.net_update.import_networks(ngfiles['networks'], ignore_new=args.ignoreNew)
+    nglib.net_update.import_networks(ngfiles['networks'], ignore_new=args.ignoreNew,
+                                     bulk=args.bulk)
+    nglib.secpath.update_security_paths()
 elif args.ivlan:
     nglib.vlan_update.import_vlans(
         fileName=ngfiles['vlans'], ignore_new=args.ignoreNew)
@@ -228,13 +235,23 @@ elif args.ifile:
     nglib.import_cypher(args.ifile)
 elif args.ifw:
     nglib.fw_update.import_fw(ngfiles['firewalls'])
+    nglib.secpath.update_security_paths()
 
 # Clear Edges and Nodes
 elif args.clearEdges and args.hours:
     nglib.cache_update.clear_edges(args.hours)
+    nglib.secpath.update_security_paths()
 elif args.clearNodes and args.hours:
     nglib.cache_update.clear_nodes(args.hours)
+    nglib.secpath.update_security_paths()
 
 # Must need help
 else:
     parser.print_help()
+
+# Stamp the graph after updates so in-memory query engines reload
+if args.full or args.reSeed or args.dropDatabase or args.unetdb or args.id \
+    or args.ind or args.ild or args.ivrf or args.inet or args.ivlan or args.uvlan \
+    or args.isnet or args.ifile or args.ifw \
+    or ((args.clearEdges or args.clearNodes) and args.hours):
+    nglib.update_graph_marker()